@@ -1,3 +1,11 @@
 from .api_exception import ApiException
+from .metrics import ApiMetrics, Histogram, MetricsExporter
+from .profiling import StageProfiler, profile_stage
 from .api_base import ApiBase
-from .doctype import DocType
\ No newline at end of file
+from .doctype import DocType
+from .request_policy import RequestPolicy, TokenBucket
+from .paging import iter_pages, aiter_pages
+from .transport import Transport
+from .multipart import MultipartFile
+from .async_request_policy import AsyncRequestPolicy
+from .async_api_base import AsyncApiBase
@@ -1,17 +1,32 @@
+import requests
+import time
 from abc import ABC, abstractmethod
 from .doctype import DocType
+from .api_exception import ApiException
+from .metrics import ApiMetrics
+from .request_policy import RequestPolicy
+from .transport import Transport
 
 class ApiBase(ABC):
     """Base class for API wrapper classes.
     """
 
-    def __init__(self, base_url: str):
+    def __init__(self, base_url: str, request_policy: RequestPolicy = None, transport: Transport = None,
+                 metrics: ApiMetrics = None):
         """Initializes the api wrapper.
 
         Args:
             base_url (str): Base url of the api
+            request_policy (RequestPolicy, optional): Policy for rate limiting, timeouts and retries
+            of requests. Defaults to a policy without rate limit.
+            transport (Transport, optional): Pooled transport to create sessions with.
+            Defaults to the shared transport with default pool sizes.
+            metrics (ApiMetrics, optional): Metrics to record the requests in. Defaults to None (not recorded).
         """
         self.base_url = base_url
+        self.request_policy = request_policy or RequestPolicy()
+        self.transport = transport or Transport.get_shared()
+        self.metrics = metrics
 
     def __enter__(self):
         self.open()
@@ -20,6 +35,66 @@ class ApiBase(ABC):
     def __exit__(self, exc_type, exc_value, traceback):
         self.close()
 
+    def _send(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends a request according to the request policy (rate limit, timeout, retries).
+
+        Args:
+            session (requests.Session): Session to send the request with
+            method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
+            url (str): URL to make request to
+            **kwargs: Further arguments for requests.Session.request (json, params, stream, ...)
+
+        Returns:
+            requests.Response: Successful response
+
+        Raises:
+            ApiException: If the request failed after all retries
+        """
+        start = time.perf_counter()
+        try:
+            response = self.request_policy.send(session, method, url, **kwargs)
+        except requests.RequestException as e:
+            self._record(method, url, start)
+            raise ApiException(
+                message=f"Error in {method} request to {url}: {e}",
+                method=method,
+                url=url
+            ) from e
+        self._record(method, url, start, response, kwargs.get("stream", False))
+
+        if not response.ok:
+            raise ApiException(
+                message=f"Not found: {response.text}" if response.status_code == 404 else
+                        f"Error in {method} request to {url}: {response.text}",
+                method=method,
+                url=url,
+                response_text=response.text,
+                status_code=response.status_code
+            )
+        return response
+
+    def _record(self, method: str, url: str, start: float, response: requests.Response = None,
+                stream: bool = False) -> None:
+        """Records a request in the metrics (if any).
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            start (float): Start time of the request (time.perf_counter)
+            response (requests.Response, optional): Response, None if failed without response. Defaults to None.
+            stream (bool, optional): True if the response body isn't read yet. Defaults to False.
+        """
+        if self.metrics is None:
+            return
+        seconds = time.perf_counter() - start
+        sent = received = 0
+        if response is not None:
+            sent = int(response.request.headers.get("Content-Length", None) or 0)
+            received = response.headers.get("Content-Length", None)
+            received = int(received) if received is not None else (0 if stream else len(response.content))
+        self.metrics.record(ApiMetrics.get_labels(self.base_url, method, url), seconds, sent, received,
+                            response is None or not response.ok)
+
     @abstractmethod
     def open(self):
         """Opens the api connection.
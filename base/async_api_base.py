@@ -0,0 +1,226 @@
+import asyncio
+import aiohttp
+import time
+from abc import ABC, abstractmethod
+from .doctype import DocType
+from .api_exception import ApiException
+from .async_request_policy import AsyncRequestPolicy
+from .metrics import ApiMetrics
+
+class AsyncApiBase(ABC):
+    """Base class for asyncio-based API wrapper classes (aiohttp).
+    Same methods as ApiBase, but as coroutines. Requests in flight are limited by a semaphore,
+    connections are pooled by the connector of the session.
+    """
+
+    def __init__(self, base_url: str, request_policy: AsyncRequestPolicy = None, max_concurrency: int = 100,
+                 metrics: ApiMetrics = None):
+        """Initializes the api wrapper.
+
+        Args:
+            base_url (str): Base url of the api
+            request_policy (AsyncRequestPolicy, optional): Policy for rate limiting, timeouts and retries
+            of requests. Defaults to a policy without rate limit.
+            max_concurrency (int, optional): Maximum amount of requests in flight (and pooled connections).
+            Defaults to 100.
+            metrics (ApiMetrics, optional): Metrics to record the requests in. Defaults to None (not recorded).
+        """
+        self.base_url = base_url
+        self.request_policy = request_policy or AsyncRequestPolicy()
+        self.metrics = metrics
+        self.max_concurrency = max(1, max_concurrency)
+        self.session = None
+        self._semaphore = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    def _create_session(self, headers: dict = None, auth: aiohttp.BasicAuth = None) -> aiohttp.ClientSession:
+        """Creates a session with a connection pool of max_concurrency connections.
+        Must be called inside the event loop.
+
+        Args:
+            headers (dict, optional): Headers sent with every request. Defaults to None.
+            auth (aiohttp.BasicAuth, optional): Authentication of the session. Defaults to None.
+
+        Returns:
+            aiohttp.ClientSession: Session
+        """
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, limit_per_host=0, keepalive_timeout=30)
+        return aiohttp.ClientSession(connector=connector, headers=headers, auth=auth)
+
+    async def _send(self, session: aiohttp.ClientSession, method: str, url: str, stream: bool = False,
+                    **kwargs) -> aiohttp.ClientResponse:
+        """Sends a request according to the request policy (rate limit, timeout, retries).
+
+        Args:
+            session (aiohttp.ClientSession): Session to send the request with
+            method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
+            url (str): URL to make request to
+            stream (bool, optional): If True, the response body is not read in advance and the response
+            must be released by the caller. Defaults to False.
+            **kwargs: Further arguments for aiohttp.ClientSession.request (json, params, data, ...)
+
+        Returns:
+            aiohttp.ClientResponse: Successful response
+
+        Raises:
+            ApiException: If the request failed after all retries
+        """
+        async with self._semaphore:
+            start = time.perf_counter()
+            try:
+                response = await self.request_policy.send(session, method, url, **kwargs)
+                body = await response.read() if not stream or not response.ok else None
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                self._record(method, url, start)
+                raise ApiException(
+                    message=f"Error in {method} request to {url}: {e!r}",
+                    method=method,
+                    url=url
+                ) from e
+            self._record(method, url, start, response, body)
+
+        if not response.ok:
+            text = await response.text()
+            raise ApiException(
+                message=f"Not found: {text}" if response.status == 404 else
+                        f"Error in {method} request to {url}: {text}",
+                method=method,
+                url=url,
+                response_text=text,
+                status_code=response.status
+            )
+        return response
+
+    def _record(self, method: str, url: str, start: float, response: aiohttp.ClientResponse = None,
+                body: bytes = None) -> None:
+        """Records a request in the metrics (if any).
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            start (float): Start time of the request (time.perf_counter)
+            response (aiohttp.ClientResponse, optional): Response, None if failed without response.
+            Defaults to None.
+            body (bytes, optional): Read response body, None if streamed. Defaults to None.
+        """
+        if self.metrics is None:
+            return
+        seconds = time.perf_counter() - start
+        sent = received = 0
+        if response is not None:
+            sent = int(response.request_info.headers.get("Content-Length", None) or 0)
+            received = response.content_length
+            if received is None:
+                received = len(body) if body is not None else 0
+        self.metrics.record(ApiMetrics.get_labels(self.base_url, method, url), seconds, sent, received,
+                            response is None or not response.ok)
+
+    @abstractmethod
+    async def open(self):
+        """Opens the api connection.
+        """
+        pass
+
+    @abstractmethod
+    async def close(self):
+        """Closes the api connection.
+        """
+        pass
+
+    @abstractmethod
+    async def get_all(self, doctype: DocType|str) -> list:
+        """Returns all objects of the given DocType.
+
+        Args:
+            doctype (str): DocType to get all objects from
+
+        Returns:
+            list: List of objects
+        """
+        pass
+
+    @abstractmethod
+    async def get(self, doctype: DocType|str, id: str) -> dict:
+        """Returns the object with the given name and DocType.
+
+        Args:
+            doctype (str): DocType of the object
+            name (str): Name of the object
+
+        Returns:
+            dict: Object
+        """
+        pass
+
+    @abstractmethod
+    async def create(self, doctype: DocType|str, data: dict) -> dict:
+        """Creates a new object of the given DocType.
+
+        Args:
+            doctype (str): DocType of the object
+            data (dict): Data of the object
+
+        Returns:
+            dict: Created object
+        """
+        pass
+
+    @abstractmethod
+    async def update(self, doctype: DocType|str, id: str, data: dict) -> dict:
+        """Updates the object with the given name and DocType.
+
+        Args:
+            doctype (str): DocType of the object
+            name (str): Name of the object
+            data (dict): Data of the object
+
+        Returns:
+            dict: Updated object
+        """
+        pass
+
+    @abstractmethod
+    async def delete(self, doctype: DocType|str, id: str) -> dict:
+        """Deletes the object with the given name and DocType.
+
+        Args:
+            doctype (str): DocType of the object
+            name (str): Name of the object
+
+        Returns:
+            dict: Deleted object
+        """
+        pass
+
+    @abstractmethod
+    async def get_count(self, doctype: DocType|str) -> int:
+        """Returns the count of objects of the given DocType.
+
+        Args:
+            doctype (str): DocType to get the count from
+
+        Returns:
+            int: Count of objects
+        """
+        pass
+
+    @abstractmethod
+    async def search(self, doctype: DocType|str, field: str, value: str) -> list:
+        """Returns all objects of the given DocType with the given field-value.
+
+        Args:
+            doctype (str): DocType to search in
+            field (str): Name of the field to check for
+            value (str): The value to search for
+
+        Returns:
+            list: List of objects
+        """
+        pass
@@ -0,0 +1,92 @@
+import asyncio
+import aiohttp
+from .request_policy import RequestPolicy
+
+class AsyncRequestPolicy(RequestPolicy):
+    """Request policy for asyncio-sessions (aiohttp): same rate limiting, timeouts and retries
+    as RequestPolicy, but waiting doesn't block the event loop.
+    """
+
+    def _is_retryable(self, method: str, response: aiohttp.ClientResponse = None,
+                      error: Exception = None) -> bool:
+        """Returns if a failed attempt can be retried.
+
+        Args:
+            method (str): HTTP method
+            response (aiohttp.ClientResponse, optional): Response of the attempt. Defaults to None.
+            error (Exception, optional): Error of the attempt. Defaults to None.
+
+        Returns:
+            bool: True if retryable
+        """
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        if error is not None:
+            # Connection couldn't be established -> request wasn't sent
+            if isinstance(error, (aiohttp.ClientConnectorError, aiohttp.ConnectionTimeoutError)):
+                return True
+            return idempotent and isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError))
+        if response is not None:
+            return response.status in self.RETRY_STATUS or \
+                (idempotent and response.status in self.RETRY_STATUS_IDEMPOTENT)
+        return False
+
+    async def send(self, session: aiohttp.ClientSession, method: str, url: str,
+                   **kwargs) -> aiohttp.ClientResponse:
+        """Sends a request according to the policy.
+
+        Args:
+            session (aiohttp.ClientSession): Session to send the request with
+            method (str): HTTP method
+            url (str): URL
+            **kwargs: Further arguments for aiohttp.ClientSession.request
+
+        Returns:
+            aiohttp.ClientResponse: Response of the last attempt (body not read yet)
+
+        Raises:
+            aiohttp.ClientError | asyncio.TimeoutError: If the last attempt failed without response
+        """
+        kwargs.setdefault("timeout", aiohttp.ClientTimeout(total=self.timeout))
+        bucket = self._get_bucket(url)
+        attempt = 0
+        while True:
+            # Rate limit
+            if bucket:
+                waited = bucket.reserve()
+                if waited > 0:
+                    self._count("throttled")
+                    self._count("throttled_seconds", waited)
+                    await asyncio.sleep(waited)
+
+            self._count("requests")
+            response = None
+            error = None
+            try:
+                response = await session.request(method, url, **kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = e
+
+            if response is not None and response.status == 429:
+                self._count("rate_limited")
+                if bucket:
+                    bucket.decrease()
+            elif response is not None and response.status < 400 and bucket:
+                bucket.increase()
+
+            # Done, or give up
+            if (error is None and response.ok) or attempt >= self.max_retries or \
+                    not self._is_retryable(method, response, error):
+                if error is not None:
+                    self._count("failed")
+                    raise error
+                if not response.ok:
+                    self._count("failed")
+                return response
+
+            # Retry after backoff
+            backoff = self._get_backoff(attempt, response)
+            if response is not None:
+                response.release()
+            self._count("retries")
+            await asyncio.sleep(backoff)
+            attempt += 1
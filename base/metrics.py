@@ -0,0 +1,306 @@
+import json
+import os
+import time
+from bisect import bisect_left
+from threading import Event, Lock, Thread
+from urllib.parse import unquote, urlsplit
+
+class Histogram:
+    """Latency histogram with fixed buckets (cumulative on export, as Prometheus histograms).
+    Not thread-safe, guarded by the lock of ApiMetrics.
+    """
+
+    """tuple[float]: Upper bounds of the buckets in seconds (+Inf is added)."""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, buckets: tuple[float] = BUCKETS):
+        """Initializes the histogram.
+
+        Args:
+            buckets (tuple[float], optional): Sorted upper bounds of the buckets. Defaults to BUCKETS.
+        """
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Adds a value.
+
+        Args:
+            value (float): Value (e.g. seconds)
+        """
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def get_quantile(self, share: float) -> float:
+        """Returns an estimated quantile: the upper bound of the bucket containing it.
+
+        Args:
+            share (float): Quantile as share (e.g. 0.95)
+
+        Returns:
+            float: Upper bound (inf if in the last bucket) or 0.0 if empty
+        """
+        if not self.count:
+            return 0.0
+        rank, total = share * self.count, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        """Returns the histogram with cumulative bucket counts.
+
+        Returns:
+            dict: Buckets (upper bound mapped to count), sum and count
+        """
+        buckets, total = {}, 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = total
+        return {"buckets": buckets, "sum": self.sum, "count": self.count}
+
+class ApiMetrics:
+    """Request metrics of the API classes: requests, errors, bytes and latency histogram
+    per host, method and DocType. Recording is a dict lookup under a lock, so it can be left on.
+    Snapshots can be exported as JSON or as Prometheus textfile (see MetricsExporter).
+    """
+
+    _shared = None
+    _shared_lock = Lock()
+
+    def __init__(self, buckets: tuple[float] = Histogram.BUCKETS):
+        """Initializes the metrics.
+
+        Args:
+            buckets (tuple[float], optional): Upper bounds of the latency buckets in seconds.
+            Defaults to Histogram.BUCKETS.
+        """
+        self.buckets = buckets
+        self._series = {}       # (host, method, DocType) mapped to counters and histogram
+        self._lock = Lock()
+        self._start = time.time()
+
+    @classmethod
+    def get_shared(cls) -> "ApiMetrics":
+        """Returns the metrics shared by all API-Objects.
+
+        Returns:
+            ApiMetrics: Shared metrics
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    @staticmethod
+    def get_labels(base_url: str, method: str, url: str) -> tuple[str, str, str]:
+        """Returns the labels of a request. The DocType is the first path segment below the base URL,
+        for ERPNext the segment after "resource" or "method" (e.g. "Customer" or "upload_file").
+
+        Args:
+            base_url (str): Base URL of the API
+            method (str): HTTP method
+            url (str): Request URL
+
+        Returns:
+            tuple[str, str, str]: Host, method and DocType
+        """
+        parts = urlsplit(url)
+        path = url[len(base_url):] if base_url and url.startswith(base_url) else parts.path.lstrip("/")
+        segments = path.split("?", 1)[0].split("/")
+        doctype = segments[1] if segments[0] in ("resource", "method") and len(segments) > 1 else segments[0]
+        return parts.netloc, method.upper(), unquote(doctype)
+
+    def record(self, labels: tuple[str, str, str], seconds: float, sent_bytes: int = 0, received_bytes: int = 0,
+               error: bool = False) -> None:
+        """Records a request.
+
+        Args:
+            labels (tuple[str, str, str]): Host, method and DocType (see get_labels)
+            seconds (float): Duration of the request (including retries)
+            sent_bytes (int, optional): Bytes of the request body. Defaults to 0.
+            received_bytes (int, optional): Bytes of the response body. Defaults to 0.
+            error (bool, optional): True if the request failed. Defaults to False.
+        """
+        with self._lock:
+            series = self._series.get(labels, None)
+            if series is None:
+                series = self._series[labels] = {"requests": 0, "errors": 0, "sent_bytes": 0, "received_bytes": 0,
+                                                 "latency": Histogram(self.buckets)}
+            series["requests"] += 1
+            series["errors"] += 1 if error else 0
+            series["sent_bytes"] += sent_bytes
+            series["received_bytes"] += received_bytes
+            series["latency"].observe(seconds)
+
+    def reset(self) -> None:
+        """Removes all recorded requests.
+        """
+        with self._lock:
+            self._series = {}
+            self._start = time.time()
+
+    def get_snapshot(self) -> dict:
+        """Returns a copy of the metrics.
+
+        Returns:
+            dict: Start and time of the snapshot (UNIX time) and the series with their labels, counters
+            and latency histogram
+        """
+        with self._lock:
+            series = [{
+                "host"              : host,
+                "method"            : method,
+                "doctype"           : doctype,
+                "requests"          : s["requests"],
+                "errors"            : s["errors"],
+                "sent_bytes"        : s["sent_bytes"],
+                "received_bytes"    : s["received_bytes"],
+                "latency_seconds"   : s["latency"].to_dict()
+            } for (host, method, doctype), s in sorted(self._series.items())]
+        return {"start": self._start, "time": time.time(), "series": series}
+
+    def to_prometheus(self, prefix: str = "migration_api") -> str:
+        """Returns the metrics in the Prometheus text format.
+
+        Args:
+            prefix (str, optional): Prefix of the metric names. Defaults to "migration_api".
+
+        Returns:
+            str: Metrics
+        """
+        def escape(value: str) -> str:
+            return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+        snapshot = self.get_snapshot()
+        lines = []
+        for name, kind, help in (("requests_total", "counter", "Requests (including failed ones)"),
+                                 ("errors_total", "counter", "Failed requests"),
+                                 ("sent_bytes_total", "counter", "Bytes of the request bodies"),
+                                 ("received_bytes_total", "counter", "Bytes of the response bodies")):
+            lines += [f"# HELP {prefix}_{name} {help}", f"# TYPE {prefix}_{name} {kind}"]
+            key = name[:-len("_total")]
+            for s in snapshot["series"]:
+                labels = f'host="{escape(s["host"])}",method="{s["method"]}",doctype="{escape(s["doctype"])}"'
+                lines.append(f"{prefix}_{name}{{{labels}}} {s[key]}")
+
+        name = f"{prefix}_request_duration_seconds"
+        lines += [f"# HELP {name} Duration of the requests (including retries)", f"# TYPE {name} histogram"]
+        for s in snapshot["series"]:
+            labels = f'host="{escape(s["host"])}",method="{s["method"]}",doctype="{escape(s["doctype"])}"'
+            for bound, count in s["latency_seconds"]["buckets"].items():
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {s['latency_seconds']['sum']}")
+            lines.append(f"{name}_count{{{labels}}} {s['latency_seconds']['count']}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _write(path: str, text: str) -> None:
+        """Writes a file atomically (readers never see a partial file).
+
+        Args:
+            path (str): Path of the file
+            text (str): Content
+        """
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
+
+    def write_json(self, path: str) -> None:
+        """Writes a snapshot as JSON.
+
+        Args:
+            path (str): Path of the file
+        """
+        self._write(path, json.dumps(self.get_snapshot(), indent=2))
+
+    def write_prometheus(self, path: str) -> None:
+        """Writes a snapshot as Prometheus textfile (e.g. for the textfile collector of the node exporter).
+
+        Args:
+            path (str): Path of the file (should end with .prom)
+        """
+        self._write(path, self.to_prometheus())
+
+    def print_report(self) -> None:
+        """Prints requests, errors, bytes and estimated latency percentiles per host, method and DocType.
+        """
+        print(f"{'Host':<28}{'Method':<8}{'DocType':<28}{'Requests':>9}{'Errors':>8}{'Sent KB':>10}"
+              f"{'Recv KB':>10}{'p50':>8}{'p95':>8}{'p99':>8}")
+        with self._lock:
+            for (host, method, doctype), s in sorted(self._series.items()):
+                latency = s["latency"]
+                print(f"{host:<28}{method:<8}{doctype:<28}{s['requests']:>9}{s['errors']:>8}"
+                      f"{s['sent_bytes'] / 1024:>10.1f}{s['received_bytes'] / 1024:>10.1f}"
+                      + "".join(f"{'<' + format(latency.get_quantile(q), 'g') + 's':>8}" for q in (0.5, 0.95, 0.99)))
+
+class MetricsExporter:
+    """Writes snapshots of ApiMetrics periodically (and once more when stopped) by a daemon thread.
+    Usable as context manager.
+    """
+
+    def __init__(self, metrics: ApiMetrics, interval: float = 60, json_path: str = None,
+                 prometheus_path: str = None):
+        """Initializes the exporter.
+
+        Args:
+            metrics (ApiMetrics): Metrics to export
+            interval (float, optional): Seconds between the exports. Defaults to 60.
+            json_path (str, optional): Path of the JSON-snapshot (None = not written). Defaults to None.
+            prometheus_path (str, optional): Path of the Prometheus textfile (None = not written). Defaults to None.
+        """
+        self.metrics = metrics
+        self.interval = max(1, interval)
+        self.json_path = json_path
+        self.prometheus_path = prometheus_path
+        self._stop = Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def export(self) -> None:
+        """Writes a snapshot now. Errors are printed, so a failing export doesn't stop a run.
+        """
+        try:
+            if self.json_path:
+                self.metrics.write_json(self.json_path)
+            if self.prometheus_path:
+                self.metrics.write_prometheus(self.prometheus_path)
+        except OSError as e:
+            print(f"Could not export metrics: {e}")
+
+    def _run(self) -> None:
+        """Exports until stopped (target of the thread).
+        """
+        while not self._stop.wait(self.interval):
+            self.export()
+
+    def start(self) -> None:
+        """Starts the export thread (nothing to do without paths).
+        """
+        if self._thread or not (self.json_path or self.prometheus_path):
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name="metrics-exporter", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stops the export thread and writes a final snapshot.
+        """
+        if not self._thread:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self.export()
@@ -0,0 +1,64 @@
+import asyncio
+import mimetypes
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Iterator
+
+class MultipartFile:
+    """Streaming multipart/form-data body with form fields and one file.
+    The file is read chunk by chunk while sending, so it isn't held in memory.
+    The body can be iterated again (e.g. by a retry) and knows its length, so it's sent with Content-Length.
+    It can be sent by requests (iteration) and by aiohttp (async iteration, the file is read in a worker thread).
+    """
+
+    def __init__(self, fields: dict, file_field: str, file_path: str, file_name: str = None,
+                 chunk_size: int = 65536):
+        """Initializes the body.
+
+        Args:
+            fields (dict): Form fields (names mapped to values)
+            file_field (str): Name of the file field
+            file_path (str): Path of the file to send
+            file_name (str, optional): Name of the file. Defaults to the name of the file path.
+            chunk_size (int, optional): Bytes read from the file at once. Defaults to 65536.
+        """
+        self.file_path = file_path
+        self.chunk_size = chunk_size
+        self.boundary = uuid.uuid4().hex
+        file_name = file_name or Path(file_path).name
+        file_type = mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+
+        head = ""
+        for name, value in fields.items():
+            head += f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+        head += f'--{self.boundary}\r\nContent-Disposition: form-data; name="{file_field}"; ' \
+                f'filename="{file_name}"\r\nContent-Type: {file_type}\r\n\r\n'
+        self._head = head.encode("utf-8")
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode("utf-8")
+
+    @property
+    def content_type(self) -> str:
+        """Returns the Content-Type header of the body.
+
+        Returns:
+            str: Content-Type
+        """
+        return f"multipart/form-data; boundary={self.boundary}"
+
+    def __len__(self) -> int:
+        return len(self._head) + os.path.getsize(self.file_path) + len(self._tail)
+
+    def __iter__(self) -> Iterator[bytes]:
+        yield self._head
+        with open(self.file_path, "rb") as file:
+            while chunk := file.read(self.chunk_size):
+                yield chunk
+        yield self._tail
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        yield self._head
+        with open(self.file_path, "rb") as file:
+            while chunk := await asyncio.to_thread(file.read, self.chunk_size):
+                yield chunk
+        yield self._tail
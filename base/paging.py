@@ -0,0 +1,83 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, Callable, Iterator
+
+def iter_pages(get_page: Callable[[int], list], page_size: int, max_workers: int = 1,
+               pages: int = None) -> Iterator[list]:
+    """Yields pages in page order, fetched by a pool of max_workers threads.
+    The pool works on a sliding window: never more than max_workers pages are requested or held at once,
+    so memory depends on the page size and not on the amount of entities.
+
+    Args:
+        get_page (Callable[[int], list]): Function returning the entities of a page (page index starting with 0)
+        page_size (int): Amount of entities per page
+        max_workers (int, optional): Amount of pages fetched in parallel. Defaults to 1.
+        pages (int, optional): Amount of pages. Defaults to None (pages are fetched until the first page
+        with less than page_size entities, requests beyond it are dropped).
+
+    Yields:
+        list: Entities of a page (empty pages are skipped)
+    """
+    max_workers = max(1, max_workers)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Prefetch the first window of pages
+        last_page = max_workers if pages is None else min(max_workers, pages)
+        futures = {page: executor.submit(get_page, page) for page in range(last_page)}
+        page = 0
+        try:
+            while page in futures:
+                entities = futures.pop(page).result()
+                if entities:
+                    yield entities
+
+                # Short page -> last page reached, drop the speculative requests
+                if pages is None and len(entities) < page_size:
+                    break
+
+                # Move the window one page further
+                next_page = page + max_workers
+                if pages is None or next_page < pages:
+                    futures[next_page] = executor.submit(get_page, next_page)
+                page += 1
+        finally:
+            for future in futures.values():
+                future.cancel()
+
+async def aiter_pages(get_page: Callable[[int], Awaitable[list]], page_size: int, max_concurrency: int = 1,
+                      pages: int = None) -> AsyncIterator[list]:
+    """Yields pages in page order, fetched by up to max_concurrency tasks (asyncio variant of iter_pages).
+    Same sliding window: never more than max_concurrency pages are requested or held at once.
+
+    Args:
+        get_page (Callable[[int], Awaitable[list]]): Coroutine function returning the entities of a page
+        (page index starting with 0)
+        page_size (int): Amount of entities per page
+        max_concurrency (int, optional): Amount of pages fetched at once. Defaults to 1.
+        pages (int, optional): Amount of pages. Defaults to None (pages are fetched until the first page
+        with less than page_size entities, requests beyond it are dropped).
+
+    Yields:
+        list: Entities of a page (empty pages are skipped)
+    """
+    max_concurrency = max(1, max_concurrency)
+    last_page = max_concurrency if pages is None else min(max_concurrency, pages)
+    tasks = {page: asyncio.ensure_future(get_page(page)) for page in range(last_page)}
+    page = 0
+    try:
+        while page in tasks:
+            entities = await tasks.pop(page)
+            if entities:
+                yield entities
+
+            # Short page -> last page reached, drop the speculative requests
+            if pages is None and len(entities) < page_size:
+                break
+
+            # Move the window one page further
+            next_page = page + max_concurrency
+            if pages is None or next_page < pages:
+                tasks[next_page] = asyncio.ensure_future(get_page(next_page))
+            page += 1
+    finally:
+        for task in tasks.values():
+            task.cancel()
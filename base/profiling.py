@@ -0,0 +1,245 @@
+import cProfile
+import functools
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from pathlib import Path
+
+class StageProfiler:
+    """Opt-in profiler of named stages (methods decorated with profile_stage).
+    Only the configured stages are profiled, every other stage runs unchanged.
+    Modes:
+        "cprofile": deterministic profile (cProfile) of every call, written as pstats-file per stage
+        "sampling": wall-clock samples of the stack (including waiting for I/O), written as collapsed stacks
+                    per stage (input of flamegraph.pl, speedscope, ...)
+    Stages called by several threads at once are profiled per call and merged. Stages nested in a profiled
+    stage of the same thread are part of the outer profile. The profiler is configured per process,
+    stages running in other processes (e.g. plans of MigrationWrapper.migrate_staged) aren't profiled.
+    """
+
+    """tuple[str]: Available modes."""
+    modes = ("cprofile", "sampling")
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, stages: list[str], mode: str = "cprofile", interval: float = 0.005,
+                 output_path: str = "./profiles/"):
+        """Initializes the profiler.
+
+        Args:
+            stages (list[str]): Names of the stages to profile, e.g. "InvoiceMigration._map_items"
+            (wildcards allowed, e.g. "WcCacheWrapper.*")
+            mode (str, optional): "cprofile" or "sampling". Defaults to "cprofile".
+            interval (float, optional): Seconds between two samples (sampling only). Defaults to 0.005.
+            output_path (str, optional): Directory of the written profiles. Defaults to "./profiles/".
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in self.modes:
+            raise ValueError(f"Unknown profiling mode '{mode}' (available: {', '.join(self.modes)}).")
+        self.stages = list(stages)
+        self.mode = mode
+        self.interval = interval
+        self.output_path = output_path
+        self._enabled = {}          # Stage names mapped to True if configured (cache of the patterns)
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stats = {}            # Stages mapped to their merged pstats.Stats (cprofile)
+        self._samples = {}          # Stages mapped to the counts of their collapsed stacks (sampling)
+        self._active = {}           # Thread IDs mapped to the profiled stage (sampling)
+        self._sampler = None
+        self._skipped = 0           # Calls not profiled, because another profiler was active (cprofile)
+
+    @classmethod
+    def configure(cls, stages: list[str], mode: str = "cprofile", interval: float = 0.005,
+                  output_path: str = "./profiles/") -> "StageProfiler":
+        """Sets the profiler of the process. A profiler with the same settings is kept (with its data).
+
+        Args:
+            stages (list[str]): Names of the stages to profile (empty = profiling off)
+            mode (str, optional): "cprofile" or "sampling". Defaults to "cprofile".
+            interval (float, optional): Seconds between two samples (sampling only). Defaults to 0.005.
+            output_path (str, optional): Directory of the written profiles. Defaults to "./profiles/".
+
+        Returns:
+            StageProfiler: Profiler or None if profiling is off
+        """
+        with cls._shared_lock:
+            shared = cls._shared
+            if not stages:
+                cls._shared = None
+            elif not shared or (shared.stages, shared.mode, shared.interval, shared.output_path) != \
+                    (list(stages), mode, interval, output_path):
+                cls._shared = cls(stages, mode, interval, output_path)
+            return cls._shared
+
+    @classmethod
+    def get_shared(cls) -> "StageProfiler":
+        """Returns the profiler of the process.
+
+        Returns:
+            StageProfiler: Profiler or None if profiling is off
+        """
+        return cls._shared
+
+    def is_enabled(self, stage: str) -> bool:
+        """Returns if a stage is profiled.
+
+        Args:
+            stage (str): Name of the stage
+
+        Returns:
+            bool: True if profiled
+        """
+        enabled = self._enabled.get(stage, None)
+        if enabled is None:
+            enabled = self._enabled[stage] = any(fnmatchcase(stage, pattern) for pattern in self.stages)
+        return enabled
+
+    @contextmanager
+    def profile(self, stage: str):
+        """Profiles the code of the with-block as a call of the stage.
+
+        Args:
+            stage (str): Name of the stage
+        """
+        if getattr(self._local, "stage", None):
+            # Part of the profile of the outer stage
+            yield
+            return
+        self._local.stage = stage
+        try:
+            if self.mode == "cprofile":
+                with self._profile_calls(stage):
+                    yield
+            else:
+                with self._sample_calls(stage):
+                    yield
+        finally:
+            self._local.stage = None
+
+    @contextmanager
+    def _profile_calls(self, stage: str):
+        """Profiles the with-block with cProfile and merges the profile into the stage.
+
+        Args:
+            stage (str): Name of the stage
+        """
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active (since Python 3.12 cProfile can't run in several threads at once)
+            with self._lock:
+                self._skipped += 1
+            yield
+            return
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                if stage in self._stats:
+                    self._stats[stage].add(profile)
+                else:
+                    self._stats[stage] = pstats.Stats(profile)
+
+    @contextmanager
+    def _sample_calls(self, stage: str):
+        """Registers the thread for the sampler while the with-block runs.
+
+        Args:
+            stage (str): Name of the stage
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._active[thread_id] = stage
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name="stage-profiler", daemon=True)
+                self._sampler.start()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active.pop(thread_id, None)
+
+    def _sample(self) -> None:
+        """Samples the stacks of the registered threads until no thread is registered (target of the sampler).
+        """
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                if not self._active:
+                    self._sampler = None
+                    return
+                for thread_id, stage in self._active.items():
+                    frame = frames.get(thread_id, None)
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                        frame = frame.f_back
+                    self._samples.setdefault(stage, Counter())[";".join(reversed(stack))] += 1
+
+    def write(self) -> list[str]:
+        """Writes the profiles of all profiled stages and resets them.
+
+        Returns:
+            list[str]: Paths of the written files
+        """
+        with self._lock:
+            stats, samples, skipped = self._stats, self._samples, self._skipped
+            self._stats, self._samples, self._skipped = {}, {}, 0
+        if not stats and not samples:
+            return []
+
+        output_path = Path(self.output_path)
+        output_path.mkdir(parents=True, exist_ok=True)
+        now = time.time()
+        timestamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}-{int(now * 1000) % 1000:03d}"
+        paths = []
+        for stage, stage_stats in stats.items():
+            path = output_path.joinpath(f"{stage}-{timestamp}.pstats")
+            stage_stats.dump_stats(str(path))
+            paths.append(str(path))
+        for stage, counts in samples.items():
+            path = output_path.joinpath(f"{stage}-{timestamp}.collapsed")
+            with open(path, "w", encoding="utf-8") as file:
+                for stack, count in counts.most_common():
+                    file.write(f"{stack} {count}\n")
+            paths.append(str(path))
+
+        for path in paths:
+            print(f"Profile written to {path}")
+        if skipped:
+            print(f"{skipped} calls were not profiled, another profiler was active")
+        return paths
+
+def profile_stage(name: str = None):
+    """Decorator marking a method as stage for the StageProfiler.
+    Without configured profiler (or if the stage isn't configured) the method runs unchanged.
+
+    Args:
+        name (str, optional): Name of the stage. Defaults to the class of the instance and the name
+        of the method (e.g. "InvoiceMigration.migrate" for an inherited BaseMigration.migrate).
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            profiler = StageProfiler._shared
+            if profiler is None:
+                return fn(*args, **kwargs)
+            stage = name or f"{type(args[0]).__name__}.{fn.__name__}"
+            if not profiler.is_enabled(stage):
+                return fn(*args, **kwargs)
+            with profiler.profile(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
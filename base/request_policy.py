@@ -0,0 +1,251 @@
+import random
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+from urllib.parse import urlsplit
+import requests
+
+class TokenBucket:
+    """Token bucket limiting the request rate to a host.
+    The rate adapts to the server: it is halved on every "429 Too Many Requests"
+    and recovers step by step with every successful request up to the configured rate.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        """Initializes a full bucket.
+
+        Args:
+            rate (float): Maximum requests per second
+            burst (float, optional): Maximum amount of requests sent at once. Defaults to 1.0.
+        """
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = rate / 32
+        self.capacity = max(1.0, burst)
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = Lock()
+
+    def reserve(self) -> float:
+        """Takes a token without waiting for it.
+
+        Returns:
+            float: Seconds to wait until the token is available
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= 1        # Reserve the token, waiting happens outside of the lock
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def acquire(self) -> float:
+        """Takes a token, waits until it is available.
+
+        Returns:
+            float: Seconds waited
+        """
+        wait = self.reserve()
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def decrease(self) -> None:
+        """Halves the rate (multiplicative decrease), e.g. after a 429-response.
+        """
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def increase(self) -> None:
+        """Raises the rate by 5 % of the maximum rate (additive increase) after a successful request.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+class RequestPolicy:
+    """Policy for sending requests: per-host rate limiting, timeouts and retries
+    with exponential backoff and jitter (respecting "Retry-After").
+    Counts requests, retries and throttling for reporting.
+    """
+
+    """set[int]: Status codes which are retried for every method (request wasn't processed)."""
+    RETRY_STATUS = {429, 503}
+
+    """set[int]: Status codes which are retried for idempotent methods only."""
+    RETRY_STATUS_IDEMPOTENT = {500, 502, 504}
+
+    """set[str]: Methods which can be sent again without side effects."""
+    IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+    def __init__(self, rate_limit: float = 0, burst: float = 1.0, timeout: float = 60,
+                 max_retries: int = 5, backoff_base: float = 0.5, backoff_max: float = 60):
+        """Initializes the request policy.
+
+        Args:
+            rate_limit (float, optional): Maximum requests per second and host, 0 = unlimited. Defaults to 0.
+            burst (float, optional): Maximum amount of requests sent at once per host. Defaults to 1.0.
+            timeout (float, optional): Timeout in seconds for connecting and reading. Defaults to 60.
+            max_retries (int, optional): Maximum amount of retries per request. Defaults to 5.
+            backoff_base (float, optional): Backoff in seconds before the first retry. Defaults to 0.5.
+            backoff_max (float, optional): Maximum backoff in seconds. Defaults to 60.
+        """
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._buckets = {}
+        self._lock = Lock()
+        self._stats = {
+            "requests"          : 0,    # Sent requests (including retries)
+            "retries"           : 0,    # Retried requests
+            "throttled"         : 0,    # Requests delayed by the rate limit
+            "throttled_seconds" : 0.0,  # Time spent waiting for the rate limit
+            "rate_limited"      : 0,    # 429-responses
+            "failed"            : 0     # Requests failed after all retries
+        }
+
+    def _count(self, key: str, value: float = 1) -> None:
+        """Increases a counter.
+
+        Args:
+            key (str): Name of the counter
+            value (float, optional): Value to add. Defaults to 1.
+        """
+        with self._lock:
+            self._stats[key] += value
+
+    def get_stats(self) -> dict:
+        """Returns a copy of the counters.
+
+        Returns:
+            dict: Counters
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["rates"] = {host: bucket.rate for host, bucket in self._buckets.items()}
+        return stats
+
+    def _get_bucket(self, url: str) -> TokenBucket:
+        """Returns the token bucket of the host of the URL.
+
+        Args:
+            url (str): Request URL
+
+        Returns:
+            TokenBucket: Token bucket or None if unlimited
+        """
+        if not self.rate_limit or self.rate_limit <= 0:
+            return None
+        host = urlsplit(url).netloc
+        with self._lock:
+            if host not in self._buckets:
+                self._buckets[host] = TokenBucket(self.rate_limit, self.burst)
+            return self._buckets[host]
+
+    def _get_backoff(self, attempt: int, response: requests.Response = None) -> float:
+        """Returns the seconds to wait before the next attempt.
+        Uses "Retry-After" if the server sent it, else exponential backoff with full jitter.
+
+        Args:
+            attempt (int): Number of the failed attempt (starting with 0)
+            response (requests.Response, optional): Response of the failed attempt. Defaults to None.
+
+        Returns:
+            float: Seconds to wait
+        """
+        retry_after = response.headers.get("Retry-After", None) if response is not None else None
+        if retry_after:
+            try:
+                return min(self.backoff_max, max(0.0, float(retry_after)))
+            except ValueError:
+                try:
+                    date = parsedate_to_datetime(retry_after)
+                    return min(self.backoff_max, max(0.0, (date - datetime.now(timezone.utc)).total_seconds()))
+                except (TypeError, ValueError):
+                    pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _is_retryable(self, method: str, response: requests.Response = None,
+                      error: requests.RequestException = None) -> bool:
+        """Returns if a failed attempt can be retried.
+
+        Args:
+            method (str): HTTP method
+            response (requests.Response, optional): Response of the attempt. Defaults to None.
+            error (requests.RequestException, optional): Error of the attempt. Defaults to None.
+
+        Returns:
+            bool: True if retryable
+        """
+        idempotent = method.upper() in self.IDEMPOTENT_METHODS
+        if error is not None:
+            # Connection couldn't be established -> request wasn't sent
+            if isinstance(error, requests.ConnectTimeout):
+                return True
+            return idempotent and isinstance(error, (requests.ConnectionError, requests.Timeout))
+        if response is not None:
+            return response.status_code in self.RETRY_STATUS or \
+                (idempotent and response.status_code in self.RETRY_STATUS_IDEMPOTENT)
+        return False
+
+    def send(self, session: requests.Session, method: str, url: str, **kwargs) -> requests.Response:
+        """Sends a request according to the policy.
+
+        Args:
+            session (requests.Session): Session to send the request with
+            method (str): HTTP method
+            url (str): URL
+            **kwargs: Further arguments for requests.Session.request
+
+        Returns:
+            requests.Response: Response of the last attempt
+
+        Raises:
+            requests.RequestException: If the last attempt failed without response
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        bucket = self._get_bucket(url)
+        attempt = 0
+        while True:
+            # Rate limit
+            if bucket:
+                waited = bucket.acquire()
+                if waited > 0:
+                    self._count("throttled")
+                    self._count("throttled_seconds", waited)
+
+            self._count("requests")
+            response = None
+            error = None
+            try:
+                response = session.request(method=method, url=url, **kwargs)
+            except requests.RequestException as e:
+                error = e
+
+            if response is not None and response.status_code == 429:
+                self._count("rate_limited")
+                if bucket:
+                    bucket.decrease()
+            elif response is not None and response.status_code < 400 and bucket:
+                bucket.increase()
+
+            # Done, or give up
+            if (error is None and response.ok) or attempt >= self.max_retries or \
+                    not self._is_retryable(method, response, error):
+                if error is not None:
+                    self._count("failed")
+                    raise error
+                if not response.ok:
+                    self._count("failed")
+                return response
+
+            # Retry after backoff
+            backoff = self._get_backoff(attempt, response)
+            if response is not None:
+                response.close()
+            self._count("retries")
+            time.sleep(backoff)
+            attempt += 1
@@ -0,0 +1,81 @@
+from threading import Lock
+import requests
+from requests.adapters import HTTPAdapter
+
+class Transport:
+    """Pooled HTTP transport shared by the sessions of the API classes.
+    All sessions created by a transport use the same connection pools, so connections are kept alive
+    and reused across sessions and threads. The connections per host are limited by pool_maxsize.
+    """
+
+    _shared = {}
+    _shared_lock = Lock()
+
+    def __init__(self, pool_maxsize: int = 10, pool_connections: int = 10, pool_block: bool = False):
+        """Initializes the transport.
+
+        Args:
+            pool_maxsize (int, optional): Connections kept open per host, should match the amount of parallel
+            requests. Defaults to 10.
+            pool_connections (int, optional): Amount of hosts to keep connection pools for. Defaults to 10.
+            pool_block (bool, optional): If True, requests wait for a free connection instead of opening
+            connections beyond pool_maxsize (which are closed after use). Defaults to False.
+        """
+        self.pool_maxsize = pool_maxsize
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize,
+                                   pool_block=pool_block, max_retries=0)   # Retries are done by RequestPolicy
+
+    @classmethod
+    def get_shared(cls, pool_maxsize: int = 10, pool_connections: int = 10, pool_block: bool = False) -> "Transport":
+        """Returns the transport shared by all users with the same settings.
+
+        Args:
+            pool_maxsize (int, optional): Connections kept open per host. Defaults to 10.
+            pool_connections (int, optional): Amount of hosts to keep connection pools for. Defaults to 10.
+            pool_block (bool, optional): If True, requests wait for a free connection. Defaults to False.
+
+        Returns:
+            Transport: Shared transport
+        """
+        key = (pool_maxsize, pool_connections, pool_block)
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(pool_maxsize, pool_connections, pool_block)
+            return cls._shared[key]
+
+    def create_session(self, headers: dict = None, auth=None) -> requests.Session:
+        """Creates a session using the connection pools of the transport.
+
+        Args:
+            headers (dict, optional): Headers sent with every request. Defaults to None.
+            auth (optional): Authentication of the session (e.g. HTTPBasicAuth). Defaults to None.
+
+        Returns:
+            requests.Session: Session
+        """
+        session = requests.Session()
+        session.mount("https://", self.adapter)
+        session.mount("http://", self.adapter)
+        session.headers.update({
+            "Accept-Encoding"   : "gzip, deflate",
+            "Connection"        : "keep-alive"
+        })
+        session.headers.update(headers or {})
+        session.auth = auth
+        return session
+
+    def release(self, session: requests.Session) -> None:
+        """Closes a session created by the transport, the shared connection pools stay open.
+
+        Args:
+            session (requests.Session): Session
+        """
+        for prefix, adapter in list(session.adapters.items()):
+            if adapter is self.adapter:
+                del session.adapters[prefix]
+        session.close()
+
+    def close(self) -> None:
+        """Closes all pooled connections of the transport.
+        """
+        self.adapter.close()
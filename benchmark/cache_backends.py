@@ -0,0 +1,102 @@
+"""Compares the storage backends of WcCacheApi on a synthetic cache.
+
+Usage:
+    python -m benchmark.cache_backends --records 100000 --lookups 20
+"""
+import argparse
+import random
+import tempfile
+import time
+from weclapp import WcCacheApi
+
+def synthetic_customers(count: int) -> list[dict]:
+    """Returns synthetic customer entities with the same keys.
+
+    Args:
+        count (int): Amount of customers
+
+    Returns:
+        list[dict]: Customers
+    """
+    return [{
+        "id"                : str(100000 + i),
+        "customerNumber"    : f"K{i:06d}",
+        "company"           : f"Company {i} GmbH",
+        "partyType"         : "ORGANIZATION",
+        "email"             : f"info@company{i}.example",
+        "phone"             : f"0711 {i:07d}",
+        "lastModifiedDate"  : 1600000000000 + i,
+        "addresses"         : [{"id": str(900000 + i), "street1": f"Street {i}", "city": "Stuttgart",
+                                "zipcode": "70173", "countryCode": "DE", "primeAddress": True}]
+    } for i in range(count)]
+
+def measure(label: str, results: dict, fn, repeat: int = 1) -> None:
+    """Runs fn repeat times and stores the seconds per run under label.
+
+    Args:
+        label (str): Name of the operation
+        results (dict): Results to store the timing in
+        fn: Function to run
+        repeat (int, optional): Amount of runs. Defaults to 1.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    results[label] = (time.perf_counter() - start) / max(1, repeat)
+
+def run_backend(backend: str, records: list[dict], lookups: int, page_size: int) -> dict:
+    """Runs all operations against a fresh cache of the given backend.
+
+    Args:
+        backend (str): Backend name
+        records (list[dict]): Entities to write
+        lookups (int): Amount of single-entity operations per measured operation
+        page_size (int): Entities per page for the bulk write
+
+    Returns:
+        dict: Seconds per operation
+    """
+    results = {}
+    ids = [record["id"] for record in random.sample(records, min(lookups, len(records)))]
+    numbers = [f"K{int(id) - 100000:06d}" for id in ids]
+
+    with tempfile.TemporaryDirectory() as base_path:
+        cache = WcCacheApi(base_path, backend)
+        cache.open()
+        pages = [records[i:i + page_size] for i in range(0, len(records), page_size)]
+        measure("write_pages (all)", results, lambda: cache.write_pages("customer", pages))
+        measure("get_all", results, lambda: cache.get_all("customer"))
+        measure("get (per call)", results, lambda: [cache.get("customer", id) for id in ids])
+        results["get (per call)"] /= max(1, len(ids))
+        measure("search (per call)", results, lambda: [cache.search("customer", "customerNumber", n) for n in numbers])
+        results["search (per call)"] /= max(1, len(numbers))
+        measure("update (per call)", results, lambda: [cache.update("customer", id, {"email": "new@example.com"})
+                                                       for id in ids])
+        results["update (per call)"] /= max(1, len(ids))
+        new_records = [{**records[0], "id": f"new{i}"} for i in range(len(ids))]
+        measure("create (per call)", results, lambda: [cache.create("customer", record) for record in new_records])
+        results["create (per call)"] /= max(1, len(new_records))
+        measure("upsert_many (lookups)", results,
+                lambda: cache.upsert_many("customer", [{**record, "email": "up@example.com"} for record in new_records]))
+        cache.close()
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the WcCacheApi storage backends")
+    parser.add_argument("--records", type=int, default=100000, help="amount of cached entities")
+    parser.add_argument("--lookups", type=int, default=20, help="amount of single-entity operations")
+    parser.add_argument("--page-size", type=int, default=100, help="entities per page for the bulk write")
+    parser.add_argument("--backends", nargs="+", default=WcCacheApi.backends, help="backends to compare")
+    args = parser.parse_args()
+
+    records = synthetic_customers(args.records)
+    results = {backend: run_backend(backend, records, args.lookups, args.page_size) for backend in args.backends}
+
+    # Print comparison table
+    print(f"{args.records} records, {args.lookups} lookups (seconds)")
+    print(f"{'operation':<24}" + "".join(f"{backend:>14}" for backend in args.backends))
+    for operation in next(iter(results.values())):
+        print(f"{operation:<24}" + "".join(f"{results[backend][operation]:>14.6f}" for backend in args.backends))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""End-to-end benchmark: caches a synthetic WeClapp tenant and migrates it to ERPNext,
+both served by local stand-ins (see benchmark.stand_ins) with configurable latency, jitter and error rate.
+Measures throughput, request latency and memory per stage and compares them with saved baselines,
+so regressions show up before a real migration.
+
+Usage:
+    python -m benchmark.end_to_end --records 1000 10000 100000 --save
+    python -m benchmark.end_to_end --records 1000 --latency 0.02 --jitter 0.01 --error-rate 0.01
+"""
+import argparse
+import contextlib
+import gc
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from threading import Lock
+import config
+from base import RequestPolicy
+from erpnext import ERPNextDocType
+from migration import MigrationWrapper
+from weclapp import WeClappAPI, WeClappDocType, WcCacheWrapper
+from .stand_ins import FrappeStandIn, WeClappStandIn
+
+"""Path: Default file of the baselines."""
+BASELINE_PATH = Path(__file__).parent.joinpath("baselines", "end_to_end.json")
+
+"""dict[str, bool]: Compared metrics, mapped to True if higher is better."""
+METRICS = {
+    "throughput"    : True,
+    "p95_ms"        : False,
+    "peak_mb"       : False
+}
+
+class TimedRequestPolicy:
+    """Wraps the request policy of an API and records the duration of every request
+    (as seen by the client, including retries and backoff).
+    """
+
+    def __init__(self, policy: RequestPolicy):
+        """Initializes the timed policy.
+
+        Args:
+            policy (RequestPolicy): Wrapped policy
+        """
+        self.policy = policy
+        self.durations = []
+        self._lock = Lock()
+
+    def send(self, session, method: str, url: str, **kwargs):
+        start = time.perf_counter()
+        try:
+            return self.policy.send(session, method, url, **kwargs)
+        finally:
+            duration = time.perf_counter() - start
+            with self._lock:
+                self.durations.append(duration)
+
+    def get_stats(self) -> dict:
+        return self.policy.get_stats()
+
+@contextlib.contextmanager
+def override_config(**values):
+    """Sets config values and restores them afterwards.
+
+    Args:
+        **values: Config names mapped to their values
+    """
+    previous = {name: getattr(config, name) for name in values}
+    for name, value in values.items():
+        setattr(config, name, value)
+    try:
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+def percentile(values: list[float], share: float) -> float:
+    """Returns the percentile of sorted values (nearest rank).
+
+    Args:
+        values (list[float]): Sorted values
+        share (float): Percentile as share (e.g. 0.95)
+
+    Returns:
+        float: Percentile or 0.0 if there are no values
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, round(share * len(values)) - 1))]
+
+def measure_stage(fn, verbose: bool) -> dict:
+    """Runs a stage and returns its metrics.
+
+    Args:
+        fn: Function running the stage, returns the amount of processed entities and the timed policies
+        verbose (bool): If False, the output of the stage is suppressed
+
+    Returns:
+        dict: Metrics of the stage
+    """
+    gc.collect()
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    with open(os.devnull, "w") as devnull, \
+         contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+        entities, policies = fn()
+    seconds = time.perf_counter() - start
+
+    durations = sorted(duration for policy in policies for duration in policy.durations)
+    stats = [policy.get_stats() for policy in policies]
+    return {
+        "seconds"       : seconds,
+        "entities"      : entities,
+        "throughput"    : entities / seconds if seconds else 0.0,
+        "requests"      : sum(s["requests"] for s in stats),
+        "retries"       : sum(s["retries"] for s in stats),
+        "failed"        : sum(s["failed"] for s in stats),
+        "p50_ms"        : percentile(durations, 0.50) * 1000,
+        "p95_ms"        : percentile(durations, 0.95) * 1000,
+        "p99_ms"        : percentile(durations, 0.99) * 1000,
+        "max_ms"        : (durations[-1] if durations else 0.0) * 1000,
+        "peak_mb"       : tracemalloc.get_traced_memory()[1] / 1024 / 1024 if tracemalloc.is_tracing() else None
+    }
+
+def cache_stage(wc_base_url: str, records: int) -> tuple[int, list[TimedRequestPolicy]]:
+    """Caches all WeClapp DocTypes from the stand-in.
+
+    Args:
+        wc_base_url (str): Base URL of the WeClapp stand-in
+        records (int): Amount of customers and of sales invoices of the tenant
+
+    Returns:
+        tuple[int, list[TimedRequestPolicy]]: Amount of entities of the tenant and the timed policies
+    """
+    wc_api = WeClappAPI(config.WC_API_TOKEN, wc_base_url)
+    wc_api.request_policy = TimedRequestPolicy(wc_api.request_policy)
+    with WcCacheWrapper(wc_api=wc_api) as wrapper:
+        wrapper.cache_all()
+    return 2 * records, [wc_api.request_policy]
+
+def migrate_stage(wc_doctype: WeClappDocType, en_doctype: ERPNextDocType) -> tuple[int, list[TimedRequestPolicy]]:
+    """Migrates a cached DocType to the Frappe stand-in.
+
+    Args:
+        wc_doctype (WeClappDocType): WeClapp DocType
+        en_doctype (ERPNextDocType): ERPNext DocType
+
+    Returns:
+        tuple[int, list[TimedRequestPolicy]]: Amount of created entities and the timed policies
+    """
+    wrapper = MigrationWrapper(wc_doctype, en_doctype)
+    wrapper.en_api.request_policy = TimedRequestPolicy(wrapper.en_api.request_policy)
+    with wrapper:
+        stats = wrapper.migrate_all()
+    return stats["created"], [wrapper.en_api.request_policy]
+
+def run_tenant(records: int, settings: dict, verbose: bool) -> tuple[dict, dict]:
+    """Runs all stages against a fresh synthetic tenant.
+    Caches, journal and identity map are written to a temporary directory.
+
+    Args:
+        records (int): Amount of customers and of sales invoices
+        settings (dict): Settings of the stand-ins
+        verbose (bool): If True, the output of the stages is shown
+
+    Returns:
+        tuple[dict, dict]: Stages mapped to their metrics and the counters of the stand-ins
+    """
+    results = {}
+    with WeClappStandIn(records, settings["latency"], settings["jitter"], settings["error_rate"],
+                        settings["document_every"], settings["document_size"], settings["email_every"]) as wc_server, \
+         FrappeStandIn(settings["latency"], settings["jitter"], settings["error_rate"]) as en_server, \
+         tempfile.TemporaryDirectory() as base_path:
+        Path(base_path).joinpath("cache", "documents").mkdir(parents=True)
+        cwd = os.getcwd()
+        os.chdir(base_path)     # Relative defaults (e.g. the identity map) end up in the temporary directory
+        try:
+            # The stand-ins don't throttle, so the client isn't either
+            with override_config(WC_RATE_LIMIT=0, EN_RATE_LIMIT=0, EN_API_BASE=en_server.base_url,
+                                 WC_CACHE_BASE=f"{base_path}/cache/",
+                                 WC_CACHE_DOCUMENTS_BASE=f"{base_path}/cache/documents/",
+                                 EN_MIGRATION_JOURNAL=f"{base_path}/migration_journal.sqlite3"):
+                results["cache_all"] = measure_stage(lambda: cache_stage(wc_server.base_url, records), verbose)
+                results["migrate_customers"] = measure_stage(
+                    lambda: migrate_stage(WeClappDocType.CUSTOMER, ERPNextDocType.CUSTOMER), verbose)
+                results["migrate_invoices"] = measure_stage(
+                    lambda: migrate_stage(WeClappDocType.SALES_INVOICE, ERPNextDocType.SALES_INVOICE), verbose)
+        finally:
+            os.chdir(cwd)
+        servers = {"weclapp": wc_server.get_stats(), "erpnext": en_server.get_stats()}
+    return results, servers
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Compares results with a baseline.
+
+    Args:
+        results (dict): Record counts mapped to the metrics per stage
+        baseline (dict): Saved results
+        tolerance (float): Allowed relative deterioration (e.g. 0.2 = 20 %)
+
+    Returns:
+        list[str]: Regressions
+    """
+    regressions = []
+    for records, stages in results.items():
+        for stage, metrics in stages.items():
+            saved = baseline.get(records, {}).get(stage, None)
+            if not saved:
+                continue
+            for metric, higher_is_better in METRICS.items():
+                value, saved_value = metrics.get(metric, None), saved.get(metric, None)
+                if value is None or not saved_value:
+                    continue
+                change = (value - saved_value) / saved_value
+                if (-change if higher_is_better else change) > tolerance:
+                    regressions.append(f"{records} records, {stage}, {metric}: {saved_value:.2f} -> {value:.2f} "
+                                       f"({change * 100:+.1f} %)")
+    return regressions
+
+def print_results(results: dict, baseline: dict) -> None:
+    """Prints the metrics per record count and stage, with the throughput change against the baseline.
+
+    Args:
+        results (dict): Record counts mapped to the metrics per stage
+        baseline (dict): Saved results
+    """
+    print(f"{'records':>8} {'stage':<20}{'seconds':>9}{'entities':>10}{'per sec':>10}{'vs base':>9}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'requests':>10}{'retries':>9}{'peak MB':>9}")
+    for records, stages in results.items():
+        for stage, m in stages.items():
+            saved = baseline.get(records, {}).get(stage, {}).get("throughput", None)
+            delta = f"{(m['throughput'] - saved) / saved * 100:+.1f}%" if saved else "-"
+            peak = f"{m['peak_mb']:.1f}" if m["peak_mb"] is not None else "-"
+            print(f"{records:>8} {stage:<20}{m['seconds']:>9.1f}{m['entities']:>10}{m['throughput']:>10.1f}"
+                  f"{delta:>9}{m['p50_ms']:>9.1f}{m['p95_ms']:>9.1f}{m['p99_ms']:>9.1f}{m['requests']:>10}"
+                  f"{m['retries']:>9}{peak:>9}")
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark of caching and migration "
+                                                 "against local stand-ins of WeClapp and ERPNext")
+    parser.add_argument("--records", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="amounts of customers and of sales invoices per synthetic tenant")
+    parser.add_argument("--latency", type=float, default=0.002, help="seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.001, help="maximum seconds added to or removed "
+                                                                     "from the latency")
+    parser.add_argument("--error-rate", type=float, default=0.001, help="share of requests answered with HTTP 503")
+    parser.add_argument("--document-every", type=int, default=10, help="every n-th invoice has a document")
+    parser.add_argument("--document-size", type=int, default=32768, help="bytes per document")
+    parser.add_argument("--email-every", type=int, default=10, help="every n-th invoice has an archived e-mail")
+    parser.add_argument("--no-memory", action="store_true", help="don't trace memory (tracing slows the client)")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH, help="file of the baselines")
+    parser.add_argument("--save", action="store_true", help="save the results as baselines")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed deterioration against the baselines")
+    parser.add_argument("--verbose", action="store_true", help="show the output of caching and migration")
+    args = parser.parse_args()
+
+    settings = {
+        "latency"           : args.latency,
+        "jitter"            : args.jitter,
+        "error_rate"        : args.error_rate,
+        "document_every"    : args.document_every,
+        "document_size"     : args.document_size,
+        "email_every"       : args.email_every,
+        "memory"            : not args.no_memory,
+        "cache_backend"     : config.WC_CACHE_BACKEND
+    }
+    baseline_path = args.baseline.resolve()
+    saved = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+    baseline = saved.get("results", {})
+    if baseline and saved.get("settings", None) != settings:
+        print(f"Warning: the baselines were measured with other settings: {saved.get('settings', None)}")
+
+    if not args.no_memory:
+        tracemalloc.start()
+    results, servers = {}, {}
+    for records in args.records:
+        results[str(records)], servers[str(records)] = run_tenant(records, settings, args.verbose)
+
+    print_results(results, baseline)
+    print("Requests and injected errors of the stand-ins:")
+    for records, stats in servers.items():
+        print(f"  {records} records: WeClapp {stats['weclapp']}, ERPNext {stats['erpnext']}")
+
+    if args.save:
+        # Baselines of other record counts are kept if measured with the same settings
+        if saved.get("settings", None) == settings:
+            results = {**baseline, **results}
+        baseline_path.parent.mkdir(parents=True, exist_ok=True)
+        baseline_path.write_text(json.dumps({"settings": settings, "results": results}, indent=2))
+        print(f"Saved baselines to {baseline_path}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance)
+    for regression in regressions:
+        print(f"Regression: {regression}")
+    if regressions:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,376 @@
+"""Local HTTP stand-ins of the WeClapp and Frappe APIs for the end-to-end benchmark.
+
+Every stand-in runs in its own process (so it doesn't compete with the benchmarked client for the GIL)
+and answers with configurable latency, jitter and error rate. The WeClapp stand-in serves a synthetic
+tenant which is generated per request, so its memory doesn't depend on the amount of records.
+"""
+import json
+import multiprocessing
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock
+from urllib.parse import parse_qs, unquote, urlsplit
+
+"""int: lastModifiedDate of the first synthetic entity (WeClapp timestamps are in milliseconds)."""
+BASE_TIMESTAMP = 1600000000000
+
+def synthetic_entity(doctype: str, index: int) -> dict:
+    """Returns the synthetic WeClapp entity with the given index (same index = same entity).
+
+    Args:
+        doctype (str): WeClapp DocType ("customer" or "salesInvoice")
+        index (int): Index of the entity
+
+    Returns:
+        dict: Entity
+    """
+    if doctype == "customer":
+        return {
+            "id"                : str(100000 + index),
+            "customerNumber"    : f"K{index:06d}",
+            "company"           : f"Company {index} GmbH",
+            "partyType"         : "ORGANIZATION",
+            "email"             : f"info@company{index}.example",
+            "phone"             : f"0711 {index:07d}",
+            "website"           : f"https://company{index}.example",
+            "primaryContactId"  : str(300000 + index),
+            "lastModifiedDate"  : BASE_TIMESTAMP + index,
+            "addresses"         : [{"id": str(200000 + index), "street1": f"Street {index}", "city": "Stuttgart",
+                                    "zipcode": "70173", "countryCode": "DE", "primeAddress": True,
+                                    "invoiceAddress": True}],
+            "contacts"          : [{"id": str(300000 + index), "firstName": "Erika", "lastName": f"Muster {index}",
+                                    "email": f"erika@company{index}.example", "phone": f"0711 {index:07d}"}],
+            "bankAccounts"      : [{"id": str(400000 + index), "accountHolder": f"Company {index} GmbH",
+                                    "accountNumber": f"DE{index:020d}", "bankCode": "60050101",
+                                    "creditInstitute": "BW Bank", "primary": True}] if index % 4 == 0 else []
+        }
+    if doctype == "salesInvoice":
+        return {
+            "id"                : str(500000 + index),
+            "invoiceNumber"     : f"{index:06d}",
+            "customerId"        : str(100000 + index),
+            "customerNumber"    : f"K{index:06d}",
+            "commission"        : f"Order {index}",
+            "invoiceDate"       : BASE_TIMESTAMP + index * 1000,
+            "dueDate"           : BASE_TIMESTAMP + index * 1000 + 14 * 86400000,
+            "netAmount"         : "100.00",
+            "grossAmount"       : "119.00",
+            "paymentStatus"     : "OPEN",
+            "salesInvoiceType"  : "STANDARD_INVOICE",
+            "lastModifiedDate"  : BASE_TIMESTAMP + index,
+            "salesInvoiceItems" : [{"id": str(600000 + index), "title": f"Article {index}", "quantity": 1,
+                                    "unitPrice": "100.00", "unitName": "Stk.", "taxId": "2691"}]
+        }
+    return None
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    """Base request handler of the stand-ins: injects latency and errors, counts the requests
+    and answers with the result of respond (implemented by the subclasses).
+    The settings and counters are attributes of the server.
+    """
+    protocol_version = "HTTP/1.1"       # Keep-alive, as the real APIs
+    disable_nagle_algorithm = True      # Headers and body are written separately
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        """Reads the request body (with Content-Length or chunked).
+
+        Returns:
+            bytes: Body
+        """
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            body = bytearray()
+            while True:
+                size = int(self.rfile.readline().split(b";")[0].strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    return bytes(body)
+                body += self.rfile.read(size)
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get("Content-Length", None) or 0))
+
+    def _send(self, status: int, body, content_type: str = "application/json") -> None:
+        """Sends a response.
+
+        Args:
+            status (int): HTTP status code
+            body: Response JSON or bytes
+            content_type (str, optional): Content type of bytes. Defaults to "application/json".
+        """
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, key: str) -> None:
+        """Increases a counter of the server.
+
+        Args:
+            key (str): Name of the counter
+        """
+        with self.server.lock:
+            self.server.stats[key] = self.server.stats.get(key, 0) + 1
+
+    def _handle(self) -> None:
+        """Handles a request of any method.
+        """
+        url = urlsplit(self.path)
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        body = self._read_body()
+        if url.path == "/__stats":
+            with self.server.lock:
+                return self._send(200, dict(self.server.stats))
+
+        settings = self.server.settings
+        self._count("requests")
+        time.sleep(max(0.0, settings["latency"] + random.uniform(-settings["jitter"], settings["jitter"])))
+        if random.random() < settings["error_rate"]:
+            # Unprocessed request, as an overloaded server would answer
+            self._count("errors")
+            return self._send(503, {"error": "Service unavailable (injected)"})
+        status, response, content_type = self.respond(self.command, unquote(url.path), query, body)
+        self._send(status, response, content_type)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _handle
+
+    def respond(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, object, str]:
+        """Returns the response to a request.
+
+        Args:
+            method (str): HTTP method
+            path (str): Decoded URL path
+            query (dict): Query parameters (first value per name)
+            body (bytes): Request body
+
+        Returns:
+            tuple[int, object, str]: HTTP status code, response JSON (or bytes) and content type
+        """
+        return 404, {"error": "Not found"}, "application/json"
+
+class WeClappHandler(_StandInHandler):
+    """Request handler of the WeClapp stand-in: "{doctype}/count", paged "{doctype}" lists,
+    "document" (with downloads) and "archivedEmail". Only customers and sales invoices have entities,
+    every other DocType is empty.
+    """
+
+    def _get_range(self, doctype: str, query: dict) -> range:
+        """Returns the indexes of the entities matching the filters of the query.
+
+        Args:
+            doctype (str): WeClapp DocType
+            query (dict): Query parameters
+
+        Returns:
+            range: Indexes
+        """
+        if doctype not in ("customer", "salesInvoice"):
+            return range(0)
+        start = 0
+        if "lastModifiedDate-gt" in query:
+            start = max(0, int(query["lastModifiedDate-gt"]) - BASE_TIMESTAMP + 1)
+        if "lastModifiedDate-ge" in query:
+            start = max(0, int(query["lastModifiedDate-ge"]) - BASE_TIMESTAMP)
+        return range(start, self.server.settings["records"])
+
+    def respond(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, object, str]:
+        settings = self.server.settings
+        parts = path.strip("/").split("/")[-4:]
+
+        # Documents
+        if parts[-1] == "download" and parts[-3] == "id":
+            return 200, b"%PDF" + b"\0" * max(0, settings["document_size"] - 4), "application/pdf"
+        if parts[-1] == "document":
+            index = int(query.get("entityId", 0)) - 500000
+            documents = []
+            if query.get("entityName", None) == "salesInvoice" and settings["document_every"] and \
+                    0 <= index < settings["records"] and index % settings["document_every"] == 0:
+                documents.append({"id": f"d{index}", "name": f"RE-{index:06d}.pdf",
+                                  "fileSize": settings["document_size"]})
+            return 200, {"result": documents}, "application/json"
+        if parts[-1] == "archivedEmail":
+            index = int(query.get("entityId", 0)) - 500000
+            emails = []
+            if query.get("entityName", None) == "salesInvoice" and settings["email_every"] and \
+                    0 <= index < settings["records"] and index % settings["email_every"] == 0:
+                emails.append({"id": f"m{index}", "subject": f"Invoice RE-{index:06d}",
+                               "entityName": None, "entityId": None})
+            return 200, {"result": emails}, "application/json"
+
+        # Entities
+        if parts[-1] == "count":
+            return 200, {"result": len(self._get_range(parts[-2], query))}, "application/json"
+        doctype = parts[-1]
+        indexes = self._get_range(doctype, query)
+        page, page_size = int(query.get("page", 1)), int(query.get("pageSize", 100))
+        indexes = indexes[(page - 1) * page_size:page * page_size]
+        return 200, {"result": [synthetic_entity(doctype, index) for index in indexes]}, "application/json"
+
+class FrappeHandler(_StandInHandler):
+    """Request handler of the Frappe stand-in: "resource/{doctype}" (create, update, read, list),
+    "method/frappe.client.insert_many", "method/frappe.client.get_count" and "method/upload_file".
+    Nothing is stored: created entities get generated names, reads find nothing.
+    """
+
+    def _get_name(self, doctype: str, data: dict) -> str:
+        """Returns the name of an entity to create: the name of the payload or a generated one.
+
+        Args:
+            doctype (str): DocType
+            data (dict): Payload
+
+        Returns:
+            str: Name
+        """
+        if data.get("name", None):
+            return data["name"]
+        with self.server.lock:
+            self.server.counter += 1
+            return f"{doctype}-{self.server.counter:08d}"
+
+    def respond(self, method: str, path: str, query: dict, body: bytes) -> tuple[int, object, str]:
+        parts = path.strip("/").split("/")
+        index = parts.index("resource") if "resource" in parts else parts.index("method") if "method" in parts \
+            else len(parts)
+        kind, target = parts[index:index + 2] if len(parts) > index + 1 else (None, None)
+        name = parts[index + 2] if len(parts) > index + 2 else None
+
+        if kind == "method" and target == "upload_file":
+            self._count("uploads")
+            return 200, {"message": {"name": self._get_name("File", {}), "file_size": len(body)}}, \
+                "application/json"
+        if kind == "method" and target == "frappe.client.insert_many":
+            docs = json.loads(json.loads(body)["docs"])
+            return 200, {"message": [self._get_name(doc.get("doctype", "Doc"), doc) for doc in docs]}, \
+                "application/json"
+        if kind == "method":
+            return 200, {"message": 0 if target == "frappe.client.get_count" else None}, "application/json"
+        if kind != "resource":
+            return 404, {"exc_type": "DoesNotExistError"}, "application/json"
+
+        data = json.loads(body) if body else {}
+        if method == "POST":
+            return 200, {"data": {**data, "name": self._get_name(target, data)}}, "application/json"
+        if method == "PUT":
+            return 200, {"data": {**data, "name": name}}, "application/json"
+        if method == "DELETE":
+            return 202, {"message": "ok"}, "application/json"
+        if name:
+            return 404, {"exc_type": "DoesNotExistError"}, "application/json"
+        return 200, {"data": []}, "application/json"
+
+def _serve(handler_class: type, settings: dict, conn) -> None:
+    """Runs a stand-in server until its process is terminated (target of the server process).
+
+    Args:
+        handler_class (type): Request handler class
+        settings (dict): Settings of the stand-in
+        conn: Pipe to send the port to
+    """
+    ThreadingHTTPServer.request_queue_size = 128
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler_class)
+    server.daemon_threads = True
+    server.settings = settings
+    server.stats = {}
+    server.counter = 0
+    server.lock = Lock()
+    conn.send(server.server_port)
+    conn.close()
+    server.serve_forever()
+
+class StandInServer:
+    """Local stand-in of an API, running in its own process. Usable as context manager.
+    """
+
+    """type: Request handler class of the stand-in."""
+    handler_class = _StandInHandler
+
+    """str: Path of the API below the host (with trailing slash)."""
+    api_path = "/"
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, **settings):
+        """Initializes the stand-in, the server is started by start.
+
+        Args:
+            latency (float, optional): Seconds added to every response. Defaults to 0.0.
+            jitter (float, optional): Maximum seconds added to or removed from the latency (uniformly
+            distributed). Defaults to 0.0.
+            error_rate (float, optional): Share of requests answered with HTTP 503 (0.0 - 1.0). Defaults to 0.0.
+            **settings: Further settings of the handler
+        """
+        self.settings = {"latency": latency, "jitter": jitter, "error_rate": error_rate, **settings}
+        self.base_url = None
+        self._process = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def start(self) -> str:
+        """Starts the server process.
+
+        Returns:
+            str: API base URL with trailing slash
+        """
+        context = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = context.Pipe()
+        self._process = context.Process(target=_serve, args=(self.handler_class, self.settings, child_conn),
+                                        daemon=True)
+        self._process.start()
+        self.base_url = f"http://127.0.0.1:{parent_conn.recv()}{self.api_path}"
+        return self.base_url
+
+    def stop(self) -> None:
+        """Stops the server process.
+        """
+        if self._process:
+            self._process.terminate()
+            self._process.join()
+            self._process = None
+
+    def get_stats(self) -> dict:
+        """Returns the counters of the server (requests, injected errors, ...).
+
+        Returns:
+            dict: Counters
+        """
+        from urllib.request import urlopen
+        host = self.base_url[:-len(self.api_path)]
+        with urlopen(f"{host}/__stats") as response:
+            return json.loads(response.read())
+
+class WeClappStandIn(StandInServer):
+    """Stand-in of the WeClapp API serving a synthetic tenant of customers and sales invoices.
+    """
+    handler_class = WeClappHandler
+    api_path = "/webapp/api/v1/"
+
+    def __init__(self, records: int, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 document_every: int = 10, document_size: int = 32768, email_every: int = 10):
+        """Initializes the stand-in.
+
+        Args:
+            records (int): Amount of customers and of sales invoices of the tenant
+            latency (float, optional): Seconds added to every response. Defaults to 0.0.
+            jitter (float, optional): Maximum seconds added to or removed from the latency. Defaults to 0.0.
+            error_rate (float, optional): Share of requests answered with HTTP 503. Defaults to 0.0.
+            document_every (int, optional): Every n-th invoice has a document (0 = none). Defaults to 10.
+            document_size (int, optional): Bytes per document. Defaults to 32768.
+            email_every (int, optional): Every n-th invoice has an archived E-Mail (0 = none). Defaults to 10.
+        """
+        super().__init__(latency, jitter, error_rate, records=records, document_every=document_every,
+                         document_size=document_size, email_every=email_every)
+
+class FrappeStandIn(StandInServer):
+    """Stand-in of the Frappe (ERPNext) API accepting every write.
+    """
+    handler_class = FrappeHandler
+    api_path = "/api/"
@@ -1,9 +1,31 @@
+import argparse
 import weclapp as wc
 
-def cache_all_wc_data():
+"""dict[str, str]: Names of the --for option mapped to the migration classes."""
+MIGRATIONS = {
+    "customer"  : "CustomerMigration",
+    "invoice"   : "InvoiceMigration"
+}
+
+def cache_all_wc_data(incremental: bool = False):
     """Cache all data from WeClapp to local database"""
     with wc.WcCacheWrapper() as wrapper:
-        wrapper.cache_all()
+        wrapper.cache_all(incremental=incremental)
+
+def cache_wc_data_for(migrations: list[str], incremental: bool = False):
+    """Cache only the data from WeClapp needed by the given migrations"""
+    import migration as mig
+    with wc.WcCacheWrapper() as wrapper:
+        wrapper.cache_for([getattr(mig, MIGRATIONS[name]) for name in migrations], incremental=incremental)
 
 if __name__ == "__main__":
-    cache_all_wc_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Cache all data from WeClapp to local database")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only fetch entities changed since the last run")
+    parser.add_argument("--for", dest="migrations", nargs="+", choices=MIGRATIONS.keys(),
+                        help="only fetch the data needed by the given migrations")
+    args = parser.parse_args()
+    if args.migrations:
+        cache_wc_data_for(args.migrations, args.incremental)
+    else:
+        cache_all_wc_data(args.incremental)
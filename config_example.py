@@ -2,15 +2,56 @@
 WC_API_BASE                 = "https://your-tenant.weclapp.com/webapp/api/v1/"
 WC_API_TOKEN                = "your-api-token"
 WC_PAGE_SIZE                = 100       # Amount of entities to fetch per request
+WC_MAX_WORKERS              = 4         # Amount of pages to fetch in parallel
+WC_DOWNLOAD_WORKERS         = 8         # Amount of entities to download documents for in parallel
+WC_DOWNLOAD_CHUNK_SIZE      = 65536     # Bytes per chunk when streaming documents to disk
+WC_EMAIL_WORKERS            = 8         # Amount of entities to get archived emails for in parallel
+WC_EMAIL_BATCH_SIZE         = 500       # Amount of entities whose archived emails are written to the cache at once
+WC_CACHE_WORKERS            = 4         # Amount of DocTypes cached in parallel (largest first)
+WC_RATE_LIMIT               = 10        # Maximum requests per second (0 = unlimited), lowered automatically on HTTP 429
+WC_RATE_BURST               = 5         # Maximum requests sent at once before the rate limit applies
 
 # WeClapp Cache DB
 WC_CACHE_BASE               = "./weclapp/cache/"
 WC_CACHE_DOCUMENTS_BASE     = "./weclapp/cache/documents/"
+WC_CACHE_BACKEND            = "pysondb" # Storage of the cache: "pysondb" (JSON-file per DocType) or "sqlite"
+WC_CACHE_SYNC_STATE         = "syncState.json"  # High-water marks for incremental caching (in WC_CACHE_BASE)
+WC_CACHE_PERSIST_INDEXES    = True      # Save indexes of the pysondb backend next to the cache files
+WC_CACHE_INDEXES            = {         # Fields indexed for WcCacheApi.search / get per DocType
+    "customer"      : ["customerNumber"],
+    "salesInvoice"  : ["invoiceNumber", "customerNumber"],
+    "archivedEmail" : ["entityId"],
+}
 
 # ERPNext REST-API
 EN_API_BASE                 = "http://erp.localhost:8000/api/"
 EN_API_KEY                  = "your-api-key"
 EN_API_SECRET               = "your-api-secret"
+EN_PAGE_SIZE                = 500       # Amount of entities to fetch per request
+EN_MAX_WORKERS              = 1         # Amount of pages to fetch in parallel (> 1 counts the entities first)
+EN_RATE_LIMIT               = 0         # Maximum requests per second (0 = unlimited), lowered automatically on HTTP 429
+EN_RATE_BURST               = 5         # Maximum requests sent at once before the rate limit applies
+
+# API Requests (WeClapp and ERPNext)
+API_TIMEOUT                 = 60        # Timeout in seconds for connecting and reading a response
+API_MAX_RETRIES             = 5         # Retries on connection errors, HTTP 429 and 5xx (non-idempotent requests only on 429 / 503)
+API_BACKOFF_BASE            = 0.5       # Backoff in seconds before the first retry, doubled per retry (with jitter)
+API_BACKOFF_MAX             = 60        # Maximum backoff in seconds (also caps "Retry-After")
+API_POOL_MAXSIZE            = 32        # Connections kept open per host, should be >= parallel requests per host
+                                        # (e.g. WC_CACHE_WORKERS * WC_MAX_WORKERS + WC_DOWNLOAD_WORKERS + WC_EMAIL_WORKERS)
+API_POOL_HOSTS              = 4         # Amount of hosts to keep connection pools for
+API_POOL_BLOCK              = True      # Wait for a free connection instead of exceeding API_POOL_MAXSIZE per host
+API_ASYNC_CONCURRENCY       = 200       # Maximum requests in flight per asyncio API-Object (AsyncWeClappAPI, AsyncERPNextAPI)
+API_METRICS                 = True      # Record requests, errors, bytes and latency per host, method and DocType (see base/metrics.py)
+API_METRICS_INTERVAL        = 60        # Seconds between the exports of the metrics
+API_METRICS_JSON            = "./api_metrics.json"  # JSON-snapshot of the metrics (None = not exported)
+API_METRICS_PROMETHEUS      = None      # Prometheus textfile, e.g. for the textfile collector of the node exporter (None = not exported)
+
+# Profiling (methods marked with @profile_stage, e.g. "WcCacheWrapper._download_entity_documents", "InvoiceMigration._map_items")
+PROFILE_STAGES              = []        # Stages to profile, wildcards allowed (e.g. ["BankMigration.migrate", "MigrationWrapper.*"]), empty = off
+PROFILE_MODE                = "cprofile"  # "cprofile" (pstats-file per stage) or "sampling" (wall-clock, collapsed stacks for flamegraphs)
+PROFILE_INTERVAL            = 0.005     # Seconds between two samples of the sampling profiler
+PROFILE_OUTPUT              = "./profiles/"  # Directory of the written profiles (one file per stage and run)
 
 # ERPNext Country Mapping
 EN_COUNTRY_MAP = {
@@ -44,6 +85,18 @@ EN_COUNTRY_MAP = {
 }
 
 # ERPNext Settings
+EN_MIGRATION_WORKERS            = 4                             # Amount of entities migrated in parallel
+EN_MIGRATION_MAX_IN_FLIGHT      = 32                            # Maximum amount of entities submitted to the workers at once
+EN_ASYNC_MIGRATION_CONCURRENCY  = 100                           # Amount of entities migrated at once by MigrationWrapper.migrate_async
+EN_TRANSFORM_WORKERS            = 4                             # Processes building the ERPNext payloads in MigrationWrapper.migrate_staged
+EN_TRANSFORM_CHUNK_SIZE         = 50                            # Entities sent to a transform process at once
+EN_PIPELINE_QUEUE_SIZE          = 256                           # Maximum amount of built payloads waiting to be created in ERPNext
+EN_DRY_RUN_OUTPUT               = "./dry_run.ndjson"            # Would-be requests of dry runs (MigrationWrapper(..., dry_run=True))
+EN_INSERT_BATCH_SIZE            = 100                           # Entities created per bulk insert request (max. 200)
+EN_UPLOAD_WORKERS               = 4                             # Amount of files uploaded in parallel
+EN_UPLOAD_QUEUE_SIZE            = 64                            # Maximum amount of files waiting for upload
+EN_MIGRATION_JOURNAL            = "./migration_journal.sqlite3" # Journal of migrated entities for resuming (None = disabled)
+EN_IDENTITY_MAP                 = "./identity_map.sqlite3"      # ERPNext names of migrated WeClapp entities (None = in memory)
 EN_DEFAULT_INVOICE_STATE        = 1                             # 0 = DRAFT, 1 = SUBMITTED, 2 = CANCELLED
 EN_DEFAULT_CURRENCY             = "EUR"                         # Default currency for invoices (must exist in ERPNext)
 EN_DEFAULT_PHONE_COUNTRY_CODE   = "49"                          # Default country code for phone numbers without leading +
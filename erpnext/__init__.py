@@ -1,6 +1,12 @@
 from .en_backup import ERPNextBackup
 from .en_api import ERPNextAPI, ERPNextFilter, FilterOperator
+from .en_async_api import AsyncERPNextAPI
+from .en_recording_api import RecordingERPNextAPI
 from .en_doctypes import ERPNextDocType
 from .en_helper import ERPNextHelper
 from .en_api_data import ERPNextAPIChild
-from .en_tax_info import TaxInfo
\ No newline at end of file
+from .en_tax_info import TaxInfo
+from .en_service import ERPNextService
+from .en_bank_registry import ERPNextBankRegistry
+from .en_insert_buffer import ERPNextInsertBuffer
+from .en_upload_queue import ERPNextUploadQueue
\ No newline at end of file
@@ -1,12 +1,14 @@
+import config
 import requests
 import json
+import threading
 from enum import Enum
 from requests.auth import HTTPBasicAuth
-from requests import RequestException
 from .en_api_data import ERPNextAPIChild
 from .en_doctypes import ERPNextDocType
-from base import ApiBase, ApiException
+from base import ApiBase, ApiException, ApiMetrics, RequestPolicy, Transport, MultipartFile, iter_pages
 from pathlib import Path
+from typing import Iterator
 
 class FilterOperator(Enum):
     EQUALS                  = "="
@@ -26,26 +28,60 @@ class ERPNextFilter:
         return [self.field, self.operator.value, self.value]
 
 class ERPNextAPI(ApiBase):
-    def __init__(self, api_key : str, api_secret : str, base_url : str):
+    def __init__(self, api_key : str, api_secret : str, base_url : str, request_policy: RequestPolicy = None,
+                 transport: Transport = None, metrics: ApiMetrics = None):
         """Class for accessing ERPNext API.
 
         Args:
             api_key (str): ERPNext API key
             api_secret (str): ERPNext API secret
             base_url (str): ERPNext API base URL with trailing slash
-            doctype (str): ERPNext DocType (e.g. Customer, Address, ...)
+            request_policy (RequestPolicy, optional): Rate limit, timeout and retries of requests.
+            Defaults to the settings in config (EN_RATE_LIMIT, API_*).
+            transport (Transport, optional): Pooled transport to create the sessions with.
+            Defaults to the shared transport configured in config (API_POOL_*).
+            metrics (ApiMetrics, optional): Metrics to record the requests in.
+            Defaults to the shared metrics if enabled in config (API_METRICS).
         """
-        super().__init__(base_url)
+        super().__init__(base_url, request_policy or RequestPolicy(
+            rate_limit=config.EN_RATE_LIMIT,
+            burst=config.EN_RATE_BURST,
+            timeout=config.API_TIMEOUT,
+            max_retries=config.API_MAX_RETRIES,
+            backoff_base=config.API_BACKOFF_BASE,
+            backoff_max=config.API_BACKOFF_MAX
+        ), transport or Transport.get_shared(config.API_POOL_MAXSIZE, config.API_POOL_HOSTS, config.API_POOL_BLOCK),
+            metrics or (ApiMetrics.get_shared() if config.API_METRICS else None))
         self.api_key = api_key
         self.api_secret = api_secret
 
     def open(self):
-        self.session = requests.Session()
-        self.session.auth = HTTPBasicAuth(self.api_key, self.api_secret)
-        self.session.headers = {"Content-Type": "application/json"}
+        self._local = threading.local()     # Session per thread (requests.Session isn't thread-safe)
+        self._sessions = []
+        self._sessions_lock = threading.Lock()
 
     def close(self):
-        self.session.close()
+        with self._sessions_lock:
+            for session in self._sessions:
+                self.transport.release(session)
+            self._sessions = []
+        self._local = threading.local()
+
+    @property
+    def session(self) -> requests.Session:
+        """Returns the session of the current thread (created on first use).
+
+        Returns:
+            requests.Session: Session
+        """
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self.transport.create_session({"Content-Type": "application/json"},
+                                                    HTTPBasicAuth(self.api_key, self.api_secret))
+            self._local.session = session
+            with self._sessions_lock:
+                self._sessions.append(session)
+        return session
     
     def _request(self, url: str, method: str, data: dict = None, params: dict = None) -> dict:
         """Makes a request to ERPNext API
@@ -58,30 +94,9 @@ class ERPNextAPI(ApiBase):
         Returns:
             dict: Response JSON
         Raises:
-            Exception: If request fails
+            ApiException: If request fails (after retries)
         """
-        try:
-            response = self.session.request(method=method, url=url, json=data, params=params)
-            response.raise_for_status()
-        except RequestException as e:
-            if response.status_code == 404:
-                raise ApiException(
-                    message=f"Not found: {response.text}",
-                    method=method,
-                    url=url,
-                    response_text=response.text,
-                    status_code=response.status_code
-                ) from e
-            else:
-                raise ApiException(
-                    f"Error in {method} request to {url}: {response.text}",
-                    method=method,
-                    url=url,
-                    response_text=response.text,
-                    status_code=response.status_code
-                ) from e
-
-        return response.json()
+        return self._send(self.session, method, url, json=data, params=params).json()
 
     def _get_resource_url(self, doctype: ERPNextDocType) -> str:
         """Returns base URL for current API-connection and given DocType.
@@ -126,13 +141,103 @@ class ERPNextAPI(ApiBase):
         }
         return self._request(url, "PUT", data)
         
-    def get_all(self, doctype: ERPNextDocType) -> dict:
-        """Get all entities of the DocType
+    @staticmethod
+    def _convert_filters(filters: list) -> list:
+        """Converts filters to the ERPNext filter format.
+
+        Args:
+            filters (list): ERPNextFilter-objects or filters in ERPNext format ([field, operator, value])
 
         Returns:
-            dict: JSON-response from ERPNext API
+            list: Filters in ERPNext format
+        """
+        return [filter.get_erpnext_filter() if isinstance(filter, ERPNextFilter) else filter
+                for filter in filters or []]
+
+    def _get_page(self, doctype: ERPNextDocType, page: int, page_size: int = config.EN_PAGE_SIZE,
+                  fields: list[str] = None, filters: list = None, order_by: str = "name asc") -> list[dict]:
+        """Get a page of entities of the DocType
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            page (int): Page index (starting with 0)
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            order_by (str, optional): Sort order, must be stable for paging. Defaults to "name asc".
+
+        Returns:
+            list[dict]: Entities of the page
+        """
+        params = {
+            "limit_start"       : page * page_size,
+            "limit_page_length" : page_size,
+            "order_by"          : order_by
+        }
+        if fields:
+            params["fields"] = json.dumps(fields)
+        if filters:
+            params["filters"] = json.dumps(self._convert_filters(filters))
+        return self._request(self._get_resource_url(doctype), "GET", params=params)["data"]
+
+    def iter_pages(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                   page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS,
+                   order_by: str = "name asc") -> Iterator[list[dict]]:
+        """Yields all pages of entities of the DocType in page order.
+        With more than one worker the amount of pages is counted first and the pages are fetched
+        by a pool of max_workers threads (never more than max_workers pages are held at once).
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            max_workers (int, optional): Amount of pages fetched in parallel. Defaults to config.EN_MAX_WORKERS.
+            order_by (str, optional): Sort order, must be stable for paging. Defaults to "name asc".
+
+        Yields:
+            list[dict]: Entities of a page
+        """
+        page_size = max(1, page_size)
+        pages = None
+        if max_workers > 1:
+            count = self.get_count(doctype, filters)
+            pages = (count + page_size - 1) // page_size
+
+        yield from iter_pages(
+            lambda page: self._get_page(doctype, page, page_size, fields, filters, order_by),
+            page_size, max_workers, pages)
+
+    def iter_all(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                 page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS,
+                 order_by: str = "name asc") -> Iterator[dict]:
+        """Yields all entities of the DocType in page order.
+        See iter_pages for the arguments.
+
+        Yields:
+            dict: Entity
+        """
+        for page in self.iter_pages(doctype, fields, filters, page_size, max_workers, order_by):
+            yield from page
+
+    def get_all(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS) -> list[dict]:
+        """Get all entities of the DocType (paginated, see iter_pages).
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            max_workers (int, optional): Amount of pages fetched in parallel. Defaults to config.EN_MAX_WORKERS.
+
+        Returns:
+            list[dict]: Entities
         """
-        return self._request(self._get_resource_url(doctype), "GET")
+        return list(self.iter_all(doctype, fields, filters, page_size, max_workers))
     
     def get(self, doctype: ERPNextDocType, id : str) -> dict:
         """Get an entity of the DocType
@@ -160,6 +265,69 @@ class ERPNextAPI(ApiBase):
         """
         return self._request(self._get_resource_url(doctype), "POST", data)["data"]
 
+    @staticmethod
+    def _is_rejected(e: ApiException) -> bool:
+        """Returns if a failed request was rejected by ERPNext, so nothing of it was saved.
+        Without response (timeout, dropped connection) or with an error of a gateway (HTTP 502, 504)
+        the request may have been processed anyway.
+
+        Args:
+            e (ApiException): Error of the request
+
+        Returns:
+            bool: True if rejected
+        """
+        return e.status_code is not None and e.status_code not in RequestPolicy.RETRY_STATUS_IDEMPOTENT
+
+    def create_many(self, doctype: ERPNextDocType, docs: list[dict],
+                    batch_size: int = config.EN_INSERT_BATCH_SIZE) -> list[str]:
+        """Creates multiple new entities of the DocType with one request per batch (frappe.client.insert_many).
+        A batch rejected by ERPNext is rolled back, its entities are then created one by one.
+        If it isn't known whether a batch was saved (e.g. on a timeout), it isn't sent again.
+
+        Args:
+            docs (list[dict]): Data of the entities
+            batch_size (int, optional): Entities per request (ERPNext allows up to 200).
+            Defaults to config.EN_INSERT_BATCH_SIZE.
+
+        Returns:
+            list[str]: Names of the created entities (order not guaranteed)
+
+        Raises:
+            ApiException: If entities couldn't be created one by one (the others are created)
+            or a batch failed without being rejected (the following batches aren't sent)
+        """
+        batch_size = max(1, min(200, batch_size))
+        names = []
+        errors = []
+        for i in range(0, len(docs), batch_size):
+            batch = docs[i:i + batch_size]
+            try:
+                names += self._request(self._get_method_url("frappe.client.insert_many"), "POST", {
+                    "docs": json.dumps([{**doc, "doctype": doctype.value} for doc in batch])
+                })["message"]
+            except ApiException as e:
+                if not self._is_rejected(e):
+                    # The batch may be saved, sending it again could duplicate autonamed entities
+                    raise
+                # Fall back to single inserts for this batch only
+                for doc in batch:
+                    try:
+                        names.append(self.create(doctype, doc)["name"])
+                    except ApiException as e:
+                        errors.append(e)
+
+        if errors:
+            raise ApiException(
+                message=f"{len(errors)} of {len(docs)} {doctype.value} entities could not be created: "
+                        f"{errors[0].message}",
+                method="POST",
+                url=self._get_method_url("frappe.client.insert_many"),
+                response_text=errors[0].response_text,
+                status_code=errors[0].status_code
+            )
+        return names
+
     def update(self, doctype: ERPNextDocType, id : str, data : dict) -> dict:
         """Updates an entity of the DocType
 
@@ -192,15 +360,23 @@ class ERPNextAPI(ApiBase):
         Returns:
             dict: JSON-response from ERPNext API
         """
-        filters_converted = []
-        for filter in filters:
-            filters_converted.append(filter.get_erpnext_filter())
-
         return self._request(self._get_resource_url(doctype), "GET",
-                             params={"filters": json.dumps(filters_converted)})["data"]
+                             params={"filters": json.dumps(self._convert_filters(filters))})["data"]
     
-    def get_count(self, doctype: ERPNextDocType) -> int:
-        raise NotImplementedError("Not implemented yet")
+    def get_count(self, doctype: ERPNextDocType, filters: list = None) -> int:
+        """Returns the count of entities of the DocType
+
+        Args:
+            doctype (ERPNextDocType): DocType to count
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+
+        Returns:
+            int: Amount of entities
+        """
+        return self._request(self._get_method_url("frappe.client.get_count"), "GET", params={
+            "doctype"   : doctype.value,
+            "filters"   : json.dumps(self._convert_filters(filters))
+        })["message"]
     
     def upload_file(self, doctype: ERPNextDocType, id: str, file_path: str) -> dict:
         """Uploads a file to the given DocType
@@ -212,17 +388,12 @@ class ERPNextAPI(ApiBase):
             file_name (str, optional): Name of the file to upload. Defaults to original file name.
 
         Returns:
-            dict: JSON-response from ERPNext API
+            dict: Created File-entity
         """
-        # Upload file
-        headers = {
-            'Authorization': f"token {self.api_key}:{self.api_secret}",
-        }
-        with open(file_path, "rb") as file:
-            response = requests.post(
-                url     = self._get_method_url("upload_file"),
-                headers = headers,
-                files   = {"file": file},
-                data    = {"doctype": doctype.value, "docname": id}
-            )
-            response.raise_for_status()
\ No newline at end of file
+        # Upload file (streamed multipart body, the file isn't read into memory)
+        body = MultipartFile({"doctype": doctype.value, "docname": id}, "file", file_path)
+        return self._send(
+            self.session, "POST", self._get_method_url("upload_file"),
+            headers = {"Content-Type": body.content_type},
+            data    = body
+        ).json()["message"]
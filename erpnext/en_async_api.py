@@ -0,0 +1,335 @@
+import config
+import aiohttp
+import json
+from typing import AsyncIterator
+from .en_api import ERPNextAPI
+from .en_doctypes import ERPNextDocType
+from base import AsyncApiBase, ApiException, ApiMetrics, AsyncRequestPolicy, MultipartFile, aiter_pages
+
+class AsyncERPNextAPI(AsyncApiBase):
+    def __init__(self, api_key : str, api_secret : str, base_url : str, request_policy: AsyncRequestPolicy = None,
+                 max_concurrency: int = config.API_ASYNC_CONCURRENCY, metrics: ApiMetrics = None):
+        """Class for accessing ERPNext API with asyncio (same methods as ERPNextAPI, as coroutines).
+
+        Args:
+            api_key (str): ERPNext API key
+            api_secret (str): ERPNext API secret
+            base_url (str): ERPNext API base URL with trailing slash
+            request_policy (AsyncRequestPolicy, optional): Rate limit, timeout and retries of requests.
+            Defaults to the settings in config (EN_RATE_LIMIT, API_*).
+            max_concurrency (int, optional): Maximum amount of requests in flight.
+            Defaults to config.API_ASYNC_CONCURRENCY.
+            metrics (ApiMetrics, optional): Metrics to record the requests in.
+            Defaults to the shared metrics if enabled in config (API_METRICS).
+        """
+        super().__init__(base_url, request_policy or AsyncRequestPolicy(
+            rate_limit=config.EN_RATE_LIMIT,
+            burst=config.EN_RATE_BURST,
+            timeout=config.API_TIMEOUT,
+            max_retries=config.API_MAX_RETRIES,
+            backoff_base=config.API_BACKOFF_BASE,
+            backoff_max=config.API_BACKOFF_MAX
+        ), max_concurrency, metrics or (ApiMetrics.get_shared() if config.API_METRICS else None))
+        self.api_key = api_key
+        self.api_secret = api_secret
+
+    async def open(self):
+        self.session = self._create_session({
+            "Content-Type"      : "application/json",
+            "Accept-Encoding"   : "gzip, deflate"
+        }, aiohttp.BasicAuth(self.api_key, self.api_secret))
+
+    async def close(self):
+        await self.session.close()
+
+    async def _request(self, url: str, method: str, data: dict = None, params: dict = None) -> dict:
+        """Makes a request to ERPNext API
+
+        Args:
+            url (str): URL to make request to
+            method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
+            data (ERPNextAPIData, optional): Data to send with request. Defaults to None.
+
+        Returns:
+            dict: Response JSON
+        Raises:
+            ApiException: If request fails (after retries)
+        """
+        response = await self._send(self.session, method, url, json=data, params=params)
+        return await response.json(content_type=None)
+
+    def _get_resource_url(self, doctype: ERPNextDocType) -> str:
+        """Returns base URL for current API-connection and given DocType.
+
+        Args:
+            doctype (WeClappDocTypes): Desired DocType
+
+        Returns:
+            str: Url built of Base-URL & DocType
+        """
+        return f"{self.base_url}resource/{doctype.value}"
+
+    def _get_method_url(self, method: str) -> str:
+        """Returns base URL for current API-connection and given DocType.
+
+        Args:
+            method (str): Desired method
+
+        Returns:
+            str: Url built of Base-URL & API-method
+        """
+        return f"{self.base_url}method/{method}"
+
+    async def create_link(self, parent_doctype : str, parent_name : str, child_doctype : str, child_name : str) -> dict:
+        """Create a link between two entities
+
+        Args:
+            parent_doctype (str): Parent DocType
+            parent_name (str): Parent name
+            child_doctype (str): Child DocType
+            child_name (str): Child name
+
+        Returns:
+            dict: Response JSON
+        """
+        url = f"{self.base_url}resource/{child_doctype}/{child_name}"
+        data = {
+            "links": [{
+                "link_doctype": parent_doctype,
+                "link_name": parent_name
+            }]
+        }
+        return await self._request(url, "PUT", data)
+
+    async def _get_page(self, doctype: ERPNextDocType, page: int, page_size: int = config.EN_PAGE_SIZE,
+                        fields: list[str] = None, filters: list = None, order_by: str = "name asc") -> list[dict]:
+        """Get a page of entities of the DocType
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            page (int): Page index (starting with 0)
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            order_by (str, optional): Sort order, must be stable for paging. Defaults to "name asc".
+
+        Returns:
+            list[dict]: Entities of the page
+        """
+        params = {
+            "limit_start"       : page * page_size,
+            "limit_page_length" : page_size,
+            "order_by"          : order_by
+        }
+        if fields:
+            params["fields"] = json.dumps(fields)
+        if filters:
+            params["filters"] = json.dumps(ERPNextAPI._convert_filters(filters))
+        return (await self._request(self._get_resource_url(doctype), "GET", params=params))["data"]
+
+    async def iter_pages(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                         page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS,
+                         order_by: str = "name asc") -> AsyncIterator[list[dict]]:
+        """Yields all pages of entities of the DocType in page order.
+        With more than one worker the amount of pages is counted first and up to max_workers pages
+        are fetched at once (never more than max_workers pages are held at once).
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            max_workers (int, optional): Amount of pages fetched at once. Defaults to config.EN_MAX_WORKERS.
+            order_by (str, optional): Sort order, must be stable for paging. Defaults to "name asc".
+
+        Yields:
+            list[dict]: Entities of a page
+        """
+        page_size = max(1, page_size)
+        pages = None
+        if max_workers > 1:
+            count = await self.get_count(doctype, filters)
+            pages = (count + page_size - 1) // page_size
+
+        async for page in aiter_pages(
+                lambda page: self._get_page(doctype, page, page_size, fields, filters, order_by),
+                page_size, max_workers, pages):
+            yield page
+
+    async def iter_all(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                       page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS,
+                       order_by: str = "name asc") -> AsyncIterator[dict]:
+        """Yields all entities of the DocType in page order.
+        See iter_pages for the arguments.
+
+        Yields:
+            dict: Entity
+        """
+        async for page in self.iter_pages(doctype, fields, filters, page_size, max_workers, order_by):
+            for entity in page:
+                yield entity
+
+    async def get_all(self, doctype: ERPNextDocType, fields: list[str] = None, filters: list = None,
+                      page_size: int = config.EN_PAGE_SIZE, max_workers: int = config.EN_MAX_WORKERS) -> list[dict]:
+        """Get all entities of the DocType (paginated, see iter_pages).
+
+        Args:
+            doctype (ERPNextDocType): DocType to get the entities from
+            fields (list[str], optional): Fields to return (e.g. ["name", "swift_number"] or ["*"]).
+            Defaults to None (only "name").
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+            page_size (int, optional): Page size. Defaults to config.EN_PAGE_SIZE.
+            max_workers (int, optional): Amount of pages fetched at once. Defaults to config.EN_MAX_WORKERS.
+
+        Returns:
+            list[dict]: Entities
+        """
+        return [entity async for entity in self.iter_all(doctype, fields, filters, page_size, max_workers)]
+
+    async def get(self, doctype: ERPNextDocType, id : str) -> dict:
+        """Get an entity of the DocType
+
+        Args:
+            name (str): Name of the entity to get
+
+        Returns:
+            dict: JSON-response from ERPNext API
+        """
+        try:
+            return (await self._request(f"{self._get_resource_url(doctype)}/{id}", "GET"))["data"]
+        except ApiException as e:
+            if e.status_code == 404:
+                return None
+            raise
+
+    async def create(self, doctype: ERPNextDocType, data : dict) -> dict:
+        """Creates a new entity of the DocType
+
+        Args:
+            data (dict): Data to fill the entity with
+
+        Returns:
+            dict: JSON-response from ERPNext API
+        """
+        return (await self._request(self._get_resource_url(doctype), "POST", data))["data"]
+
+    async def create_many(self, doctype: ERPNextDocType, docs: list[dict],
+                          batch_size: int = config.EN_INSERT_BATCH_SIZE) -> list[str]:
+        """Creates multiple new entities of the DocType with one request per batch (frappe.client.insert_many).
+        A batch rejected by ERPNext is rolled back, its entities are then created one by one.
+        If it isn't known whether a batch was saved (e.g. on a timeout), it isn't sent again.
+
+        Args:
+            docs (list[dict]): Data of the entities
+            batch_size (int, optional): Entities per request (ERPNext allows up to 200).
+            Defaults to config.EN_INSERT_BATCH_SIZE.
+
+        Returns:
+            list[str]: Names of the created entities (order not guaranteed)
+
+        Raises:
+            ApiException: If entities couldn't be created one by one (the others are created)
+            or a batch failed without being rejected (the following batches aren't sent)
+        """
+        batch_size = max(1, min(200, batch_size))
+        names = []
+        errors = []
+        for i in range(0, len(docs), batch_size):
+            batch = docs[i:i + batch_size]
+            try:
+                names += (await self._request(self._get_method_url("frappe.client.insert_many"), "POST", {
+                    "docs": json.dumps([{**doc, "doctype": doctype.value} for doc in batch])
+                }))["message"]
+            except ApiException as e:
+                if not ERPNextAPI._is_rejected(e):
+                    # The batch may be saved, sending it again could duplicate autonamed entities
+                    raise
+                # Fall back to single inserts for this batch only
+                for doc in batch:
+                    try:
+                        names.append((await self.create(doctype, doc))["name"])
+                    except ApiException as e:
+                        errors.append(e)
+
+        if errors:
+            raise ApiException(
+                message=f"{len(errors)} of {len(docs)} {doctype.value} entities could not be created: "
+                        f"{errors[0].message}",
+                method="POST",
+                url=self._get_method_url("frappe.client.insert_many"),
+                response_text=errors[0].response_text,
+                status_code=errors[0].status_code
+            )
+        return names
+
+    async def update(self, doctype: ERPNextDocType, id : str, data : dict) -> dict:
+        """Updates an entity of the DocType
+
+        Args:
+            name (str): Name of the entity to update
+            data (dict): Data to update the entity with
+
+        Returns:
+            dict: JSON-response from ERPNext API
+        """
+        return await self._request(f"{self._get_resource_url(doctype)}/{id}", "PUT", data)
+
+    async def delete(self, doctype: ERPNextDocType, id : str) -> dict:
+        """Deletes an entity of the DocType
+
+        Args:
+            name (str): Name of the entity to delete
+
+        Returns:
+            dict: JSON-response from ERPNext API
+        """
+        return await self._request(f"{self._get_resource_url(doctype)}/{id}", "DELETE")
+
+    async def search(self, doctype: ERPNextDocType, filters: list) -> dict:
+        """Search for entities of the DocType
+
+        Args:
+            filters (list): Filters to search for (must contain ERPNextFilter-objects)
+
+        Returns:
+            dict: JSON-response from ERPNext API
+        """
+        return (await self._request(self._get_resource_url(doctype), "GET",
+                                    params={"filters": json.dumps(ERPNextAPI._convert_filters(filters))}))["data"]
+
+    async def get_count(self, doctype: ERPNextDocType, filters: list = None) -> int:
+        """Returns the count of entities of the DocType
+
+        Args:
+            doctype (ERPNextDocType): DocType to count
+            filters (list, optional): ERPNextFilter-objects or filters in ERPNext format. Defaults to None.
+
+        Returns:
+            int: Amount of entities
+        """
+        return (await self._request(self._get_method_url("frappe.client.get_count"), "GET", params={
+            "doctype"   : doctype.value,
+            "filters"   : json.dumps(ERPNextAPI._convert_filters(filters))
+        }))["message"]
+
+    async def upload_file(self, doctype: ERPNextDocType, id: str, file_path: str) -> dict:
+        """Uploads a file to the given DocType
+
+        Args:
+            doctype (ERPNextDocType): DocType to upload file to
+            id (str): ID of the entity to upload file to
+            file_path (str): Path to file to upload
+
+        Returns:
+            dict: Created File-entity
+        """
+        # Upload file (streamed multipart body, the file isn't read into memory)
+        body = MultipartFile({"doctype": doctype.value, "docname": id}, "file", file_path)
+        response = await self._send(
+            self.session, "POST", self._get_method_url("upload_file"),
+            headers = {"Content-Type": body.content_type, "Content-Length": str(len(body))},
+            data    = body
+        )
+        return (await response.json(content_type=None))["message"]
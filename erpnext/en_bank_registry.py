@@ -0,0 +1,94 @@
+from threading import RLock
+from .en_api import ERPNextAPI
+from .en_doctypes import ERPNextDocType
+from .en_service import ERPNextService
+
+class ERPNextBankRegistry(ERPNextService):
+    """Index of the banks in ERPNext by SWIFT-number and name.
+    All banks are loaded once, new banks are created through the registry, so it stays up to date
+    without further requests. Safe to use by concurrent migrations.
+    """
+
+    def __init__(self, en_api: ERPNextAPI):
+        """Initializes the registry, the banks are loaded on first use.
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+        """
+        super().__init__(en_api)
+        self._by_swift = None       # SWIFT-numbers mapped to banks
+        self._names = set()         # Lower case names of all banks (ERPNext compares names case-insensitive)
+        self._next_suffix = {}      # Bank names mapped to the next suffix to try
+        self._lock = RLock()
+
+    def _load(self) -> None:
+        """Loads all banks of ERPNext if not loaded yet.
+        """
+        if self._by_swift is None:
+            self._by_swift = {}
+            for bank in self._en_api.iter_all(ERPNextDocType.BANK, fields=["name", "bank_name", "swift_number"]):
+                self._add(bank)
+
+    def _add(self, bank: dict) -> None:
+        """Adds a bank to the indexes.
+
+        Args:
+            bank (dict): Bank
+        """
+        if bank.get("swift_number", None):
+            self._by_swift.setdefault(bank["swift_number"], bank)
+        self._names.add(bank["name"].lower())
+
+    def _get_free_name(self, bank_name: str) -> str:
+        """Returns the bank name, or if taken, the bank name with the next free number: "Name (1)".
+
+        Args:
+            bank_name (str): Desired bank name
+
+        Returns:
+            str: Free bank name
+        """
+        if bank_name.lower() not in self._names:
+            return bank_name
+        i = self._next_suffix.get(bank_name, 1)
+        while f"{bank_name} ({i})".lower() in self._names:
+            i += 1
+        self._next_suffix[bank_name] = i + 1
+        return f"{bank_name} ({i})"
+
+    def get(self, swift_number: str) -> dict:
+        """Returns the bank with the given SWIFT-number.
+
+        Args:
+            swift_number (str): SWIFT-number
+
+        Returns:
+            dict: Bank or None if not found
+        """
+        with self._lock:
+            self._load()
+            return self._by_swift.get(swift_number, None)
+
+    def get_or_create(self, bank_name: str, swift_number: str) -> dict:
+        """Returns the bank with the given SWIFT-number or creates it.
+        In case the name already exists, the next free number is appended: "Name (1)".
+
+        Args:
+            bank_name (str): Name of the bank
+            swift_number (str): SWIFT-number
+
+        Returns:
+            dict: Found or created bank
+        """
+        with self._lock:
+            bank = self.get(swift_number)
+            if bank:
+                return bank
+
+            # Created while holding the lock, so concurrent migrations don't create the bank twice
+            bank = self._en_api.create(ERPNextDocType.BANK, {
+                "bank_name"     : self._get_free_name(bank_name),
+                "swift_number"  : swift_number
+            })
+            self._add(bank)
+            return bank
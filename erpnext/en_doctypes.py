@@ -7,4 +7,5 @@ class ERPNextDocType(DocType):
     BANK                = "Bank"
     CONTACT             = "Contact"
     SALES_INVOICE       = "Sales Invoice"
-    PAYMENT_ENTRY       = "Payment Entry"
\ No newline at end of file
+    PAYMENT_ENTRY       = "Payment Entry"
+    FILE                = "File"
\ No newline at end of file
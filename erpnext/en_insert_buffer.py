@@ -0,0 +1,72 @@
+import config
+from threading import Lock
+from typing import Callable
+from base import ApiException
+from .en_api import ERPNextAPI
+from .en_doctypes import ERPNextDocType
+from .en_service import ERPNextService
+
+class ERPNextInsertBuffer(ERPNextService):
+    """Collects independent entities (e.g. payment entries) of many migrations and creates them
+    with bulk inserts (ERPNextAPI.create_many) once a batch is full.
+    Entities still in the buffer are created by flush, which has to be called at the end.
+    A callback per entity reports when it is created or failed (e.g. to complete the migration adding it).
+    """
+
+    def __init__(self, en_api: ERPNextAPI, batch_size: int = config.EN_INSERT_BATCH_SIZE):
+        """Initializes an empty buffer.
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+            batch_size (int, optional): Entities per bulk insert. Defaults to config.EN_INSERT_BATCH_SIZE.
+        """
+        super().__init__(en_api)
+        self.batch_size = max(1, batch_size)
+        self._buffers = {}      # DocTypes mapped to their buffered entities
+        self._lock = Lock()
+
+    def add(self, doctype: ERPNextDocType, doc: dict, callback: Callable[[Exception], None] = None) -> None:
+        """Adds an entity to the buffer, a full batch is created right away.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the entity
+            doc (dict): Data of the entity
+            callback (Callable[[Exception], None], optional): Called with None once the entity is created
+            or with the error if it couldn't be created. Defaults to None.
+        """
+        with self._lock:
+            buffer = self._buffers.setdefault(doctype, [])
+            buffer.append((doc, callback))
+            if len(buffer) < self.batch_size:
+                return
+            batch = self._buffers.pop(doctype)
+        self._insert(doctype, batch)
+
+    def flush(self) -> None:
+        """Creates all buffered entities.
+        """
+        with self._lock:
+            buffers = self._buffers
+            self._buffers = {}
+        for doctype, batch in buffers.items():
+            self._insert(doctype, batch)
+
+    def _insert(self, doctype: ERPNextDocType, batch: list[tuple[dict, Callable]]) -> None:
+        """Creates a batch of entities and calls their callbacks.
+        Errors are passed to the callbacks (all entities of a failed batch fail, ERPNext doesn't tell
+        which of them were created) and printed for entities without callback.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the entities
+            batch (list[tuple[dict, Callable]]): Data and callback of the entities
+        """
+        error = None
+        try:
+            self._en_api.create_many(doctype, [doc for doc, _ in batch], self.batch_size)
+        except ApiException as e:
+            error = e
+            if not all(callback for _, callback in batch):
+                print(e.message)
+        for _, callback in batch:
+            if callback:
+                callback(error)
@@ -0,0 +1,170 @@
+import config
+import json
+import os
+from threading import Lock
+from urllib.parse import unquote
+from .en_api import ERPNextAPI
+from .en_doctypes import ERPNextDocType
+from base import ApiException
+
+class RecordingERPNextAPI(ERPNextAPI):
+    """Stand-in of ERPNextAPI for dry runs: no request is sent, every would-be request is written
+    as a line of NDJSON instead. Created entities get synthetic names (or the name given in the payload),
+    so dependent requests resolve. Reads return nothing (no existing entities).
+    Counts the requests, entities and payload bytes per method and DocType.
+    """
+
+    def __init__(self, output_path: str = config.EN_DRY_RUN_OUTPUT, base_url: str = config.EN_API_BASE):
+        """Initializes the recording API.
+
+        Args:
+            output_path (str, optional): Path of the NDJSON-file. Defaults to config.EN_DRY_RUN_OUTPUT.
+            base_url (str, optional): ERPNext API base URL with trailing slash (only written to the records).
+            Defaults to config.EN_API_BASE.
+        """
+        super().__init__(None, None, base_url)
+        self.output_path = output_path
+        self._file = None
+        self._lock = Lock()
+        self._counters = {}         # DocTypes mapped to the next number of a synthetic name
+        self._stats = {}            # (Method, DocType) mapped to requests, entities and bytes
+
+    def open(self):
+        super().open()
+        self._file = open(self.output_path, "w", encoding="utf-8")
+
+    def close(self):
+        super().close()
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _get_name(self, doctype: str, data: dict) -> str:
+        """Returns the name of an entity to create: the name of the payload or a synthetic one.
+        Must be called with the lock held.
+
+        Args:
+            doctype (str): DocType of the entity
+            data (dict): Payload of the entity
+
+        Returns:
+            str: Name
+        """
+        if data.get("name", None):
+            return data["name"]
+        self._counters[doctype] = self._counters.get(doctype, 0) + 1
+        return f"DRY-{doctype}-{self._counters[doctype]:06d}"
+
+    def _record(self, method: str, url: str, doctype: str, params: dict, data, entities: int, size: int,
+                names: list[str]) -> None:
+        """Writes a would-be request and counts it. Must be called with the lock held.
+
+        Args:
+            method (str): HTTP method
+            url (str): URL
+            doctype (str): DocType of the request
+            params (dict): Query parameters
+            data: Payload
+            entities (int): Amount of entities written by the request
+            size (int): Payload bytes
+            names (list[str]): Names of the written entities
+        """
+        stats = self._stats.setdefault((method, doctype), {"requests": 0, "entities": 0, "bytes": 0})
+        stats["requests"] += 1
+        stats["entities"] += entities
+        stats["bytes"] += size
+        if self._file:
+            self._file.write(json.dumps({
+                "method"    : method,
+                "doctype"   : doctype,
+                "url"       : url,
+                "params"    : params,
+                "data"      : data,
+                "names"     : names
+            }, default=str) + "\n")
+
+    def _request(self, url: str, method: str, data: dict = None, params: dict = None) -> dict:
+        """Records the request and returns a response as ERPNext would (see class description).
+
+        Args:
+            url (str): URL to make request to
+            method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
+            data (dict, optional): Data to send with request. Defaults to None.
+            params (dict, optional): Query parameters. Defaults to None.
+
+        Returns:
+            dict: Response JSON
+        Raises:
+            ApiException: If a single entity is read (404, no entities exist)
+        """
+        path = url[len(self.base_url):] if url.startswith(self.base_url) else url
+        parts = [unquote(part) for part in path.split("/")]
+        size = len(json.dumps(data, default=str)) if data is not None else 0
+        kind, target = parts[0], parts[1] if len(parts) > 1 else None
+        name = parts[2] if len(parts) > 2 else None
+
+        with self._lock:
+            if kind == "method" and target == "frappe.client.insert_many":
+                docs = json.loads(data["docs"])
+                names = [self._get_name(doc["doctype"], doc) for doc in docs]
+                doctype = docs[0]["doctype"] if docs else None
+                self._record(method, url, doctype, params, docs, len(docs), size, names)
+                return {"message": names}
+            if kind == "method":
+                self._record(method, url, target, params, data, 0, size, [])
+                return {"message": 0 if target == "frappe.client.get_count" else None}
+
+            # Resource requests
+            if method == "POST":
+                entity = {**data, "name": self._get_name(target, data)}
+                self._record(method, url, target, params, data, 1, size, [entity["name"]])
+                return {"data": entity}
+            self._record(method, url, target, params, data, 1 if method in ("PUT", "DELETE") else 0, size,
+                         [name] if name else [])
+            if method == "PUT":
+                return {"data": {**(data or {}), "name": name}}
+            if method == "DELETE":
+                return {"message": "ok"}
+            if name:
+                raise ApiException(message=f"Not found: {target} {name} (dry run)", method=method, url=url,
+                                   status_code=404)
+            return {"data": []}
+
+    def upload_file(self, doctype: ERPNextDocType, id: str, file_path: str) -> dict:
+        """Records the upload of a file (the file isn't read).
+
+        Args:
+            doctype (ERPNextDocType): DocType to upload file to
+            id (str): ID of the entity to upload file to
+            file_path (str): Path to file to upload
+
+        Returns:
+            dict: Would-be File-entity
+        """
+        url = self._get_method_url("upload_file")
+        data = {"doctype": doctype.value, "docname": id, "file": str(file_path)}
+        with self._lock:
+            name = self._get_name("File", {})
+            self._record("POST", url, "File", None, data, 1, os.path.getsize(file_path), [name])
+        return {"name": name, "attached_to_doctype": doctype.value, "attached_to_name": id}
+
+    def get_stats(self) -> dict:
+        """Returns the counters of the recorded requests.
+
+        Returns:
+            dict: "METHOD DocType" mapped to requests, entities and payload bytes
+        """
+        with self._lock:
+            return {f"{method} {doctype}": dict(stats) for (method, doctype), stats in sorted(
+                self._stats.items(), key=lambda item: (str(item[0][1]), item[0][0]))}
+
+    def print_report(self) -> None:
+        """Prints the counters of the recorded requests.
+        """
+        stats = self.get_stats()
+        requests = sum(s["requests"] for s in stats.values())
+        size = sum(s["bytes"] for s in stats.values())
+        print(f"Dry run: {requests} requests, {size / 1024 / 1024:.2f} MB payloads, written to {self.output_path}")
+        for key, s in stats.items():
+            print(f"  {key}: {s['requests']} requests, {s['entities']} entities, {s['bytes'] / 1024:.1f} KB")
@@ -0,0 +1,37 @@
+from threading import Lock
+from weakref import WeakKeyDictionary
+from .en_api import ERPNextAPI
+
+class ERPNextService:
+    """Base class for helpers sharing state per ERPNext-API-Object (e.g. indexes of existing entities).
+    Migrations only get the API-Object, so they get the shared helper by for_api.
+    """
+
+    _instances = None
+    _instances_lock = Lock()
+
+    def __init__(self, en_api: ERPNextAPI):
+        """Initializes the service.
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+        """
+        self._en_api = en_api
+
+    @classmethod
+    def for_api(cls, en_api: ERPNextAPI) -> "ERPNextService":
+        """Returns the service of the given API-Object (created on first use).
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+
+        Returns:
+            ERPNextService: Service shared by all users of the API-Object
+        """
+        with ERPNextService._instances_lock:
+            # One registry per service class, entries are dropped with the API-Object
+            if cls.__dict__.get("_instances", None) is None:
+                cls._instances = WeakKeyDictionary()
+            if en_api not in cls._instances:
+                cls._instances[en_api] = cls(en_api)
+            return cls._instances[en_api]
@@ -0,0 +1,126 @@
+import config
+import os
+import queue
+import threading
+import time
+from typing import Callable
+from .en_api import ERPNextAPI
+from .en_doctypes import ERPNextDocType
+from .en_service import ERPNextService
+
+class ERPNextUploadQueue(ERPNextService):
+    """Bounded queue of file uploads worked off by a pool of worker threads,
+    so migrations don't wait for their attachments. Adding to a full queue blocks until a slot is free.
+    Throughput and failures are counted separately from the migrated entities,
+    a callback per file reports when it is uploaded or failed (e.g. to complete the migration adding it).
+    """
+
+    def __init__(self, en_api: ERPNextAPI, workers: int = config.EN_UPLOAD_WORKERS,
+                 max_queued: int = config.EN_UPLOAD_QUEUE_SIZE):
+        """Initializes the queue, the worker threads are started on the first upload.
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+            workers (int, optional): Amount of parallel uploads. Defaults to config.EN_UPLOAD_WORKERS.
+            max_queued (int, optional): Maximum amount of waiting uploads. Defaults to config.EN_UPLOAD_QUEUE_SIZE.
+        """
+        super().__init__(en_api)
+        self.workers = max(1, workers)
+        self._queue = queue.Queue(maxsize=max(1, max_queued))
+        self._threads = []
+        self._lock = threading.Lock()
+        self._stats = {"uploaded": 0, "failed": 0, "bytes": 0, "seconds": 0.0}
+        self._start = None
+
+    def _start_workers(self) -> None:
+        """Starts the worker threads if not running. Must be called with the lock held.
+        """
+        if not self._threads:
+            self._start = time.perf_counter()
+            for _ in range(self.workers):
+                thread = threading.Thread(target=self._work, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _work(self) -> None:
+        """Uploads the queued files until None is queued.
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                doctype, name, file_path, callback = item
+                error = None
+                try:
+                    self._en_api.upload_file(doctype, name, file_path)
+                    with self._lock:
+                        self._stats["uploaded"] += 1
+                        self._stats["bytes"] += os.path.getsize(file_path)
+                    print(f"Uploaded file {os.path.basename(file_path)}")
+                except Exception as e:
+                    error = e
+                    with self._lock:
+                        self._stats["failed"] += 1
+                    if not callback:
+                        print(f"Could not upload file {file_path} to {doctype.value} {name}: "
+                              f"{getattr(e, 'message', e)}")
+                if callback:
+                    callback(error)
+            finally:
+                self._queue.task_done()
+
+    def add(self, doctype: ERPNextDocType, name: str, file_path: str,
+            callback: Callable[[Exception], None] = None) -> None:
+        """Queues a file to upload and attach to an entity.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the entity
+            name (str): Name of the entity
+            file_path (str): Path of the file
+            callback (Callable[[Exception], None], optional): Called with None once the file is uploaded
+            or with the error if the upload failed. Defaults to None.
+        """
+        with self._lock:
+            self._start_workers()
+        self._queue.put((doctype, name, file_path, callback))
+
+    def join(self) -> None:
+        """Waits until all queued files are uploaded.
+        """
+        self._queue.join()
+        with self._lock:
+            if self._start is not None:
+                self._stats["seconds"] = time.perf_counter() - self._start
+
+    def close(self) -> None:
+        """Waits for the queued uploads and stops the worker threads.
+        """
+        self.join()
+        with self._lock:
+            threads = self._threads
+            self._threads = []
+        for _ in threads:
+            self._queue.put(None)
+        for thread in threads:
+            thread.join()
+
+    def get_stats(self) -> dict:
+        """Returns the counters of the uploads.
+
+        Returns:
+            dict: Amount of uploaded and failed files, uploaded bytes and seconds since the first upload
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def print_report(self) -> None:
+        """Prints the upload counters and throughput.
+        """
+        stats = self.get_stats()
+        if not (stats["uploaded"] or stats["failed"]):
+            return
+        megabytes = stats["bytes"] / 1024 / 1024
+        rate = megabytes / stats["seconds"] if stats["seconds"] else 0
+        print(f"Uploads: {stats['uploaded']} uploaded ({megabytes:.1f} MB, {rate:.1f} MB/s), "
+              f"{stats['failed']} failed")
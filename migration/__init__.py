@@ -5,4 +5,8 @@ from .migration_wrapper import MigrationWrapper
 from .contact_migration import ContactMigration
 from .bank_migration import BankMigration
 from .bank_account_migration import BankAccountMigration
-from .invoice_migration import InvoiceMigration
\ No newline at end of file
+from .invoice_migration import InvoiceMigration
+from .migration_journal import MigrationJournal
+from .migration_completion import MigrationCompletion
+from .migration_identity_map import MigrationIdentityMap
+from .migration_plan import MigrationPlan
\ No newline at end of file
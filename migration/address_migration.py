@@ -1,5 +1,6 @@
 from .base_migration import BaseMigration
 from erpnext import ERPNextAPI, ERPNextHelper, ERPNextDocType
+from weclapp import WeClappDocType
 
 class AddressMigration(BaseMigration):
     """Migration wrapper for address objects from WeClapp to ERPNext.
@@ -19,6 +20,10 @@ class AddressMigration(BaseMigration):
 
     def get_doctype(self) -> ERPNextDocType:
         return ERPNextDocType.ADDRESS
+
+    def get_wc_doctype(self) -> WeClappDocType:
+        # Addresses are embedded in the WeClapp customer
+        return WeClappDocType.CUSTOMER
     
     def validate(self) -> bool:
         """
@@ -2,25 +2,34 @@ import config
 from .base_migration import BaseMigration
 from .bank_migration import BankMigration
 from erpnext import ERPNextAPI, ERPNextHelper, ERPNextDocType
+from weclapp import WeClappDocType
 
 class BankAccountMigration(BaseMigration):
     """Migration wrapper for address objects from WeClapp to ERPNext.
     """
 
-    def __init__(self, en_api: ERPNextAPI, wc_data: dict, en_customer_data: dict = None):
+    """list[type[BaseMigration]]: Migrations run by this migration."""
+    sub_migrations = [BankMigration]
+
+    def __init__(self, en_api: ERPNextAPI, wc_data: dict, wc_customer_data: dict = None):
         """Initializes the contact migration.
 
         Args:
             en_api (ERPNextAPI): ERPNext-API-Object
             wc_data (dict): WeClapp-API-Object
-            en_customer_data (dict, optional): ERPNext-API-Object of the customer (parent). Defaults to None.
+            wc_customer_data (dict, optional): WeClapp-API-Object of the customer (parent), its ERPNext customer
+            is resolved by the identity map. Defaults to None.
         """
         super().__init__(en_api, wc_data)
-        self.en_customer_data = en_customer_data
+        self.wc_customer_data = wc_customer_data
         self._is_primary = self.wc_data.get("primary", False)
 
     def get_doctype(self) -> ERPNextDocType:
         return ERPNextDocType.BANK_ACCOUNT
+
+    def get_wc_doctype(self) -> WeClappDocType:
+        # Bank accounts are embedded in the WeClapp customer
+        return WeClappDocType.CUSTOMER
     
     def validate(self) -> bool:
         """
@@ -34,11 +43,12 @@ class BankAccountMigration(BaseMigration):
             self.wc_data.get("bankCode", None) and \
             self.wc_data.get("creditInstitute", None)
 
-    def migrate(self) -> dict:
-        """Migrates a given WeClapp-Object and creates it in ERPNext.
+    def get_en_data(self) -> dict:
+        """Returns the ERPNext data of the bank account with its bank assigned.
+        The bank is created in ERPNext if not existing.
 
         Returns:
-            str: Name of the created entity
+            dict: Data of the bank account or None if the bank is invalid
         """
         # Base data
         en_data = self._transform()
@@ -48,11 +58,20 @@ class BankAccountMigration(BaseMigration):
         if bank_migration.validate():
             en_bank = bank_migration.migrate()
             en_data["bank"] = en_bank["name"]       # Assign bank to account
+            return en_data
+        return None
+
+    def migrate(self) -> dict:
+        """Migrates a given WeClapp-Object and creates it in ERPNext.
 
+        Returns:
+            str: Name of the created entity
+        """
+        en_data = self.get_en_data()
+        if en_data:
             # Create bank account in ERPNext
             return self._en_api.create(ERPNextDocType.BANK_ACCOUNT, en_data)
 
-
     def _transform(self) -> dict:
         """Transforms the data from WeClapp to ERPNext.
 
@@ -64,7 +83,7 @@ class BankAccountMigration(BaseMigration):
             "account_type"      : config.EN_BANK_ACCOUNT_TYPE,
             "is_default"        : self.is_primary(),
             "party_type"        : "Customer",
-            "party"             : self.en_customer_data.get("name", None),
+            "party"             : self._get_customer_name(),
             "iban"              : self.wc_data.get("accountNumber", None)
         }
         return transformed_data
@@ -73,7 +92,12 @@ class BankAccountMigration(BaseMigration):
         """
         Maps the account name with the provided customer number (if given) or the address id from WeClapp.
         """
-        if self.en_customer_data and self.en_customer_data.get("name", None):
-            return self.en_customer_data["name"]
-        else:
-            return str(self.wc_data.get("id", None))
\ No newline at end of file
+        customer_name = self._get_customer_name()
+        return customer_name if customer_name else str(self.wc_data.get("id", None))
+
+    def _get_customer_name(self) -> str:
+        """Returns the name of the ERPNext customer (parent) from the identity map.
+        """
+        if not self.wc_customer_data:
+            return None
+        return self.identity_map.get(WeClappDocType.CUSTOMER, self.wc_customer_data.get("id", None))
\ No newline at end of file
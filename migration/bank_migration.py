@@ -1,5 +1,7 @@
 from .base_migration import BaseMigration
-from erpnext import ERPNextAPI, ERPNextHelper, ERPNextDocType, ERPNextFilter, FilterOperator
+from base import profile_stage
+from erpnext import ERPNextAPI, ERPNextHelper, ERPNextDocType, ERPNextBankRegistry
+from weclapp import WeClappDocType
 
 class BankMigration(BaseMigration):
     """Migration wrapper for address objects from WeClapp to ERPNext.
@@ -18,6 +20,10 @@ class BankMigration(BaseMigration):
     def get_doctype(self) -> ERPNextDocType:
         return ERPNextDocType.BANK
 
+    def get_wc_doctype(self) -> WeClappDocType:
+        # Banks are read from the bank accounts of the WeClapp customer
+        return WeClappDocType.CUSTOMER
+
     def validate(self) -> bool:
         """
         Validates the given data.
@@ -28,51 +34,21 @@ class BankMigration(BaseMigration):
         return self.wc_data.get("creditInstitute", None) and \
             self.wc_data.get("bankCode", None)
 
+    @profile_stage()
     def migrate(self) -> dict:
         """Migrates a given WeClapp-Bank and creates it in ERPNext or gets the existing one.
         This function tries to find a existing bank in ERPNext first which matches the SWIFT-number.
         If it can't find a bank, it will create a new one. In case the wished name already exists,
         it will append a number to the name in such format: "Name (1)".
+        The banks of ERPNext are looked up in the shared ERPNextBankRegistry (loaded once).
 
         Returns:
             dict: Created or found bank
         """
         new_bank = self._transform()
-        bank_name = new_bank.get("bank_name", None)
-        swift_number = new_bank.get("swift_number", None)
-
-        # Search for existing bank with same swift number
-        banks = self._en_api.search(ERPNextDocType.BANK, filters=[ERPNextFilter("swift_number",
-                                                                                 FilterOperator.EQUALS, swift_number)])
-        if len(banks) > 0:
-            existing_bank = banks[0]
-            return existing_bank
-        
-        # Create new bank: is the name already taken?
-        existing_bank = self._en_api.get(ERPNextDocType.BANK, bank_name)
-        if not existing_bank:
-            # Name is free -> create new bank
-            return self._en_api.create(ERPNextDocType.BANK, new_bank)
-        else:
-            # Name is taken -> append next free number to name
-            new_bank_name = None
-            i = 1
-            while not new_bank_name:
-                query_bank_name = f"{bank_name} ({i})"
-                existing_bank = self._en_api.get(ERPNextDocType.BANK, query_bank_name)
-
-                # New name doesnt exist yet, assign as new bank name
-                if not existing_bank:
-                    new_bank_name = query_bank_name
-                    break
+        return ERPNextBankRegistry.for_api(self._en_api).get_or_create(new_bank["bank_name"],
+                                                                        new_bank["swift_number"])
 
-                i += 1
-            
-            # New name found -> create new bank
-            if new_bank_name:
-                return self._en_api.create(ERPNextDocType.BANK, {"bank_name": new_bank_name, "swift_number": swift_number})
-                
-                
     def _transform(self) -> dict:
         """Transforms the data from WeClapp to ERPNext.
 
@@ -1,15 +1,29 @@
+import asyncio
 from abc import ABC, abstractmethod
-from erpnext import ERPNextAPI, ERPNextDocType
+from base import profile_stage
+from erpnext import AsyncERPNextAPI, ERPNextAPI, ERPNextDocType, ERPNextUploadQueue
 from pathlib import Path
+from typing import Callable
 import config
-from weclapp import WeClappDocType
+from weclapp import WeClappDocType, WcDependency
+from .migration_completion import MigrationCompletion
+from .migration_identity_map import MigrationIdentityMap
+from .migration_plan import MigrationPlan
 
 class BaseMigration(ABC):
     """Base class for all migration classes.
     Used to migrate a single dataset from WeClapp to ERPNext.
     Using a existing dict-Object from WeClapp-API.
+    A migration is split into plan (building the ERPNext payloads, no network access)
+    and load (creating the entities in ERPNext).
     """
 
+    """list[WcDependency]: WeClapp data read by the migration itself (used for selective caching)."""
+    wc_dependencies = []
+
+    """list[type[BaseMigration]]: Migrations run by this migration (e.g. for embedded data)."""
+    sub_migrations = []
+
     def __init__(self, en_api: ERPNextAPI, wc_data: dict):
         """Initializes the migration wrapper.
 
@@ -20,25 +34,96 @@ class BaseMigration(ABC):
         self._en_api = en_api
         self.wc_data = wc_data
         self._is_primary = False
+        self.completion: MigrationCompletion = None     # Set by MigrationWrapper, see _get_callback
+
+    @classmethod
+    def get_wc_dependencies(cls) -> list[WcDependency]:
+        """Returns the WeClapp data needed by the migration and its sub-migrations.
+
+        Returns:
+            list[WcDependency]: Dependencies (one per DocType)
+        """
+        dependencies = list(cls.wc_dependencies)
+        for sub_migration in cls.sub_migrations:
+            dependencies += sub_migration.get_wc_dependencies()
+        return WcDependency.merge(dependencies)
+
+    @property
+    def identity_map(self) -> MigrationIdentityMap:
+        """Returns the identity map shared by all migrations (ERPNext names of migrated WeClapp entities).
+
+        Returns:
+            MigrationIdentityMap: Identity map
+        """
+        return MigrationIdentityMap.for_api(self._en_api)
 
+    @profile_stage()
     def migrate(self) -> dict:
         """Migrates a given WeClapp-Object and creates it in ERPNext.
 
         Returns:
             dict: Data of the created entity
         """
-        return self._en_api.create(self.get_doctype(), self._transform())
+        plan = self.plan()
+        return self.load(plan) if plan else None
+
+    @profile_stage()
+    def plan(self) -> MigrationPlan:
+        """Builds the ERPNext payloads of the WeClapp-Object without network access
+        (may run in another process, without ERPNext-API-Object).
+
+        Returns:
+            MigrationPlan: Plan or None if the WeClapp-Object is skipped
+        """
+        return MigrationPlan(self.get_doctype(), self._transform())
+
+    @profile_stage()
+    def load(self, plan: MigrationPlan) -> dict:
+        """Creates the entities of a plan in ERPNext.
+
+        Args:
+            plan (MigrationPlan): Plan built by plan
+
+        Returns:
+            dict: Data of the created entity
+        """
+        return self._en_api.create(plan.doctype, plan.data)
+
+    async def migrate_async(self, en_async_api: AsyncERPNextAPI) -> dict:
+        """Migrates a given WeClapp-Object with the asyncio-API.
+        By default the synchronous migrate runs in a worker thread, migrations override this
+        to send their requests by the asyncio-API.
+
+        Args:
+            en_async_api (AsyncERPNextAPI): asyncio ERPNext-API-Object
+
+        Returns:
+            dict: Data of the created entity
+        """
+        return await asyncio.to_thread(self.migrate)
+
+    def _get_callback(self) -> Callable[[Exception], None]:
+        """Returns a callback for work completed after the migration returns (e.g. buffered inserts, queued uploads),
+        so the entity is only completed (journaled) once the work is done.
+
+        Returns:
+            Callable[[Exception], None]: Callback (see MigrationCompletion.add) or None without completion
+        """
+        return self.completion.add() if self.completion else None
 
     def is_primary(self) -> bool:
         """Returns if the contact is the primary contact of the customer.
         """
         return self._is_primary
     
-    def upload_weclapp_documents(self, name: str):
+    def upload_weclapp_documents(self, name: str, reused: bool = False):
         """Uploads and assigns the original WeClapp documents.
+        The files are queued in the ERPNextUploadQueue and uploaded by its worker threads.
 
         Args:
             name (str): Name of the entity to upload the documents to
+            reused (bool, optional): If True, the entity was created by an aborted migration
+            and files already attached to it aren't uploaded again. Defaults to False.
         """
         id = self.wc_data.get("id", None)
         if not id:
@@ -53,11 +138,15 @@ class BaseMigration(ABC):
         
         # Get all files in directory
         files = [f for f in wc_doc_base.iterdir() if f.is_file()]
+        if reused and files:
+            filters = [["attached_to_doctype", "=", self.get_doctype().value], ["attached_to_name", "=", name]]
+            attached = {file["file_name"] for file in self._en_api.get_all(ERPNextDocType.FILE, ["file_name"], filters)}
+            files = [f for f in files if f.name not in attached]
 
-        # Upload all files
+        # Queue all files for upload
+        upload_queue = ERPNextUploadQueue.for_api(self._en_api)
         for file in files:
-            self._en_api.upload_file(self.get_doctype(), name, str(file))
-            print(f"Uploaded file {file.name}")
+            upload_queue.add(self.get_doctype(), name, str(file), self._get_callback())
 
     @abstractmethod
     def _transform(self) -> dict:
@@ -1,5 +1,6 @@
 from .base_migration import BaseMigration
 from erpnext import ERPNextAPI, ERPNextHelper, ERPNextDocType
+from weclapp import WeClappDocType
 
 class ContactMigration(BaseMigration):
     """Migration wrapper for address objects from WeClapp to ERPNext.
@@ -22,6 +23,10 @@ class ContactMigration(BaseMigration):
     def get_doctype(self) -> ERPNextDocType:
         return ERPNextDocType.CONTACT
 
+    def get_wc_doctype(self) -> WeClappDocType:
+        # Contacts are embedded in the WeClapp customer
+        return WeClappDocType.CUSTOMER
+
     def validate(self) -> bool:
         """
         Validates the given data.
@@ -2,12 +2,28 @@ from .base_migration import BaseMigration
 from .address_migration import AddressMigration
 from .contact_migration import ContactMigration
 from .bank_account_migration import BankAccountMigration
+from .migration_plan import MigrationPlan
+from base import ApiException, profile_stage
 from erpnext import ERPNextAPI, ERPNextDocType, ERPNextHelper
+from weclapp import WeClappDocType, WcDependency
 
 class CustomerMigration(BaseMigration):
     """Migration wrapper for a customer object from WeClapp to ERPNext.
     """
 
+    """list[WcDependency]: WeClapp data read by the migration itself (used for selective caching)."""
+    wc_dependencies = [WcDependency(WeClappDocType.CUSTOMER)]
+
+    """list[type[BaseMigration]]: Migrations run by this migration."""
+    sub_migrations = [AddressMigration, ContactMigration, BankAccountMigration]
+
+    """dict[ERPNextDocType, list[str]]: Fields identifying the existing child entities of a reused customer."""
+    child_keys = {
+        ERPNextDocType.ADDRESS      : ["address_type", "address_line1", "city", "pincode"],
+        ERPNextDocType.CONTACT      : ["first_name", "last_name", "email_id"],
+        ERPNextDocType.BANK_ACCOUNT : ["iban"]
+    }
+
     def __init__(self, en_api: ERPNextAPI, wc_data: dict):
         """Initializes the migration wrapper.
 
@@ -20,53 +36,111 @@ class CustomerMigration(BaseMigration):
     def get_doctype(self) -> ERPNextDocType:
         return ERPNextDocType.CUSTOMER
 
-    def migrate(self) -> dict:
-        """Migrates a given WeClapp-Object and creates it in ERPNext.
+    def get_wc_doctype(self) -> WeClappDocType:
+        return WeClappDocType.CUSTOMER
+
+    @profile_stage()
+    def plan(self) -> MigrationPlan:
+        """Builds the payloads of the customer and its valid addresses and contacts (no network access).
+        Bank accounts are only validated, their banks are resolved while loading.
 
         Returns:
-            dict: Created ERPNext-Object
+            MigrationPlan: Plan of the customer
         """
         # Base data
         en_data = self._transform()
 
-        # Addresses
-        en_addresses = list()
-        for addr in self.wc_data["addresses"]:
-            addr_migration = AddressMigration(self._en_api, addr, self.wc_data)
-            if addr_migration.validate():               # Only migrate valid addresses
-                en_addr = addr_migration.migrate()      # Migrate address
-                en_addresses.append(en_addr)            # Add address to list
-                if addr_migration.is_primary():         # Primary address
-                    en_data["customer_primary_address"] = en_addr["name"]
-                    en_data["territory"] = en_addr["country"]
-
-        # Contacts
-        en_contacts = list()
-        for contact in self.wc_data["contacts"]:
-            contact_migration = ContactMigration(self._en_api, contact, self.wc_data)
-            if contact_migration.validate():            # Only migrate valid contacts
-                en_contact = contact_migration.migrate()
-                en_contacts.append(en_contact)          # Add contact to list
-                if contact_migration.is_primary():      # Primary contact
-                    en_data["customer_primary_contact"] = en_contact["name"]
-        
-        # Create customer in ERPNext
-        en_customer = self._en_api.create(ERPNextDocType.CUSTOMER, en_data)
+        # Valid addresses and contacts
+        addresses = [(m.is_primary(), m._transform()) for m in (AddressMigration(self._en_api, addr, self.wc_data)
+                                                                 for addr in self.wc_data["addresses"]) if m.validate()]
+        contacts = [(m.is_primary(), m._transform()) for m in (ContactMigration(self._en_api, contact, self.wc_data)
+                                                               for contact in self.wc_data["contacts"]) if m.validate()]
+        primary_addr = next((data for is_primary, data in addresses if is_primary), None)
+        if primary_addr:
+            en_data["territory"] = primary_addr["country"]
 
-        # Link addresses to customer
-        self._link_addresses(en_customer, en_addresses)
+        bank_accounts = [bank_account for bank_account in self.wc_data["bankAccounts"]
+                         if BankAccountMigration(self._en_api, bank_account, self.wc_data).validate()]
+        return MigrationPlan(ERPNextDocType.CUSTOMER, en_data, {
+            "addresses"     : addresses,
+            "contacts"      : contacts,
+            "bank_accounts" : bank_accounts
+        })
 
-        # Link contacts to customer
-        self._link_contacts(en_customer, en_contacts)
+    @profile_stage()
+    def load(self, plan: MigrationPlan) -> dict:
+        """Creates the customer with its addresses, contacts and bank accounts in ERPNext.
+        A customer left by an aborted load (e.g. a failed child or a crash) is reused,
+        only its missing addresses, contacts and bank accounts are created, so a failed customer can be retried.
 
-        # Bank Accounts
-        for bank_account in self.wc_data["bankAccounts"]:
-            bank_account_migration = BankAccountMigration(self._en_api, bank_account, en_customer)
-            if bank_account_migration.validate():
-                bank_account_migration.migrate()
+        Args:
+            plan (MigrationPlan): Plan built by plan
+
+        Returns:
+            dict: Created ERPNext-Object
+        """
+        # Create customer in ERPNext first, so addresses and contacts can be created with their link to it
+        en_customer, reused = self._create_customer(plan)
+        self.identity_map.add(WeClappDocType.CUSTOMER, self.wc_data["id"], ERPNextDocType.CUSTOMER,
+                              en_customer["name"], self.wc_data.get("customerNumber", None))
+
+        # Addresses and contacts
+        primary_data = {}
+        en_primary_addr = self._create_children(ERPNextDocType.ADDRESS, plan.children["addresses"], en_customer,
+                                                reused)
+        if en_primary_addr and not en_customer.get("customer_primary_address", None):
+            primary_data["customer_primary_address"] = en_primary_addr["name"]
+        en_primary_contact = self._create_children(ERPNextDocType.CONTACT, plan.children["contacts"], en_customer,
+                                                   reused)
+        if en_primary_contact and not en_customer.get("customer_primary_contact", None):
+            primary_data["customer_primary_contact"] = en_primary_contact["name"]
+
+        # Assign primary address and contact (ERPNext validates the links, so they can't be sent with the customer)
+        if primary_data:
+            self._en_api.update(ERPNextDocType.CUSTOMER, en_customer["name"], primary_data)
+            en_customer.update(primary_data)
+
+        # Bank Accounts (banks are resolved first, the accounts are created with one bulk insert)
+        existing = self._get_existing_children(ERPNextDocType.BANK_ACCOUNT, en_customer["name"]) if reused else {}
+        en_bank_accounts = []
+        for bank_account in plan.children["bank_accounts"]:
+            en_bank_account = BankAccountMigration(self._en_api, bank_account, self.wc_data).get_en_data()
+            if not en_bank_account:
+                continue
+            matches = existing.get(self._get_child_key(ERPNextDocType.BANK_ACCOUNT, en_bank_account), None)
+            if matches:
+                matches.pop()
+            else:
+                en_bank_accounts.append(en_bank_account)
+        if en_bank_accounts:
+            self._en_api.create_many(ERPNextDocType.BANK_ACCOUNT, en_bank_accounts)
 
         return en_customer
 
+    def _create_customer(self, plan: MigrationPlan) -> tuple[dict, bool]:
+        """Creates the customer or returns the customer created by an aborted load
+        (known by the identity map or rejected by ERPNext as duplicate).
+
+        Args:
+            plan (MigrationPlan): Plan built by plan
+
+        Returns:
+            tuple[dict, bool]: ERPNext customer and True if it already existed
+        """
+        name = self.identity_map.get(WeClappDocType.CUSTOMER, self.wc_data["id"])
+        en_customer = self._en_api.get(ERPNextDocType.CUSTOMER, name) if name else None
+        if en_customer:
+            return en_customer, True
+
+        try:
+            return self._en_api.create(plan.doctype, plan.data), False
+        except ApiException as e:
+            # HTTP 409: a customer with the name exists
+            en_customer = self._en_api.get(ERPNextDocType.CUSTOMER, plan.data["name"]) \
+                if e.status_code == 409 and plan.data.get("name", None) else None
+            if not en_customer:
+                raise
+            return en_customer, True
 
     def validate(self) -> bool:
         """
@@ -119,16 +193,82 @@ class CustomerMigration(BaseMigration):
         """
         return "Company" if self._is_company() else "Individual"
     
-    def _link_addresses(self, en_customer: dict, en_addresses: list):
-        """Links the addresses to the given customer
+    def _get_child_key(self, doctype: ERPNextDocType, data: dict) -> tuple:
+        """Returns the key identifying a child entity (see child_keys).
+
+        Args:
+            doctype (ERPNextDocType): DocType of the child entity
+            data (dict): Payload or existing ERPNext entity
+
+        Returns:
+            tuple: Values of the key fields
+        """
+        values = dict(data)
+        if doctype == ERPNextDocType.CONTACT and not values.get("email_id", None):
+            # ERPNext sets the email_id of a contact from its primary email
+            values["email_id"] = next((email["email_id"] for email in data.get("email_ids", None) or []
+                                       if email.get("is_primary", False)), None)
+        return tuple(str(values.get(field, None) or str()) for field in self.child_keys[doctype])
+
+    def _get_existing_children(self, doctype: ERPNextDocType, customer_name: str) -> dict[tuple, list[dict]]:
+        """Returns the child entities linked to a customer in ERPNext.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the child entities
+            customer_name (str): Name of the ERPNext customer
+
+        Returns:
+            dict[tuple, list[dict]]: Keys (see _get_child_key) mapped to the entities with the key
         """
-        for en_addr in en_addresses:
-            self._en_api.create_link(ERPNextDocType.CUSTOMER, en_customer["name"], \
-                                     ERPNextDocType.ADDRESS, en_addr["name"])
-            
-    def _link_contacts(self, en_customer: dict, en_contacts: list):
-        """Links the contacts to the given customer
+        if doctype == ERPNextDocType.BANK_ACCOUNT:
+            filters = [["party_type", "=", ERPNextDocType.CUSTOMER.value], ["party", "=", customer_name]]
+        else:
+            filters = [["Dynamic Link", "link_doctype", "=", ERPNextDocType.CUSTOMER.value],
+                       ["Dynamic Link", "link_name", "=", customer_name]]
+        existing = {}
+        for entity in self._en_api.get_all(doctype, fields=["name", *self.child_keys[doctype]], filters=filters):
+            existing.setdefault(self._get_child_key(doctype, entity), []).append(entity)
+        return existing
+
+    def _create_children(self, doctype: ERPNextDocType, children: list[tuple[bool, dict]], en_customer: dict,
+                         reused: bool = False) -> dict:
+        """Creates child entities (addresses, contacts) linked to the customer.
+        The primary entity is created by itself, since its name is needed for the customer.
+        All others are created with one bulk insert.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the child entities
+            children (list[tuple[bool, dict]]): Primary-flag and data of the valid child entities
+            en_customer (dict): Created ERPNext customer
+            reused (bool, optional): If True, the customer existed before and its existing child entities
+            aren't created again. Defaults to False.
+
+        Returns:
+            dict: Created (or existing) primary entity or None if there is none
         """
-        for en_contact in en_contacts:
-            self._en_api.create_link(ERPNextDocType.CUSTOMER, en_customer["name"], \
-                                     ERPNextDocType.CONTACT, en_contact["name"])
\ No newline at end of file
+        def with_link(data: dict) -> dict:
+            data["links"] = [{
+                "link_doctype"  : ERPNextDocType.CUSTOMER.value,
+                "link_name"     : en_customer["name"]
+            }]
+            return data
+
+        primary = next((data for is_primary, data in children if is_primary), None)
+        en_primary = None
+        missing = []
+        existing = self._get_existing_children(doctype, en_customer["name"]) if reused else {}
+        for is_primary, data in children:
+            matches = existing.get(self._get_child_key(doctype, data), None)
+            if not matches:
+                missing.append(data)
+            elif data is primary:
+                en_primary = matches.pop()
+            else:
+                matches.pop()
+
+        if any(data is primary for data in missing):
+            en_primary = self._en_api.create(doctype, with_link(primary))
+        others = [with_link(data) for data in missing if data is not primary]
+        if others:
+            self._en_api.create_many(doctype, others)
+        return en_primary
@@ -1,6 +1,9 @@
+import asyncio
 from .base_migration import BaseMigration
-from erpnext import ERPNextAPI, ERPNextDocType, ERPNextHelper, TaxInfo
-from weclapp import WeClappAPI, WeClappDocType
+from .migration_plan import MigrationPlan
+from base import ApiException, profile_stage
+from erpnext import AsyncERPNextAPI, ERPNextAPI, ERPNextDocType, ERPNextHelper, ERPNextInsertBuffer, TaxInfo
+from weclapp import WeClappAPI, WeClappDocType, WcDependency
 from datetime import datetime
 import config
 from pathlib import Path
@@ -13,6 +16,9 @@ class InvoiceMigration(BaseMigration):
         "2680"  : TaxInfo("4125 - Steuerfreie Innergemeinschaftliche Lieferungen § 4 Nr. 1b UStG - pcg", None, None, 0.0),
         "179484": TaxInfo("4125 - Steuerfreie Innergemeinschaftliche Lieferungen § 4 Nr. 1b UStG - pcg", None, None, 0.0)
     }
+    """list[WcDependency]: WeClapp data read by the migration itself (used for selective caching)."""
+    wc_dependencies = [WcDependency(WeClappDocType.SALES_INVOICE, documents=True)]
+
 
     def __init__(self, en_api: ERPNextAPI, wc_data: dict):
         """Initializes the migration wrapper.
@@ -54,7 +60,7 @@ class InvoiceMigration(BaseMigration):
             "set_posting_time"  : 1,
             "posting_date"      : self._map_invoice_date(),
             "due_date"          : self._map_due_date(),
-            "customer"          : self.wc_data.get("customerNumber", str()),
+            "customer"          : self.wc_data.get("customerNumber", str()),     # Resolved while loading
             "title"             : self.wc_data.get("commission", str()),
             "payment_schedule"  : self._map_payment_schedule() if not self._is_credit_note() else None,
             "taxes_and_charges" : config.EN_DEFAULT_TAXES_AND_CHARGES,
@@ -63,34 +69,125 @@ class InvoiceMigration(BaseMigration):
             "is_return"         : self._is_credit_note()
         }
     
-    def migrate(self) -> dict:
-        """Migrates a given WeClapp-Object and creates it in ERPNext.
+    @profile_stage()
+    def plan(self) -> MigrationPlan:
+        """Builds the payload of the invoice (no network access).
 
         Returns:
-            dict: Created ERPNext-Object
+            MigrationPlan: Plan or None if the invoice is invalid
         """
         # Base data
         en_data = self._transform()
+        return MigrationPlan(ERPNextDocType.SALES_INVOICE, en_data) if self.validate() else None
 
-        # Create customer in ERPNext (if not anonymous customer)
-        if self.validate():
-            en_invoice = self._en_api.create(ERPNextDocType.SALES_INVOICE, en_data)
+    @profile_stage()
+    def load(self, plan: MigrationPlan) -> dict:
+        """Creates the invoice in ERPNext, queues its documents and payment.
+        An invoice created by an aborted migration (known by the identity map or rejected by ERPNext
+        as duplicate) is reused, only its missing documents and payment are created.
 
-            try:
-                # After validation (is gross amount correct?)
-                self._post_validation(en_invoice)
-            except Exception as e:
-                print(e)
+        Args:
+            plan (MigrationPlan): Plan built by plan
 
-            # Upload WeClapp documents
-            self.upload_weclapp_documents(en_invoice.get("name", str()))
+        Returns:
+            dict: Created ERPNext-Object
+        """
+        name = self.identity_map.get(WeClappDocType.SALES_INVOICE, self.wc_data["id"])
+        en_invoice = self._en_api.get(ERPNextDocType.SALES_INVOICE, name) if name else None
+        if en_invoice:
+            return self._complete(en_invoice, reused=True)
+
+        try:
+            en_invoice = self._en_api.create(plan.doctype, self._resolve(plan))
+        except ApiException as e:
+            en_invoice = self._get_duplicate(e, plan)
+            return self._complete(en_invoice, reused=True)
+        return self._complete(en_invoice)
+
+    async def migrate_async(self, en_async_api: AsyncERPNextAPI) -> dict:
+        """Migrates a given WeClapp-Object with the asyncio-API.
+        Only the invoice is created by the asyncio-API, documents and payments are queued (see load).
+        Queuing blocks (identity map, full queue, bulk insert of a full batch), so it runs in a worker thread.
 
-            # Create payment if invoice is paid
-            self._create_payment(en_invoice)
+        Args:
+            en_async_api (AsyncERPNextAPI): asyncio ERPNext-API-Object
 
-            return en_invoice
-        else:
+        Returns:
+            dict: Created ERPNext-Object
+        """
+        plan = self.plan()
+        if not plan:
             return None
+        name = self.identity_map.get(WeClappDocType.SALES_INVOICE, self.wc_data["id"])
+        en_invoice = await en_async_api.get(ERPNextDocType.SALES_INVOICE, name) if name else None
+        if en_invoice:
+            return await asyncio.to_thread(self._complete, en_invoice, True)
+
+        try:
+            en_invoice = await en_async_api.create(plan.doctype, self._resolve(plan))
+        except ApiException as e:
+            en_invoice = await asyncio.to_thread(self._get_duplicate, e, plan)
+            return await asyncio.to_thread(self._complete, en_invoice, True)
+        return await asyncio.to_thread(self._complete, en_invoice)
+
+    def _get_duplicate(self, e: ApiException, plan: MigrationPlan) -> dict:
+        """Returns the invoice ERPNext rejected as duplicate (HTTP 409), e.g. created by an aborted migration
+        which didn't reach the identity map. Other errors are raised.
+
+        Args:
+            e (ApiException): Error of the create-request
+            plan (MigrationPlan): Plan built by plan
+
+        Raises:
+            ApiException: The error if the invoice wasn't rejected as duplicate or can't be found
+
+        Returns:
+            dict: Existing ERPNext invoice
+        """
+        en_invoice = self._en_api.get(ERPNextDocType.SALES_INVOICE, plan.data["name"]) \
+            if e.status_code == 409 and plan.data.get("name", None) else None
+        if not en_invoice:
+            raise e
+        return en_invoice
+
+    def _resolve(self, plan: MigrationPlan) -> dict:
+        """Returns the payload of the plan with the customer resolved by the identity map.
+
+        Args:
+            plan (MigrationPlan): Plan built by plan
+
+        Returns:
+            dict: Payload of the invoice
+        """
+        return {**plan.data, "customer": self._map_customer()}
+
+    def _complete(self, en_invoice: dict, reused: bool = False) -> dict:
+        """Completes the migration of a created invoice: validates it, queues the documents and the payment.
+
+        Args:
+            en_invoice (dict): Created ERPNext invoice
+            reused (bool, optional): If True, the invoice was created by an aborted migration and its existing
+            documents and payment aren't created again. Defaults to False.
+
+        Returns:
+            dict: Created ERPNext invoice
+        """
+        self.identity_map.add(WeClappDocType.SALES_INVOICE, self.wc_data["id"], ERPNextDocType.SALES_INVOICE,
+                              en_invoice["name"], self.wc_data.get("invoiceNumber", None))
+
+        try:
+            # After validation (is gross amount correct?)
+            self._post_validation(en_invoice)
+        except Exception as e:
+            print(e)
+
+        # Upload WeClapp documents
+        self.upload_weclapp_documents(en_invoice.get("name", str()), reused)
+
+        # Create payment if invoice is paid
+        self._create_payment(en_invoice, reused)
+
+        return en_invoice
         
     def _is_credit_note(self) -> bool:
         """Checks if the invoice is a credit note.
@@ -100,6 +197,15 @@ class InvoiceMigration(BaseMigration):
         """
         return self.wc_data.get("salesInvoiceType", str()) == "CREDIT_NOTE"
 
+    def _map_customer(self) -> str:
+        """Maps the customer by the identity map (WeClapp customer-ID, then customer number).
+        Falls back to the customer number for customers not migrated by this tool.
+        """
+        customer_number = self.wc_data.get("customerNumber", str())
+        return self.identity_map.get(WeClappDocType.CUSTOMER, self.wc_data.get("customerId", None)) \
+            or self.identity_map.get_by_key(ERPNextDocType.CUSTOMER, customer_number) \
+            or customer_number
+
     def _map_payment_schedule(self) -> list[dict]:
         """Maps the payment schedule from WeClapp to ERPNext.
 
@@ -141,6 +247,7 @@ class InvoiceMigration(BaseMigration):
                 self.taxes[wc_id] = [en_item]
 
     
+    @profile_stage()
     def _map_items(self) -> list[dict]:
         """Maps the items from WeClapp to ERPNext.
 
@@ -265,13 +372,15 @@ class InvoiceMigration(BaseMigration):
             if en_total != wc_total:
                 raise Exception(f"Gross amount of invoice {en_invoice.get('name', str())} is not correct! (ERPNext: {en_total}, WeClapp: {wc_total})")
 
-    def _create_payment(self, en_invoice: dict):
-        """Creates a payment for the given invoice.
+    def _create_payment(self, en_invoice: dict, reused: bool = False):
+        """Creates a payment for the given invoice (buffered, see ERPNextInsertBuffer).
         Uses the cash account and the invoice date as pay-date.
         Checks the payment status of the invoice first and ignores credit notes.
 
         Args:
             en_invoice (dict): Created ERPNext invoice
+            reused (bool, optional): If True, the invoice was created by an aborted migration
+            and no payment is created if it already has one. Defaults to False.
         """
         # Check if no credit note
         if self._is_credit_note():
@@ -284,6 +393,12 @@ class InvoiceMigration(BaseMigration):
         if en_invoice.get("grand_total", 0.0) <= 0.0:
             return
 
+        # Payment created by an aborted migration (cancelled payments don't count)
+        if reused and self._en_api.get_count(ERPNextDocType.PAYMENT_ENTRY, [
+                ["Payment Entry Reference", "reference_name", "=", en_invoice.get("name", str())],
+                ["docstatus", "<", 2]]):
+            return
+
         # Create payment
         data = {
             "docstatus"                 : config.EN_DEFAULT_INVOICE_STATE,                     
@@ -311,4 +426,5 @@ class InvoiceMigration(BaseMigration):
                 }
             ]
         }
-        self._en_api.create(ERPNextDocType.PAYMENT_ENTRY, data)
\ No newline at end of file
+        # Payments are independent of each other, they are created in batches of many invoices
+        ERPNextInsertBuffer.for_api(self._en_api).add(ERPNextDocType.PAYMENT_ENTRY, data, self._get_callback())
\ No newline at end of file
@@ -0,0 +1,62 @@
+from threading import Lock
+from typing import Callable
+
+class MigrationCompletion:
+    """Completion of a migrated entity whose migration leaves work behind (buffered inserts, queued uploads).
+    The migration gets a callback per piece of work (see add). The entity is complete once the migration
+    returned (see finish) and all callbacks were called. Then on_complete is called once (by the thread
+    completing the last piece of work) with the created ERPNext-Object and the first error.
+    """
+
+    def __init__(self, on_complete: Callable[[dict, Exception], None]):
+        """Initializes the completion of a running migration.
+
+        Args:
+            on_complete (Callable[[dict, Exception], None]): Called with the created ERPNext-Object
+            (None if skipped) and the first error (None if everything succeeded)
+        """
+        self.on_complete = on_complete
+        self._pending = 1       # The migration itself
+        self._en_obj = None
+        self._error = None
+        self._lock = Lock()
+
+    def add(self) -> Callable[[Exception], None]:
+        """Registers a piece of work completed later.
+
+        Returns:
+            Callable[[Exception], None]: Callback to call once, with None if the work succeeded
+            or with the error if it failed
+        """
+        with self._lock:
+            self._pending += 1
+        return self._done
+
+    def finish(self, en_obj: dict, error: Exception) -> None:
+        """Registers the result of the migration itself.
+
+        Args:
+            en_obj (dict): Created ERPNext-Object (None if skipped or failed)
+            error (Exception): Error of the migration (None if successful)
+        """
+        with self._lock:
+            self._en_obj = en_obj
+        self._done(error)
+
+    def _done(self, error: Exception = None) -> None:
+        """Completes a piece of work, the last one calls on_complete.
+
+        Args:
+            error (Exception, optional): Error of the work. Defaults to None.
+        """
+        with self._lock:
+            self._pending -= 1
+            if error is not None and self._error is None:
+                self._error = error
+            if self._pending:
+                return
+        try:
+            self.on_complete(self._en_obj, self._error)
+        except Exception as e:
+            # Called by the threads of the insert buffer and upload queue, which must keep running
+            print(f"Could not complete migration: {e}")
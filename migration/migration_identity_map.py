@@ -0,0 +1,124 @@
+import config
+import sqlite3
+from threading import RLock
+from erpnext import ERPNextAPI, ERPNextDocType, ERPNextService, RecordingERPNextAPI
+from weclapp import WeClappDocType
+
+class MigrationIdentityMap(ERPNextService):
+    """Persistent map of migrated entities: which ERPNext name every WeClapp entity became.
+    Entities are found by WeClapp DocType and ID or by ERPNext DocType and a natural key
+    (e.g. the customer number), so migrations can resolve references without ERPNext requests.
+    The map is stored in a SQLite-database and loaded at once into memory on first use.
+    Safe to use by concurrent migrations.
+    """
+
+    def __init__(self, en_api: ERPNextAPI, path: str = config.EN_IDENTITY_MAP):
+        """Initializes the identity map, the database is loaded on first use.
+
+        Args:
+            en_api (ERPNextAPI): ERPNext-API-Object
+            path (str, optional): Path of the database-file. Defaults to config.EN_IDENTITY_MAP
+            (None = kept in memory only).
+        """
+        super().__init__(en_api)
+        if isinstance(en_api, RecordingERPNextAPI):
+            path = None     # Synthetic names of dry runs mustn't be mixed into the identity map
+        self.path = path or ":memory:"
+        self.conn = None
+        self._by_id = None          # (WeClapp DocType, WeClapp-ID) mapped to ERPNext names
+        self._by_key = None         # (ERPNext DocType, natural key) mapped to ERPNext names
+        self._lock = RLock()
+
+    def _load(self) -> None:
+        """Opens the database and loads all entries if not loaded yet. Must be called with the lock held.
+        """
+        if self.conn is not None:
+            return
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS identity_map (
+                wc_doctype TEXT NOT NULL,
+                wc_id TEXT NOT NULL,
+                en_doctype TEXT NOT NULL,
+                en_name TEXT NOT NULL,
+                natural_key TEXT,
+                PRIMARY KEY (wc_doctype, wc_id))""")
+        self._by_id = {}
+        self._by_key = {}
+        for wc_doctype, wc_id, en_doctype, en_name, natural_key in self.conn.execute(
+                "SELECT wc_doctype, wc_id, en_doctype, en_name, natural_key FROM identity_map"):
+            self._by_id[(wc_doctype, wc_id)] = en_name
+            if natural_key is not None:
+                self._by_key[(en_doctype, natural_key)] = en_name
+
+    def add(self, wc_doctype: WeClappDocType, wc_id: str, en_doctype: ERPNextDocType, en_name: str,
+            natural_key: str = None) -> None:
+        """Adds (or replaces) a migrated entity.
+
+        Args:
+            wc_doctype (WeClappDocType): WeClapp DocType
+            wc_id (str): WeClapp-ID
+            en_doctype (ERPNextDocType): ERPNext DocType
+            en_name (str): Name of the ERPNext entity
+            natural_key (str, optional): Natural key of the entity (e.g. customer number). Defaults to None.
+        """
+        self.add_many(wc_doctype, en_doctype, [(wc_id, en_name, natural_key)])
+
+    def add_many(self, wc_doctype: WeClappDocType, en_doctype: ERPNextDocType,
+                 entries: list[tuple[str, str, str]]) -> None:
+        """Adds (or replaces) migrated entities of a DocType with one transaction.
+
+        Args:
+            wc_doctype (WeClappDocType): WeClapp DocType
+            en_doctype (ERPNextDocType): ERPNext DocType
+            entries (list[tuple[str, str, str]]): WeClapp-ID, ERPNext name and natural key (or None) per entity
+        """
+        rows = [(wc_doctype.value, str(wc_id), en_doctype.value, en_name, natural_key)
+                for wc_id, en_name, natural_key in entries]
+        with self._lock:
+            self._load()
+            with self.conn:
+                self.conn.executemany("INSERT OR REPLACE INTO identity_map "
+                                      "(wc_doctype, wc_id, en_doctype, en_name, natural_key) VALUES (?, ?, ?, ?, ?)",
+                                      rows)
+            for wc_doctype_value, wc_id, en_doctype_value, en_name, natural_key in rows:
+                self._by_id[(wc_doctype_value, wc_id)] = en_name
+                if natural_key is not None:
+                    self._by_key[(en_doctype_value, natural_key)] = en_name
+
+    def get(self, wc_doctype: WeClappDocType, wc_id: str) -> str:
+        """Returns the ERPNext name of a WeClapp entity.
+
+        Args:
+            wc_doctype (WeClappDocType): WeClapp DocType
+            wc_id (str): WeClapp-ID
+
+        Returns:
+            str: Name of the ERPNext entity or None if not migrated
+        """
+        with self._lock:
+            self._load()
+            return self._by_id.get((wc_doctype.value, str(wc_id)), None)
+
+    def get_by_key(self, en_doctype: ERPNextDocType, natural_key: str) -> str:
+        """Returns the ERPNext name of an entity by its natural key.
+
+        Args:
+            en_doctype (ERPNextDocType): ERPNext DocType
+            natural_key (str): Natural key of the entity (e.g. customer number)
+
+        Returns:
+            str: Name of the ERPNext entity or None if not migrated
+        """
+        with self._lock:
+            self._load()
+            return self._by_key.get((en_doctype.value, natural_key), None)
+
+    def close(self) -> None:
+        """Closes the database, it is opened and loaded again on next use.
+        """
+        with self._lock:
+            if self.conn is not None:
+                self.conn.close()
+                self.conn = None
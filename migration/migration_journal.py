@@ -0,0 +1,90 @@
+import sqlite3
+import time
+from threading import Lock
+
+class MigrationJournal:
+    """Durable journal of migrated entities (SQLite-database, one row per migration attempt).
+    Every entry maps a WeClapp-ID to the ERPNext name and status and is committed (fsync'd) right after
+    the entity is migrated, so an aborted migration can be resumed without creating entities twice.
+    Entries are only appended; a WeClapp-ID counts as migrated once it has a created entry.
+    """
+
+    CREATED = "created"
+    FAILED = "failed"
+
+    def __init__(self, path: str):
+        """Opens the journal (it is created if not existing).
+
+        Args:
+            path (str): Path of the database-file
+        """
+        self.path = path
+        self.lock = Lock()      # The connection is shared between the migration threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")    # Every commit is on disk before the next entity
+        with self.conn:
+            self.conn.execute("""CREATE TABLE IF NOT EXISTS journal (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                doctype TEXT NOT NULL,
+                wc_id TEXT NOT NULL,
+                en_name TEXT,
+                status TEXT NOT NULL,
+                error TEXT,
+                time REAL NOT NULL)""")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS journal__doctype_wc_id ON journal (doctype, wc_id)")
+
+    def _append(self, doctype: str, wc_id: str, en_name: str, status: str, error: str = None) -> None:
+        """Appends an entry and commits it.
+
+        Args:
+            doctype (str): WeClapp DocType
+            wc_id (str): WeClapp-ID
+            en_name (str): Name of the ERPNext entity
+            status (str): Status of the migration (CREATED or FAILED)
+            error (str, optional): Error message. Defaults to None.
+        """
+        with self.lock, self.conn:
+            self.conn.execute("INSERT INTO journal (doctype, wc_id, en_name, status, error, time) "
+                              "VALUES (?, ?, ?, ?, ?, ?)",
+                              (doctype, str(wc_id), en_name, status, error, time.time()))
+
+    def record_created(self, doctype: str, wc_id: str, en_name: str) -> None:
+        """Records a migrated entity.
+
+        Args:
+            doctype (str): WeClapp DocType
+            wc_id (str): WeClapp-ID
+            en_name (str): Name of the created ERPNext entity
+        """
+        self._append(doctype, wc_id, en_name, self.CREATED)
+
+    def record_failed(self, doctype: str, wc_id: str, error: str) -> None:
+        """Records an entity which could not be migrated.
+
+        Args:
+            doctype (str): WeClapp DocType
+            wc_id (str): WeClapp-ID
+            error (str): Error message
+        """
+        self._append(doctype, wc_id, None, self.FAILED, error)
+
+    def get_completed(self, doctype: str) -> dict[str, str]:
+        """Returns the migrated entities of a DocType, for O(1) lookups when resuming.
+
+        Args:
+            doctype (str): WeClapp DocType
+
+        Returns:
+            dict[str, str]: WeClapp-IDs mapped to the names of the ERPNext entities
+        """
+        with self.lock:
+            rows = self.conn.execute("SELECT wc_id, en_name FROM journal WHERE doctype = ? AND status = ? ORDER BY seq",
+                                     (doctype, self.CREATED)).fetchall()
+        return dict(rows)
+
+    def close(self) -> None:
+        """Closes the database connection.
+        """
+        with self.lock:
+            self.conn.close()
@@ -0,0 +1,41 @@
+from erpnext import ERPNextDocType
+
+class MigrationPlan:
+    """ERPNext payloads of a WeClapp-Object, built by BaseMigration.plan without network access (stage 1)
+    and executed by BaseMigration.load (stage 2). Plans only hold plain data, so they can be built
+    in other processes.
+    """
+
+    def __init__(self, doctype: ERPNextDocType, data: dict, children: dict = None):
+        """Initializes the plan.
+
+        Args:
+            doctype (ERPNextDocType): DocType of the entity to create
+            data (dict): Data of the entity to create
+            children (dict, optional): Payloads of dependent entities by kind (e.g. "addresses").
+            Defaults to None.
+        """
+        self.doctype    = doctype
+        self.data       = data
+        self.children   = children or {}
+
+    @staticmethod
+    def build_many(migration_class: type, wc_objs: list[dict]) -> list[tuple["MigrationPlan", Exception]]:
+        """Builds the plans of WeClapp-Objects (used as task of a process pool).
+        The migrations are created without ERPNext-API-Object, planning mustn't access the network.
+
+        Args:
+            migration_class (type[BaseMigration]): Migration class of the WeClapp-Objects
+            wc_objs (list[dict]): WeClapp-Objects
+
+        Returns:
+            list[tuple[MigrationPlan, Exception]]: Plan (None if skipped) and error (None if successful)
+            per WeClapp-Object
+        """
+        results = []
+        for wc_obj in wc_objs:
+            try:
+                results.append((migration_class(None, wc_obj).plan(), None))
+            except Exception as e:
+                results.append((None, e))
+        return results
@@ -1,64 +1,439 @@
+import asyncio
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 import config
+from base import ApiMetrics, MetricsExporter, StageProfiler, profile_stage
 from .base_migration import BaseMigration
 from .customer_migration import CustomerMigration
 from .address_migration import AddressMigration
 from .invoice_migration import InvoiceMigration
+from .migration_completion import MigrationCompletion
+from .migration_journal import MigrationJournal
+from .migration_identity_map import MigrationIdentityMap
+from .migration_plan import MigrationPlan
 from weclapp import WeClappAPI, WeClappDocType, WcCacheApi
-from erpnext import ERPNextAPI, ERPNextDocType
+from erpnext import AsyncERPNextAPI, ERPNextAPI, ERPNextDocType, ERPNextInsertBuffer, ERPNextUploadQueue, \
+    RecordingERPNextAPI
 
 class MigrationWrapper:
     """Generic migration wrapper from WeClapp to ERPNext.
     """
 
-    def __init__(self, wc_doctype: WeClappDocType, en_doctype: ERPNextDocType):
+    def __init__(self, wc_doctype: WeClappDocType, en_doctype: ERPNextDocType, dry_run: bool = False):
         """Initializes the migration wrapper.
 
         Args:
             wc_doctype (WeClappDocTypes): WeClapp document type
             en_doctype (ERPNextDocTypes): ERPNext document type
+            dry_run (bool, optional): If True, nothing is sent to ERPNext, the would-be requests are written
+            to config.EN_DRY_RUN_OUTPUT (see RecordingERPNextAPI). Defaults to False.
         """
         self.wc_doctype = wc_doctype
         self.en_doctype = en_doctype
+        self.dry_run = dry_run
         #self.wc_api = WeClappAPI(config.WC_API_TOKEN, config.WC_API_BASE)
         self.wc_api = WcCacheApi(config.WC_CACHE_BASE)
-        self.en_api = ERPNextAPI(config.EN_API_KEY, config.EN_API_SECRET, config.EN_API_BASE)
+        self.en_api = RecordingERPNextAPI(config.EN_DRY_RUN_OUTPUT) if dry_run else \
+            ERPNextAPI(config.EN_API_KEY, config.EN_API_SECRET, config.EN_API_BASE)
+        self.journal = None
+        self._incomplete = 0        # Entities whose buffered inserts or uploads failed (see _record)
+        self._lock = threading.Lock()
+        self.metrics_exporter = MetricsExporter(
+            ApiMetrics.get_shared(), config.API_METRICS_INTERVAL, config.API_METRICS_JSON,
+            config.API_METRICS_PROMETHEUS) if config.API_METRICS else None
+        self.profiler = StageProfiler.configure(config.PROFILE_STAGES, config.PROFILE_MODE, config.PROFILE_INTERVAL,
+                                                config.PROFILE_OUTPUT)
 
     def __enter__(self):
         """Setup function for the migration wrapper.
         """
         self.wc_api.open()
         self.en_api.open()
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
+        if config.EN_MIGRATION_JOURNAL and not self.dry_run:
+            self.journal = MigrationJournal(config.EN_MIGRATION_JOURNAL)
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
         """Cleanup function for the migration wrapper.
         """
+        ERPNextInsertBuffer.for_api(self.en_api).flush()
+        ERPNextUploadQueue.for_api(self.en_api).close()
+        MigrationIdentityMap.for_api(self.en_api).close()
         self.wc_api.close()
         self.en_api.close()
+        if self.journal:
+            self.journal.close()
+            self.journal = None
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.profiler:
+            self.profiler.write()
 
-    def migrate_all(self):
-        """Migrates all documents from WeClapp to ERPNext of the given DocType.
+    def _record(self, wc_obj: dict, en_obj: dict, error: Exception) -> None:
+        """Records the result of a migrated WeClapp-Object in the journal once it is complete,
+        i.e. its buffered inserts and uploads are done as well (see MigrationCompletion).
+        Called by the thread completing the last piece of work.
+
+        Args:
+            wc_obj (dict): WeClapp-Object
+            en_obj (dict): Created ERPNext-Object (None if skipped)
+            error (Exception): First error of the migration or its buffered inserts and uploads
+            (None if successful)
+        """
+        if error and en_obj:
+            # The entity was created, but e.g. its payment or a document failed (completed on resume)
+            with self._lock:
+                self._incomplete += 1
+            print(f"Could not complete {self.en_doctype} {en_obj['name']}: {getattr(error, 'message', error)}")
+        if not self.journal or not wc_obj.get("id", None):
+            return
+        if error:
+            self.journal.record_failed(self.wc_doctype.value, wc_obj["id"], str(getattr(error, "message", error)))
+        elif en_obj:
+            self.journal.record_created(self.wc_doctype.value, wc_obj["id"], en_obj["name"])
+
+    def _get_completion(self, wc_obj: dict) -> MigrationCompletion:
+        """Returns the completion of a WeClapp-Object, it records the result once complete (see _record).
+
+        Args:
+            wc_obj (dict): WeClapp-Object
+
+        Returns:
+            MigrationCompletion: Completion to pass to the migration
+        """
+        return MigrationCompletion(lambda en_obj, error: self._record(wc_obj, en_obj, error))
+
+    @profile_stage()
+    def _migrate_one(self, wc_obj: dict) -> tuple[dict, Exception]:
+        """Migrates a single WeClapp-Object. Errors are returned instead of raised,
+        so a failing entity doesn't stop the others. The result is recorded in the journal
+        once the buffered inserts and uploads of the entity are done.
+
+        Args:
+            wc_obj (dict): WeClapp-Object
+
+        Returns:
+            tuple[dict, Exception]: Created ERPNext-Object (None if skipped) and error (None if successful)
+        """
+        completion = self._get_completion(wc_obj)
+        try:
+            en_obj, error = self._get_migration(wc_obj, completion).migrate(), None
+        except Exception as e:
+            en_obj, error = None, e
+        completion.finish(en_obj, error)
+        return en_obj, error
+
+    async def _migrate_one_async(self, wc_obj: dict, en_async_api: AsyncERPNextAPI) -> tuple[dict, Exception]:
+        """Migrates a single WeClapp-Object with the asyncio-API, see _migrate_one.
+
+        Args:
+            wc_obj (dict): WeClapp-Object
+            en_async_api (AsyncERPNextAPI): asyncio ERPNext-API-Object
+
+        Returns:
+            tuple[dict, Exception]: Created ERPNext-Object (None if skipped) and error (None if successful)
+        """
+        completion = self._get_completion(wc_obj)
+        try:
+            en_obj, error = await self._get_migration(wc_obj, completion).migrate_async(en_async_api), None
+        except Exception as e:
+            en_obj, error = None, e
+        # May write the journal (synchronous commit), which mustn't block the event loop
+        await asyncio.to_thread(completion.finish, en_obj, error)
+        return en_obj, error
+
+    @profile_stage()
+    def _load_one(self, wc_obj: dict, plan: MigrationPlan, error: Exception) -> tuple[dict, Exception]:
+        """Loads the plan of a single WeClapp-Object (stage 2 of migrate_staged), see _migrate_one.
+
+        Args:
+            wc_obj (dict): WeClapp-Object
+            plan (MigrationPlan): Plan of the WeClapp-Object (None if skipped)
+            error (Exception): Error of the planning (None if successful)
+
+        Returns:
+            tuple[dict, Exception]: Created ERPNext-Object (None if skipped) and error (None if successful)
+        """
+        completion = self._get_completion(wc_obj)
+        en_obj = None
+        if error is None and plan is not None:
+            try:
+                en_obj = self._get_migration(wc_obj, completion).load(plan)
+            except Exception as e:
+                error = e
+        completion.finish(en_obj, error)
+        return en_obj, error
+
+    @profile_stage()
+    def _get_wc_data(self, stats: dict, resume: bool) -> list[dict]:
+        """Returns the WeClapp-Objects to migrate.
+
+        Args:
+            stats (dict): Counters of the migration (the resumed entities are counted)
+            resume (bool): Skip the entities already migrated according to the journal
+
+        Returns:
+            list[dict]: WeClapp-Objects
         """
         wc_data = self.wc_api.get_all(self.wc_doctype)
-        for wc_obj in wc_data:
-            migration = self._get_migration(wc_obj)
-            en_obj = migration.migrate()
-            if en_obj:
-                print(f"Created {self.en_doctype} {en_obj['name']}")
 
-    def _get_migration(self, wc_obj: dict) -> BaseMigration:
+        # Drop the entities migrated by a previous run
+        if resume:
+            if not self.journal:
+                raise Exception("Resuming requires a migration journal (config.EN_MIGRATION_JOURNAL)!")
+            completed = self.journal.get_completed(self.wc_doctype.value)
+            remaining = [wc_obj for wc_obj in wc_data if str(wc_obj.get("id", None)) not in completed]
+            stats["resumed"] = len(wc_data) - len(remaining)
+            wc_data = remaining
+            print(f"Resuming {self.wc_doctype}: {stats['resumed']} already migrated, {len(wc_data)} remaining")
+        return wc_data
+
+    def _log(self, stats: dict, index: int, total: int, wc_obj: dict, en_obj: dict, error: Exception) -> None:
+        """Logs and counts the result of a migrated WeClapp-Object.
+
+        Args:
+            stats (dict): Counters of the migration
+            index (int): Position of the WeClapp-Object (starting with 1)
+            total (int): Amount of WeClapp-Objects
+            wc_obj (dict): WeClapp-Object
+            en_obj (dict): Created ERPNext-Object (None if skipped)
+            error (Exception): Error (None if successful)
+        """
+        if error:
+            stats["failed"] += 1
+            print(f"[{index}/{total}] Could not migrate {self.wc_doctype} {wc_obj.get('id', None)}: "
+                  f"{getattr(error, 'message', error)}")
+        elif en_obj:
+            stats["created"] += 1
+            print(f"[{index}/{total}] Created {self.en_doctype} {en_obj['name']}")
+        else:
+            stats["skipped"] += 1
+
+    @profile_stage()
+    def _finish(self, stats: dict, total: int, start: float) -> None:
+        """Creates the buffered entities, waits for the uploads and prints the summary.
+        Afterwards all migrated entities are complete and recorded in the journal.
+
+        Args:
+            stats (dict): Counters of the migration (the incomplete entities are counted)
+            total (int): Amount of migrated WeClapp-Objects
+            start (float): Start time (time.perf_counter)
+        """
+        # Create the entities still buffered for bulk inserts (e.g. payments) and wait for the attachments
+        ERPNextInsertBuffer.for_api(self.en_api).flush()
+        upload_queue = ERPNextUploadQueue.for_api(self.en_api)
+        upload_queue.join()
+        with self._lock:
+            stats["incomplete"], self._incomplete = self._incomplete, 0
+
+        seconds = time.perf_counter() - start
+        print(f"Migrated {self.wc_doctype}: {stats['created']} created ({stats['incomplete']} incomplete), "
+              f"{stats['skipped']} skipped, {stats['failed']} failed in {seconds:.1f}s "
+              f"({total / seconds if seconds else 0:.1f}/s)")
+        upload_queue.print_report()
+        if self.dry_run:
+            self.en_api.print_report()
+        elif self.en_api.metrics:
+            self.en_api.metrics.print_report()
+
+    @profile_stage()
+    def migrate_all(self, workers: int = config.EN_MIGRATION_WORKERS,
+                    max_in_flight: int = config.EN_MIGRATION_MAX_IN_FLIGHT, resume: bool = False) -> dict:
+        """Migrates all documents from WeClapp to ERPNext of the given DocType.
+        The entities are migrated by a pool of worker threads, at most max_in_flight entities are
+        submitted at once. Progress is logged in the order of the WeClapp-Objects.
+        Every migrated entity is recorded in the journal (config.EN_MIGRATION_JOURNAL).
+
+        Args:
+            workers (int, optional): Amount of entities migrated in parallel. Defaults to config.EN_MIGRATION_WORKERS.
+            max_in_flight (int, optional): Maximum amount of submitted, not yet logged entities.
+            Defaults to config.EN_MIGRATION_MAX_IN_FLIGHT.
+            resume (bool, optional): Skip the entities already migrated according to the journal
+            (e.g. after an aborted migration). Defaults to False.
+
+        Returns:
+            dict: Amount of created, incomplete (created, but e.g. their payment or documents failed),
+            skipped, failed and resumed (already migrated) entities
+        """
+        start = time.perf_counter()
+        stats = {"created": 0, "incomplete": 0, "skipped": 0, "failed": 0, "resumed": 0}
+        wc_data = self._get_wc_data(stats, resume)
+        total = len(wc_data)
+        workers = max(1, workers)
+        max_in_flight = max(workers, max_in_flight)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for index, wc_obj in enumerate(wc_data, start=1):
+                # Wait for the oldest entity if the window is full
+                if len(in_flight) >= max_in_flight:
+                    done_index, done_obj, future = in_flight.popleft()
+                    self._log(stats, done_index, total, done_obj, *future.result())
+                in_flight.append((index, wc_obj, executor.submit(self._migrate_one, wc_obj)))
+
+            while in_flight:
+                done_index, done_obj, future = in_flight.popleft()
+                self._log(stats, done_index, total, done_obj, *future.result())
+
+        self._finish(stats, total, start)
+        return stats
+
+    @profile_stage()
+    def migrate_staged(self, transform_workers: int = config.EN_TRANSFORM_WORKERS,
+                       load_workers: int = config.EN_MIGRATION_WORKERS,
+                       queue_size: int = config.EN_PIPELINE_QUEUE_SIZE,
+                       max_in_flight: int = config.EN_MIGRATION_MAX_IN_FLIGHT, resume: bool = False) -> dict:
+        """Migrates all documents from WeClapp to ERPNext of the given DocType in two overlapping stages:
+        1. transform: a process pool builds the plans (ERPNext payloads) in chunks of config.EN_TRANSFORM_CHUNK_SIZE
+        2. load: a pool of worker threads executes the plans against ERPNext (see migrate_all)
+        The stages are connected by a queue of at most queue_size plans, so a slow load stage
+        holds the transform stage back. Progress is logged in the order of the WeClapp-Objects.
+
+        Args:
+            transform_workers (int, optional): Amount of transform processes. Defaults to config.EN_TRANSFORM_WORKERS.
+            load_workers (int, optional): Amount of entities loaded in parallel. Defaults to config.EN_MIGRATION_WORKERS.
+            queue_size (int, optional): Maximum amount of plans waiting for the load stage.
+            Defaults to config.EN_PIPELINE_QUEUE_SIZE.
+            max_in_flight (int, optional): Maximum amount of submitted, not yet logged entities.
+            Defaults to config.EN_MIGRATION_MAX_IN_FLIGHT.
+            resume (bool, optional): Skip the entities already migrated according to the journal
+            (e.g. after an aborted migration). Defaults to False.
+
+        Returns:
+            dict: Amount of created, incomplete (created, but e.g. their payment or documents failed),
+            skipped, failed and resumed (already migrated) entities
+        """
+        start = time.perf_counter()
+        stats = {"created": 0, "incomplete": 0, "skipped": 0, "failed": 0, "resumed": 0}
+        wc_data = self._get_wc_data(stats, resume)
+        total = len(wc_data)
+        transform_workers = max(1, transform_workers)
+        load_workers = max(1, load_workers)
+        max_in_flight = max(load_workers, max_in_flight)
+        plans = queue.Queue(maxsize=max(1, queue_size))
+        migration_class = self._get_migration_class()
+        chunk_size = max(1, config.EN_TRANSFORM_CHUNK_SIZE)
+
+        def put_plans(chunk: list[dict], future) -> None:
+            try:
+                results = future.result()
+            except Exception as e:
+                results = [(None, e)] * len(chunk)
+            for wc_obj, (plan, error) in zip(chunk, results):
+                plans.put((wc_obj, plan, error))    # Blocks while the load stage is behind
+
+        def transform() -> None:
+            # Two chunks per process are submitted, so the processes don't wait for the next chunk
+            try:
+                with ProcessPoolExecutor(max_workers=transform_workers) as executor:
+                    in_flight = deque()
+                    for i in range(0, total, chunk_size):
+                        if len(in_flight) >= transform_workers * 2:
+                            put_plans(*in_flight.popleft())
+                        chunk = wc_data[i:i + chunk_size]
+                        in_flight.append((chunk, executor.submit(MigrationPlan.build_many, migration_class, chunk)))
+                    while in_flight:
+                        put_plans(*in_flight.popleft())
+            finally:
+                plans.put(None)
+
+        transformer = threading.Thread(target=transform, daemon=True)
+        transformer.start()
+        with ThreadPoolExecutor(max_workers=load_workers) as executor:
+            in_flight = deque()
+            index = 0
+            while (item := plans.get()) is not None:
+                index += 1
+                # Wait for the oldest entity if the window is full
+                if len(in_flight) >= max_in_flight:
+                    done_index, done_obj, future = in_flight.popleft()
+                    self._log(stats, done_index, total, done_obj, *future.result())
+                in_flight.append((index, item[0], executor.submit(self._load_one, *item)))
+
+            while in_flight:
+                done_index, done_obj, future = in_flight.popleft()
+                self._log(stats, done_index, total, done_obj, *future.result())
+        transformer.join()
+
+        self._finish(stats, total, start)
+        return stats
+
+    async def migrate_async(self, concurrency: int = config.EN_ASYNC_MIGRATION_CONCURRENCY,
+                            resume: bool = False) -> dict:
+        """Migrates all documents from WeClapp to ERPNext of the given DocType with asyncio,
+        e.g. asyncio.run(migration.migrate_async()).
+        Up to concurrency entities are migrated at once by the asyncio-API (AsyncERPNextAPI),
+        migrations without asyncio-support run in worker threads (see BaseMigration.migrate_async).
+        Progress is logged in the order of the WeClapp-Objects, see migrate_all.
+
+        Args:
+            concurrency (int, optional): Amount of entities migrated at once.
+            Defaults to config.EN_ASYNC_MIGRATION_CONCURRENCY.
+            resume (bool, optional): Skip the entities already migrated according to the journal
+            (e.g. after an aborted migration). Defaults to False.
+
+        Returns:
+            dict: Amount of created, incomplete (created, but e.g. their payment or documents failed),
+            skipped, failed and resumed (already migrated) entities
+        """
+        if self.dry_run:
+            raise Exception("Dry runs aren't supported by migrate_async, use migrate_all or migrate_staged!")
+        start = time.perf_counter()
+        stats = {"created": 0, "incomplete": 0, "skipped": 0, "failed": 0, "resumed": 0}
+        wc_data = self._get_wc_data(stats, resume)
+        total = len(wc_data)
+        concurrency = max(1, concurrency)
+
+        async with AsyncERPNextAPI(self.en_api.api_key, self.en_api.api_secret, self.en_api.base_url) as en_async_api:
+            in_flight = deque()
+            for index, wc_obj in enumerate(wc_data, start=1):
+                # Wait for the oldest entity if the window is full
+                if len(in_flight) >= concurrency:
+                    done_index, done_obj, task = in_flight.popleft()
+                    self._log(stats, done_index, total, done_obj, *(await task))
+                in_flight.append((index, wc_obj,
+                                  asyncio.ensure_future(self._migrate_one_async(wc_obj, en_async_api))))
+
+            while in_flight:
+                done_index, done_obj, task = in_flight.popleft()
+                self._log(stats, done_index, total, done_obj, *(await task))
+
+        # Buffered entities and uploads are sent by threads, they mustn't block the event loop
+        await asyncio.to_thread(self._finish, stats, total, start)
+        return stats
+
+    def _get_migration(self, wc_obj: dict, completion: MigrationCompletion = None) -> BaseMigration:
         """Returns the migration object for the given WeClapp-Object.
 
+        Args:
+            wc_obj (dict): WeClapp-Object
+            completion (MigrationCompletion, optional): Completion of the WeClapp-Object. Defaults to None.
+
         Returns:
             BaseMigration: Migration object
         """
+        migration = self._get_migration_class()(self.en_api, wc_obj)
+        migration.completion = completion
+        return migration
+
+    def _get_migration_class(self) -> type[BaseMigration]:
+        """Returns the migration class of the DocType.
+
+        Returns:
+            type[BaseMigration]: Migration class
+        """
         match self.en_doctype:
             case ERPNextDocType.CUSTOMER:
-                return CustomerMigration(self.en_api, wc_obj)
+                return CustomerMigration
             case ERPNextDocType.ADDRESS:
-                return AddressMigration(self.en_api, wc_obj)
+                return AddressMigration
             case ERPNextDocType.SALES_INVOICE:
-                return InvoiceMigration(self.en_api, wc_obj)
+                return InvoiceMigration
             case _:
                 raise Exception("No migration found for given doctype!")
\ No newline at end of file
@@ -1,5 +1,9 @@
 from .wc_customer_api import WCCustomerAPI
 from .wc_api import WeClappAPI
+from .wc_async_api import AsyncWeClappAPI
 from .wc_doctypes import WeClappDocType
+from .wc_dependency import WcDependency
+from .wc_cache_backend import WcCacheBackend, PysonDbBackend
+from .wc_cache_sqlite import SqliteBackend
 from .wc_cache_api import WcCacheApi
 from .wc_cache_wrapper import WcCacheWrapper
\ No newline at end of file
@@ -1,71 +1,66 @@
 import config
+import os
 import requests
-from requests import RequestException
+from pathlib import Path
+from typing import Iterator
 from .wc_doctypes import WeClappDocType
-from base import ApiBase, ApiException
+from base import ApiBase, ApiException, ApiMetrics, RequestPolicy, Transport, iter_pages
 
 class WeClappAPI(ApiBase):
-    def __init__(self, api_token: str, base_url : str):
+    def __init__(self, api_token: str, base_url : str, request_policy: RequestPolicy = None,
+                 transport: Transport = None, metrics: ApiMetrics = None):
         """Class for accessing WeClapp API.
 
         Args:
             api_token (str)     : WeClapp API key
             base_url (str)      : WeClapp API base URL with trailing slash
-            doctype (str)       : WeClapp DocType (e.g. Customer, Address, ...)
+            request_policy (RequestPolicy, optional): Rate limit, timeout and retries of requests.
+                                  Defaults to the settings in config (WC_RATE_LIMIT, API_*).
+            transport (Transport, optional): Pooled transport to create the session with.
+                                  Defaults to the shared transport configured in config (API_POOL_*).
+            metrics (ApiMetrics, optional): Metrics to record the requests in.
+                                  Defaults to the shared metrics if enabled in config (API_METRICS).
         """
-        super().__init__(base_url)
+        super().__init__(base_url, request_policy or RequestPolicy(
+            rate_limit=config.WC_RATE_LIMIT,
+            burst=config.WC_RATE_BURST,
+            timeout=config.API_TIMEOUT,
+            max_retries=config.API_MAX_RETRIES,
+            backoff_base=config.API_BACKOFF_BASE,
+            backoff_max=config.API_BACKOFF_MAX
+        ), transport or Transport.get_shared(config.API_POOL_MAXSIZE, config.API_POOL_HOSTS, config.API_POOL_BLOCK),
+            metrics or (ApiMetrics.get_shared() if config.API_METRICS else None))
         self.api_token          = api_token
 
     def open(self):
         """Opens the api connection.
         """
-        self.session = requests.Session()
-        self.session.headers = {
+        self.session = self.transport.create_session({
             "Content-Type"          : "application/json",
             "AuthenticationToken"   : self.api_token
-        }
+        })
 
     def close(self):
         """Closes the api connection.
         """
-        self.session.close()
+        self.transport.release(self.session)
 
-    def _request(self, url : str, method: str, data: dict = None, params: dict = None) -> dict:
+    def _request(self, url : str, method: str, data: dict = None, params: dict = None,
+                 stream: bool = False) -> requests.Response:
         """Makes a request to WeClapp API
 
         Args:
             url (str): URL to make request to
             method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
             data (dict, optional): Data to send with request. Defaults to None.
+            stream (bool, optional): If True, the response body is not read in advance. Defaults to False.
 
         Returns:
-            dict: Response JSON
+            requests.Response: Response
         Raises:
-            Exception: If request fails
-        """
-        try:
-            response = self.session.request(method=method, url=url, json=data, params=params)
-            response.raise_for_status()
-        except RequestException as e:
-            if response.status_code == 404:
-
-                raise ApiException(
-                    message=f"Not found: {response.text}",
-                    method=method,
-                    url=url,
-                    response_text=response.text,
-                    status_code=response.status_code
-                ) from e
-            else:
-                raise ApiException(
-                    message=f"Error in {method} request to {url}: {response.text}",
-                    method=method,
-                    url=url,
-                    response_text=response.text,
-                    status_code=response.status_code
-                ) from e
-
-        return response
+            ApiException: If request fails (after retries)
+        """
+        return self._send(self.session, method, url, json=data, params=params, stream=stream)
     
     def _get_url(self, doctype: WeClappDocType|str) -> str:
         """Returns base URL for current API-connection and given DocType.
@@ -82,7 +77,7 @@ class WeClappAPI(ApiBase):
             return f"{self.base_url}{doctype.value}"
 
     def _get_page(self, doctype: WeClappDocType|str, page: int, page_size: int = config.WC_PAGE_SIZE,
-                  serialize_nulls: bool = False) -> dict:
+                  serialize_nulls: bool = False, filters: dict = None) -> dict:
         """Gets a page of entities of the DocType
 
         Args:
@@ -90,6 +85,7 @@ class WeClappAPI(ApiBase):
             page (int): Page number
             page_size (int, optional): Page size. Defaults to config.WC_PAGE_SIZE.
             serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
 
         Returns:
             dict: JSON-response from WeClapp API
@@ -97,27 +93,68 @@ class WeClappAPI(ApiBase):
         url = self._get_url(doctype)
         if serialize_nulls:
             url += "?serializeNulls=true"
-        return self._request(url, "GET", None, { "page": page, "pageSize": page_size }).json()["result"]
+        return self._request(url, "GET", None, { **(filters or {}), "page": page, "pageSize": page_size }).json()["result"]
     
-    def get_all(self, doctype: WeClappDocType|str, serialize_nulls: bool = False) -> list[dict]:
-        """Get all entities of the DocType
+    def iter_pages(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                   max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                   filters: dict = None, count: int = None) -> Iterator[list[dict]]:
+        """Yields all pages of entities of the DocType in page order.
+        Pages are fetched by a pool of max_workers threads, but never more than max_workers pages
+        are held at once. So memory depends on the page size and not on the amount of entities.
+
+        Args:
+            doc_type (WeClappDocType): DocType to get all entities from
+            serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            max_workers (int, optional): Amount of pages fetched in parallel. Defaults to config.WC_MAX_WORKERS.
+            speculative (bool, optional): If True, pages are fetched without a preceding count-request
+            until the first page with less than config.WC_PAGE_SIZE entities. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+            count (int, optional): Amount of entities if already known (e.g. by get_count), no count-request
+            is sent then. Defaults to None.
+
+        Yields:
+            list[dict]: Entities of a page
+        """
+        pages = None
+        if not speculative:
+            if count is None:
+                count = self.get_count(doctype, filters)                        # Get count of entities
+            pages = (count + config.WC_PAGE_SIZE - 1) // config.WC_PAGE_SIZE    # Calculate amount of pages
+
+        yield from iter_pages(
+            lambda page: self._get_page(doctype, page + 1, serialize_nulls=serialize_nulls, filters=filters),
+            config.WC_PAGE_SIZE, max_workers, pages)
+
+    def iter_all(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                 max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                 filters: dict = None) -> Iterator[dict]:
+        """Yields all entities of the DocType in page order.
+        See iter_pages for the arguments.
+
+        Yields:
+            dict: Entity
+        """
+        for page in self.iter_pages(doctype, serialize_nulls, max_workers, speculative, filters):
+            yield from page
+
+    def get_all(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                filters: dict = None) -> list[dict]:
+        """Get all entities of the DocType.
+        Pages are fetched by a pool of max_workers threads and merged in page order.
 
         Args:
             doc_type (WeClappDocType): DocType to get all entities from
             serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            max_workers (int, optional): Amount of pages fetched in parallel. Defaults to config.WC_MAX_WORKERS.
+            speculative (bool, optional): If True, pages are fetched without a preceding count-request
+            until the first page with less than config.WC_PAGE_SIZE entities. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
 
         Returns:
             dict: JSON-response from WeClapp API
         """
-        count = self.get_count(doctype)                                     # Get count of entities
-        pages = (count + config.WC_PAGE_SIZE - 1) // config.WC_PAGE_SIZE    # Calculate amount of pages
-
-        # Get all pages and merge them
-        result = []
-        for page in range(1, pages + 1):
-            result += self._get_page(doctype, page, serialize_nulls=serialize_nulls)
-            
-        return result
+        return list(self.iter_all(doctype, serialize_nulls, max_workers, speculative, filters))
     
     def get(self, doctype: WeClappDocType|str, id : str, serialize_nulls: bool = False) -> dict:
         """Get an entity of the DocType
@@ -149,13 +186,16 @@ class WeClappAPI(ApiBase):
         """
         return self._request(f"{self._get_url(doctype)}", "GET", None, { f"{field}-eq": value }).json()["result"]
     
-    def get_count(self, doctype: WeClappDocType|str) -> int:
+    def get_count(self, doctype: WeClappDocType|str, filters: dict = None) -> int:
         """Returns the count of readable objects of the DocType
 
+        Args:
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+
         Returns:
             int: Amount of objects of DocType
         """
-        result = self._request(f"{self._get_url(doctype)}/count", "GET").json()
+        result = self._request(f"{self._get_url(doctype)}/count", "GET", None, filters).json()
         if result and result.get("result", None) != None:
             return result["result"]
         else:
@@ -213,18 +253,50 @@ class WeClappAPI(ApiBase):
         return self._request(self._get_url("document"), "GET",
                              params={"entityName": doctype.value, "entityId": id}).json()["result"]
     
-    def download_document(self, id: str, filename: str) -> None:
-        """Downloads a document from WeClapp
+    def download_document(self, id: str, filename: str, expected_size: int = None,
+                          last_modified: int = None,
+                          chunk_size: int = config.WC_DOWNLOAD_CHUNK_SIZE) -> bool:
+        """Downloads a document from WeClapp.
+        The document is streamed in chunks into a temporary file which is renamed at the end,
+        so a file with the given filename is always complete.
+        An existing file is skipped if it has the expected size and isn't older than the document.
+        WeClapp exposes no checksum of documents, so a damaged local file with the right size and
+        modification time isn't detected (delete it to download it again).
 
         Args:
             id (str): ID of the document to download
             filename (str): Filename to save the document to
+            expected_size (int, optional): Size of the document in bytes. If given and an existing file
+            has this size, the download is skipped. Defaults to None.
+            last_modified (int, optional): Last modification of the document (UNIX time in milliseconds).
+            If given, an existing file modified before is downloaded again and the modification time
+            of the downloaded file is set to it. Defaults to None.
+            chunk_size (int, optional): Bytes per chunk. Defaults to config.WC_DOWNLOAD_CHUNK_SIZE.
+
+        Returns:
+            bool: True if downloaded, False if skipped
         """
+        path = Path(filename)
+        if expected_size is not None and path.exists():
+            stat = path.stat()
+            if stat.st_size == expected_size and \
+                    (last_modified is None or stat.st_mtime_ns >= last_modified * 1_000_000):
+                return False
+
         url = f"{self.base_url}document/id/{id}/download"
-        response = self._request(url, "GET")
-        # Save result to PDF-file
-        with open(filename, "wb") as file:
-            file.write(response.content)
+        tmp_path = path.with_name(f"{path.name}.part")
+        with self._request(url, "GET", stream=True) as response:
+            try:
+                # Save result to file chunk by chunk
+                with open(tmp_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        file.write(chunk)
+                if last_modified is not None:
+                    os.utime(tmp_path, ns=(last_modified * 1_000_000, last_modified * 1_000_000))
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        return True
 
     def get_archived_emails(self, doctype: WeClappDocType|str, id: str) -> list[dict]:
         """Gets all archived emails for a given DocType and ID.
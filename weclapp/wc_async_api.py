@@ -0,0 +1,339 @@
+import config
+import os
+from pathlib import Path
+from typing import AsyncIterator
+from .wc_doctypes import WeClappDocType
+from base import AsyncApiBase, ApiException, ApiMetrics, AsyncRequestPolicy, aiter_pages
+
+class AsyncWeClappAPI(AsyncApiBase):
+    def __init__(self, api_token: str, base_url : str, request_policy: AsyncRequestPolicy = None,
+                 max_concurrency: int = config.API_ASYNC_CONCURRENCY, metrics: ApiMetrics = None):
+        """Class for accessing WeClapp API with asyncio (same methods as WeClappAPI, as coroutines).
+
+        Args:
+            api_token (str)     : WeClapp API key
+            base_url (str)      : WeClapp API base URL with trailing slash
+            request_policy (AsyncRequestPolicy, optional): Rate limit, timeout and retries of requests.
+                                  Defaults to the settings in config (WC_RATE_LIMIT, API_*).
+            max_concurrency (int, optional): Maximum amount of requests in flight.
+                                  Defaults to config.API_ASYNC_CONCURRENCY.
+            metrics (ApiMetrics, optional): Metrics to record the requests in.
+                                  Defaults to the shared metrics if enabled in config (API_METRICS).
+        """
+        super().__init__(base_url, request_policy or AsyncRequestPolicy(
+            rate_limit=config.WC_RATE_LIMIT,
+            burst=config.WC_RATE_BURST,
+            timeout=config.API_TIMEOUT,
+            max_retries=config.API_MAX_RETRIES,
+            backoff_base=config.API_BACKOFF_BASE,
+            backoff_max=config.API_BACKOFF_MAX
+        ), max_concurrency, metrics or (ApiMetrics.get_shared() if config.API_METRICS else None))
+        self.api_token          = api_token
+
+    async def open(self):
+        """Opens the api connection.
+        """
+        self.session = self._create_session({
+            "Content-Type"          : "application/json",
+            "AuthenticationToken"   : self.api_token,
+            "Accept-Encoding"       : "gzip, deflate"
+        })
+
+    async def close(self):
+        """Closes the api connection.
+        """
+        await self.session.close()
+
+    async def _request(self, url : str, method: str, data: dict = None, params: dict = None,
+                       stream: bool = False):
+        """Makes a request to WeClapp API
+
+        Args:
+            url (str): URL to make request to
+            method (str): HTTP method (e.g. GET, POST, PUT, DELETE)
+            data (dict, optional): Data to send with request. Defaults to None.
+            stream (bool, optional): If True, the response body is not read in advance. Defaults to False.
+
+        Returns:
+            aiohttp.ClientResponse: Response
+        Raises:
+            ApiException: If request fails (after retries)
+        """
+        return await self._send(self.session, method, url, stream=stream, json=data,
+                                params=self._convert_params(params))
+
+    async def _request_json(self, url : str, method: str, data: dict = None, params: dict = None):
+        """Makes a request to WeClapp API and returns the JSON-response.
+        See _request for the arguments.
+
+        Returns:
+            dict: JSON-response
+        """
+        return await (await self._request(url, method, data, params)).json(content_type=None)
+
+    @staticmethod
+    def _convert_params(params: dict) -> dict:
+        """Converts query parameters to strings (aiohttp only accepts str, int and float).
+
+        Args:
+            params (dict): Query parameters
+
+        Returns:
+            dict: Converted query parameters
+        """
+        if not params:
+            return None
+        return {key: str(value).lower() if isinstance(value, bool) else value
+                for key, value in params.items() if value is not None}
+
+    def _get_url(self, doctype: WeClappDocType|str) -> str:
+        """Returns base URL for current API-connection and given DocType.
+
+        Args:
+            doctype (WeClappDocType): Desired DocType
+
+        Returns:
+            str: Url built of Base-URL & DocType
+        """
+        if isinstance(doctype, str):
+            return f"{self.base_url}{doctype}"
+        else:
+            return f"{self.base_url}{doctype.value}"
+
+    async def _get_page(self, doctype: WeClappDocType|str, page: int, page_size: int = config.WC_PAGE_SIZE,
+                        serialize_nulls: bool = False, filters: dict = None) -> dict:
+        """Gets a page of entities of the DocType
+
+        Args:
+            doc_type (WeClappDocType): DocType to get all entities from
+            page (int): Page number
+            page_size (int, optional): Page size. Defaults to config.WC_PAGE_SIZE.
+            serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        url = self._get_url(doctype)
+        if serialize_nulls:
+            url += "?serializeNulls=true"
+        return (await self._request_json(url, "GET", None,
+                                         { **(filters or {}), "page": page, "pageSize": page_size }))["result"]
+
+    async def iter_pages(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                         max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                         filters: dict = None, count: int = None) -> AsyncIterator[list[dict]]:
+        """Yields all pages of entities of the DocType in page order.
+        Up to max_workers pages are fetched at once, but never more than max_workers pages are held at once.
+
+        Args:
+            doc_type (WeClappDocType): DocType to get all entities from
+            serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            max_workers (int, optional): Amount of pages fetched at once. Defaults to config.WC_MAX_WORKERS.
+            speculative (bool, optional): If True, pages are fetched without a preceding count-request
+            until the first page with less than config.WC_PAGE_SIZE entities. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+            count (int, optional): Amount of entities if already known (e.g. by get_count), no count-request
+            is sent then. Defaults to None.
+
+        Yields:
+            list[dict]: Entities of a page
+        """
+        pages = None
+        if not speculative:
+            if count is None:
+                count = await self.get_count(doctype, filters)                  # Get count of entities
+            pages = (count + config.WC_PAGE_SIZE - 1) // config.WC_PAGE_SIZE    # Calculate amount of pages
+
+        async for page in aiter_pages(
+                lambda page: self._get_page(doctype, page + 1, serialize_nulls=serialize_nulls, filters=filters),
+                config.WC_PAGE_SIZE, max_workers, pages):
+            yield page
+
+    async def iter_all(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                       max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                       filters: dict = None) -> AsyncIterator[dict]:
+        """Yields all entities of the DocType in page order.
+        See iter_pages for the arguments.
+
+        Yields:
+            dict: Entity
+        """
+        async for page in self.iter_pages(doctype, serialize_nulls, max_workers, speculative, filters):
+            for entity in page:
+                yield entity
+
+    async def get_all(self, doctype: WeClappDocType|str, serialize_nulls: bool = False,
+                      max_workers: int = config.WC_MAX_WORKERS, speculative: bool = False,
+                      filters: dict = None) -> list[dict]:
+        """Get all entities of the DocType.
+        Up to max_workers pages are fetched at once and merged in page order.
+
+        Args:
+            doc_type (WeClappDocType): DocType to get all entities from
+            serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+            max_workers (int, optional): Amount of pages fetched at once. Defaults to config.WC_MAX_WORKERS.
+            speculative (bool, optional): If True, pages are fetched without a preceding count-request
+            until the first page with less than config.WC_PAGE_SIZE entities. Defaults to False.
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        return [entity async for entity in self.iter_all(doctype, serialize_nulls, max_workers, speculative, filters)]
+
+    async def get(self, doctype: WeClappDocType|str, id : str, serialize_nulls: bool = False) -> dict:
+        """Get an entity of the DocType
+
+        Args:
+            doc_type (WeClappDocType): DocType to get the entity from
+            id (int): ID of the entity to get
+            serialize_nulls (bool, optional): If True, null values will be serialized. Defaults to False.
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        url = f"{self._get_url(doctype)}/id/{id}"
+        if serialize_nulls:
+            url += "?serializeNulls=true"
+        return await self._request_json(url, "GET")
+
+    async def search(self, doctype: WeClappDocType|str, field: str, value: str) -> list[dict]:
+        """Starts a search in the WeClapp-API by passing a fieldname of the current DocType
+        and a value to search for.
+        Uses the -eq (equals) modifier.
+
+        Args:
+            field (str): Name of the field to check for
+            value (str): The value to search for
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        return (await self._request_json(f"{self._get_url(doctype)}", "GET", None, { f"{field}-eq": value }))["result"]
+
+    async def get_count(self, doctype: WeClappDocType|str, filters: dict = None) -> int:
+        """Returns the count of readable objects of the DocType
+
+        Args:
+            filters (dict, optional): WeClapp filter parameters (e.g. {"lastModifiedDate-gt": 0}). Defaults to None.
+
+        Returns:
+            int: Amount of objects of DocType
+        """
+        result = await self._request_json(f"{self._get_url(doctype)}/count", "GET", None, filters)
+        if result and result.get("result", None) != None:
+            return result["result"]
+        else:
+            raise ApiException(
+                message=f"Couldn't get amount of {doctype}-DocType",
+                method="GET",
+                url=f"{self._get_url(doctype)}/count"
+            )
+
+    async def create(self, doctype: WeClappDocType|str, data : dict) -> dict:
+        """Creates a new entity of the DocType
+
+        Args:
+            doctype (WeClappDocType): DocType to create the entity in
+            data (dict): Data to fill the entity with
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        return await self._request_json(self._get_url(doctype), "POST", data)
+
+    async def update(self, doctype: WeClappDocType|str, id : int, data : dict) -> dict:
+        """Updates an entity of the DocType
+
+        Args:
+            id (int)    : ID of the entity to update
+            data (dict) : Data to update the entity with
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        return await self._request_json(f"{self._get_url(doctype)}/id/{id}", "PUT", data)
+
+    async def delete(self, doctype: WeClappDocType|str, id : int) -> dict:
+        """Deletes an entity of the DocType
+
+        Args:
+            id (int): ID of the entity to delete
+
+        Returns:
+            dict: JSON-response from WeClapp API
+        """
+        return await self._request_json(f"{self._get_url(doctype)}/id/{id}", "DELETE")
+
+    async def get_documents(self, doctype: WeClappDocType|str, id: str) -> list[dict]:
+        """Gets all linked documents for a given DocType and ID.
+
+        Args:
+            doctype (WeClappDocType): DocType to get the documents from
+            id (str): ID of the entity to get the documents from
+
+        Returns:
+            list[dict]: List of documents
+        """
+        return (await self._request_json(self._get_url("document"), "GET",
+                                         params={"entityName": doctype.value, "entityId": id}))["result"]
+
+    async def download_document(self, id: str, filename: str, expected_size: int = None,
+                                last_modified: int = None,
+                                chunk_size: int = config.WC_DOWNLOAD_CHUNK_SIZE) -> bool:
+        """Downloads a document from WeClapp.
+        The document is streamed in chunks into a temporary file which is renamed at the end,
+        so a file with the given filename is always complete.
+        An existing file is skipped if it has the expected size and isn't older than the document.
+        WeClapp exposes no checksum of documents, so a damaged local file with the right size and
+        modification time isn't detected (delete it to download it again).
+
+        Args:
+            id (str): ID of the document to download
+            filename (str): Filename to save the document to
+            expected_size (int, optional): Size of the document in bytes. If given and an existing file
+            has this size, the download is skipped. Defaults to None.
+            last_modified (int, optional): Last modification of the document (UNIX time in milliseconds).
+            If given, an existing file modified before is downloaded again and the modification time
+            of the downloaded file is set to it. Defaults to None.
+            chunk_size (int, optional): Bytes per chunk. Defaults to config.WC_DOWNLOAD_CHUNK_SIZE.
+
+        Returns:
+            bool: True if downloaded, False if skipped
+        """
+        path = Path(filename)
+        if expected_size is not None and path.exists():
+            stat = path.stat()
+            if stat.st_size == expected_size and \
+                    (last_modified is None or stat.st_mtime_ns >= last_modified * 1_000_000):
+                return False
+
+        url = f"{self.base_url}document/id/{id}/download"
+        tmp_path = path.with_name(f"{path.name}.part")
+        async with await self._request(url, "GET", stream=True) as response:
+            try:
+                # Save result to file chunk by chunk
+                with open(tmp_path, "wb") as file:
+                    async for chunk in response.content.iter_chunked(chunk_size):
+                        file.write(chunk)
+                if last_modified is not None:
+                    os.utime(tmp_path, ns=(last_modified * 1_000_000, last_modified * 1_000_000))
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+        return True
+
+    async def get_archived_emails(self, doctype: WeClappDocType|str, id: str) -> list[dict]:
+        """Gets all archived emails for a given DocType and ID.
+
+        Args:
+            doctype (WeClappDocType): DocType to get the archived emails from
+            id (str): ID of the entity to get the archived emails from
+
+        Returns:
+            list[dict]: List of archived emails
+        """
+        return (await self._request_json(self._get_url('archivedEmail'), "GET",
+                                         params={"entityName": doctype.value,
+                                                 "entityId": id, "serializeNulls": True}))["result"]
@@ -1,20 +1,48 @@
 from pathlib import Path
-from pysondb import PysonDB
+from threading import Lock
+from typing import Iterable
+import config
 from base import ApiBase, ApiException
 from .wc_doctypes import WeClappDocType
+from .wc_cache_backend import WcCacheBackend, PysonDbBackend
+from .wc_cache_sqlite import SqliteDatabase
 
 class WcCacheApi(ApiBase):
-    """Class for accessing WeClapp data from cache (psysondb)
+    """Class for accessing WeClapp data from cache (pysondb or sqlite)
     """
 
-    def __init__(self, base_url: str):
+    """list[str]: Available storage backends."""
+    backends = ["pysondb", "sqlite"]
+
+    """str: Filename of the SQLite-database (in base path)."""
+    sqlite_filename = "cache.sqlite3"
+
+    def __init__(self, base_url: str, backend: str = config.WC_CACHE_BACKEND,
+                 indexes: dict[str, list[str]] = config.WC_CACHE_INDEXES,
+                 persist_indexes: bool = config.WC_CACHE_PERSIST_INDEXES):
         """Initializes the api wrapper for local WeClapp-db cache.
 
         Args:
-            base_url (str): Base filepath to database-files (.json)
+            base_url (str): Base filepath to database-files (.json / .sqlite3)
+            backend (str, optional): Storage backend ("pysondb" or "sqlite"). Defaults to config.WC_CACHE_BACKEND.
+            indexes (dict[str, list[str]], optional): DocType-values mapped to the fields to index for
+            search and get. Defaults to config.WC_CACHE_INDEXES.
+            persist_indexes (bool, optional): If True, indexes of the pysondb backend are saved next to the
+            database-files. Defaults to config.WC_CACHE_PERSIST_INDEXES.
         """
         super().__init__(base_url)
+        if backend not in self.backends:
+            raise ApiException(
+                message=f"Unknown cache backend '{backend}' (available: {', '.join(self.backends)}).",
+                method="__init__",
+                url=base_url
+            )
+        self.backend = backend
+        self.indexes = indexes or {}
+        self.persist_indexes = persist_indexes
         self._open_conns = {}   # Used for storing open connections to databases
+        self._sqlite = None     # Shared SQLite-database (sqlite backend only)
+        self._lock = Lock()
 
     def open(self):
         """Opens the api connection.
@@ -31,46 +59,68 @@ class WcCacheApi(ApiBase):
     def close(self):
         """Closes the api connection.
         """
-        pass
+        with self._lock:
+            for db in self._open_conns.values():
+                db.close()
+            self._open_conns = {}
+            if self._sqlite:
+                self._sqlite.close()
+                self._sqlite = None
+
+    def clear(self) -> None:
+        """Deletes all cached entities of all DocTypes.
+        """
+        with self._lock:
+            self._open_conns = {}
+            if self.backend == "sqlite":
+                self._get_sqlite().drop_all()
+            else:
+                for pattern in ["*.json", "*.index"]:
+                    for file in Path(self.base_url).glob(pattern):
+                        file.unlink()
+
+    def _get_sqlite(self) -> SqliteDatabase:
+        """Returns the shared SQLite-database. Must be called with the lock held.
+
+        Returns:
+            SqliteDatabase: Database
+        """
+        if not self._sqlite:
+            self._sqlite = SqliteDatabase(str(Path(self.base_url).joinpath(self.sqlite_filename)))
+        return self._sqlite
 
-    def _get_db(self, doctype: WeClappDocType|str) -> PysonDB:
+    def _get_db(self, doctype: WeClappDocType|str) -> WcCacheBackend:
         """Returns the database for the given DocType.
+        Indexes declared for the DocType are built (or loaded) when the database is opened.
 
         Args:
             doctype (WeClappDocType|str): DocType to get the database from
 
         Returns:
-            PysonDB: Database
+            WcCacheBackend: Database
         """
         doctype_str = doctype.value if isinstance(doctype, WeClappDocType) else doctype
 
-        # Checks if database is already open
-        if self._open_conns.get(doctype_str, None):
-            return self._open_conns[doctype_str]
-
-        # Opens the database
-        db_path = Path(self.base_url).joinpath(f"{doctype_str}.json")
-        try:
-            self._open_conns[doctype_str] = PysonDB(str(db_path))
-            return self._open_conns[doctype_str]
-        except Exception as e:
-            raise ApiException(
-                message=f"Could not get database for DocType '{doctype_str}'.",
-                method="_get_db",
-                url=self.base_url
-            ) from e
-        
-    def _get_by_db_id(self, doctype: WeClappDocType|str, id: str) -> dict:
-        """Returns the object with the given id from the given DocType.
-
-        Args:
-            doctype (str): DocType to get the object from
-            id (str): ID of the object
-
-        Returns:
-            dict: Object
-        """
-        return self._get_db(doctype).get_by_id(id)
+        with self._lock:
+            # Checks if database is already open
+            if self._open_conns.get(doctype_str, None):
+                return self._open_conns[doctype_str]
+
+            # Opens the database
+            try:
+                indexes = self.indexes.get(doctype_str, [])
+                if self.backend == "sqlite":
+                    self._open_conns[doctype_str] = self._get_sqlite().get_table(doctype_str, indexes)
+                else:
+                    db_path = Path(self.base_url).joinpath(f"{doctype_str}.json")
+                    self._open_conns[doctype_str] = PysonDbBackend(str(db_path), indexes, self.persist_indexes)
+                return self._open_conns[doctype_str]
+            except Exception as e:
+                raise ApiException(
+                    message=f"Could not get database for DocType '{doctype_str}'.",
+                    method="_get_db",
+                    url=self.base_url
+                ) from e
 
     def get_all(self, doctype: WeClappDocType|str) -> list:
         """Returns all objects of the given DocType.
@@ -81,7 +131,7 @@ class WcCacheApi(ApiBase):
         Returns:
             list: List of objects
         """
-        return list(self._get_db(doctype).get_all().values())
+        return self._get_db(doctype).get_all()
 
     def get(self, doctype: WeClappDocType|str, id: str) -> dict:
         """Returns the object with the given name and DocType.
@@ -91,9 +141,9 @@ class WcCacheApi(ApiBase):
             name (str): Name of the object
 
         Returns:
-            dict: Object
+            dict: Object or None if not found
         """
-        return self._get_db(doctype).get_by_query(lambda x: x["id"] == id)
+        return self._get_db(doctype).get(id)
 
     def create(self, doctype: WeClappDocType|str, data: dict) -> dict:
         """Creates a new object of the given DocType.
@@ -105,17 +155,65 @@ class WcCacheApi(ApiBase):
         Returns:
             dict: Created object
         """
-        return self._get_by_db_id(doctype, self._get_db(doctype).add(data))
-    
+        return self._get_db(doctype).add(data)
+
     def create_many(self, doctype: WeClappDocType|str, data : list) -> None:
         """Creates multiple new entities of the DocType
-        
+
         Args:
             doc_type (WeClappDocType): DocType to create the entities for
             data (list): Data to fill the entities with
         """
         self._get_db(doctype).add_many(data)
 
+    def write_pages(self, doctype: WeClappDocType|str, pages: Iterable[list[dict]]) -> int:
+        """Replaces the database of the DocType with the entities of the given pages.
+        Only one page has to be held in memory.
+
+        Args:
+            doctype (WeClappDocType|str): DocType to write the entities for
+            pages (Iterable[list[dict]]): Pages of entities (e.g. WeClappAPI.iter_pages)
+
+        Returns:
+            int: Amount of written entities
+        """
+        doctype_str = doctype.value if isinstance(doctype, WeClappDocType) else doctype
+        try:
+            return self._get_db(doctype).write(entity for page in pages for entity in page)
+        except ApiException:
+            raise
+        except Exception as e:
+            raise ApiException(
+                message=f"Could not write database for DocType '{doctype_str}'.",
+                method="write_pages",
+                url=self.base_url
+            ) from e
+
+    def upsert_many(self, doctype: WeClappDocType|str, data: list[dict]) -> int:
+        """Creates or replaces (matched by "id") multiple entities of the DocType at once.
+
+        Args:
+            doctype (WeClappDocType|str): DocType to upsert the entities for
+            data (list[dict]): Entities to upsert
+
+        Returns:
+            int: Amount of upserted entities
+        """
+        return self._get_db(doctype).upsert_many(data)
+
+    def delete_many(self, doctype: WeClappDocType|str, query: dict) -> int:
+        """Deletes all entities of the DocType whose fields match the query.
+
+        Args:
+            doctype (WeClappDocType|str): DocType to delete the entities from
+            query (dict): Field names mapped to a collection of accepted values,
+            e.g. {"entityName": {"salesInvoice"}, "entityId": {"1", "2"}}
+
+        Returns:
+            int: Amount of deleted entities
+        """
+        return self._get_db(doctype).delete_many(query)
+
     def update(self, doctype: WeClappDocType|str, id: str, data: dict) -> dict:
         """Updates the object with the given name and DocType.
 
@@ -127,9 +225,7 @@ class WcCacheApi(ApiBase):
         Returns:
             dict: Updated object
         """
-        updated_ids = self._get_db(doctype).update_by_query(lambda x: x["id"] == id, data)
-        if len(updated_ids) > 0:
-            return self._get_by_db_id(updated_ids[0])
+        return self._get_db(doctype).update(id, data)
 
     def delete(self, doctype: WeClappDocType|str, id: str) -> None:
         """Deletes the object with the given name and DocType.
@@ -138,7 +234,7 @@ class WcCacheApi(ApiBase):
             doctype (str): DocType of the object
             name (str): Name of the object
         """
-        self._get_db(doctype).delete_by_query(lambda x: x["id"] == id)
+        self._get_db(doctype).delete(id)
 
     def get_count(self, doctype: WeClappDocType|str) -> int:
         """Returns the count of objects of the given DocType.
@@ -162,4 +258,4 @@ class WcCacheApi(ApiBase):
         Returns:
             list: List of objects
         """
-        return self._get_db(doctype).get_by_query(lambda x: x[field] == value)
\ No newline at end of file
+        return self._get_db(doctype).search(field, value)
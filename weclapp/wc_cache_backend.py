@@ -0,0 +1,332 @@
+import json
+import os
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from threading import RLock
+from typing import Iterable
+from pysondb import PysonDB
+from .wc_cache_index import WcCacheIndex
+
+class WcCacheBackend(ABC):
+    """Base class for storage backends of the WeClapp cache.
+    One backend-object stores the entities of a single DocType.
+    """
+
+    @abstractmethod
+    def get_all(self) -> list[dict]:
+        """Returns all entities.
+
+        Returns:
+            list[dict]: List of entities
+        """
+        pass
+
+    @abstractmethod
+    def get(self, id: str) -> dict:
+        """Returns the entity with the given WeClapp-ID.
+
+        Args:
+            id (str): WeClapp-ID of the entity
+
+        Returns:
+            dict: Entity or None if not found
+        """
+        pass
+
+    @abstractmethod
+    def search(self, field: str, value) -> list[dict]:
+        """Returns all entities with the given field-value.
+
+        Args:
+            field (str): Name of the field to check for
+            value: The value to search for
+
+        Returns:
+            list[dict]: List of entities
+        """
+        pass
+
+    @abstractmethod
+    def add(self, data: dict) -> dict:
+        """Adds a new entity.
+
+        Args:
+            data (dict): Entity
+
+        Returns:
+            dict: Added entity
+        """
+        pass
+
+    @abstractmethod
+    def add_many(self, data: list[dict]) -> None:
+        """Adds multiple new entities at once.
+
+        Args:
+            data (list[dict]): Entities
+        """
+        pass
+
+    @abstractmethod
+    def update(self, id: str, data: dict) -> dict:
+        """Updates the fields of the entity with the given WeClapp-ID.
+
+        Args:
+            id (str): WeClapp-ID of the entity
+            data (dict): Fields to update
+
+        Returns:
+            dict: Updated entity or None if not found
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, id: str) -> None:
+        """Deletes the entity with the given WeClapp-ID.
+
+        Args:
+            id (str): WeClapp-ID of the entity
+        """
+        pass
+
+    @abstractmethod
+    def write(self, entities: Iterable[dict]) -> int:
+        """Replaces all entities with the given ones.
+        The entities are consumed one by one, so they can be streamed.
+
+        Args:
+            entities (Iterable[dict]): Entities
+
+        Returns:
+            int: Amount of written entities
+        """
+        pass
+
+    @abstractmethod
+    def upsert_many(self, data: list[dict]) -> int:
+        """Creates or replaces (matched by "id") multiple entities at once.
+
+        Args:
+            data (list[dict]): Entities
+
+        Returns:
+            int: Amount of upserted entities
+        """
+        pass
+
+    @abstractmethod
+    def delete_many(self, query: dict) -> int:
+        """Deletes all entities whose fields match the query.
+
+        Args:
+            query (dict): Field names mapped to a collection of accepted values
+
+        Returns:
+            int: Amount of deleted entities
+        """
+        pass
+
+    def close(self) -> None:
+        """Closes the backend.
+        """
+        pass
+
+class PysonDbBackend(WcCacheBackend):
+    """Storage backend using a PysonDB JSON-file per DocType.
+    Every change rewrites the whole file. The entities are loaded once and kept in memory
+    together with hash indexes over "id" and the declared fields, so lookups don't scan the file.
+    """
+
+    def __init__(self, path: str, indexes: list[str] = None, persist_indexes: bool = False):
+        """Opens the PysonDB-file (it is created if not existing).
+        If secondary indexes are declared, the entities are loaded and indexed right away.
+
+        Args:
+            path (str): Path of the JSON-file
+            indexes (list[str], optional): Fields to index besides "id". Defaults to None.
+            persist_indexes (bool, optional): If True, the indexes are saved next to the JSON-file
+            and loaded by later runs instead of rebuilt. Defaults to False.
+        """
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".index")
+        self.persist_indexes = persist_indexes
+        self.db = PysonDB(str(self.path))
+        self.index = WcCacheIndex(["id", *(indexes or [])])
+        self._data = None           # Database-IDs mapped to entities, loaded on first access
+        self._index_dirty = False   # Indexes changed since they were saved
+        self._lock = RLock()
+
+        if indexes:
+            self._load()
+
+    def _load(self) -> dict:
+        """Loads the entities and indexes if not loaded yet.
+
+        Returns:
+            dict: Database-IDs mapped to entities
+        """
+        with self._lock:
+            if self._data is None:
+                self._data = self.db.get_all()
+                signature = WcCacheIndex.get_signature(self.path)
+                if not (self.persist_indexes and self.index.load(self.index_path, signature)):
+                    self.index.build(self._data.items())
+                    self._index_dirty = True
+            return self._data
+
+    def _add_loaded(self, db_id: str, entity: dict) -> None:
+        """Adds an entity to the loaded entities and indexes.
+
+        Args:
+            db_id (str): Database-ID
+            entity (dict): Entity
+        """
+        if self._data is not None:
+            self._data[db_id] = entity
+            self.index.add(db_id, entity)
+            self._index_dirty = True
+
+    def _remove_loaded(self, db_id: str) -> None:
+        """Removes an entity from the loaded entities and indexes.
+
+        Args:
+            db_id (str): Database-ID
+        """
+        if self._data is not None and db_id in self._data:
+            self.index.remove(db_id, self._data.pop(db_id))
+            self._index_dirty = True
+
+    def _get_db_ids(self, field: str, value) -> list[str]:
+        """Returns the database-IDs of all entities with the given field-value.
+        Uses the index if the field is indexed.
+
+        Args:
+            field (str): Name of the field to check for
+            value: The value to search for
+
+        Returns:
+            list[str]: Database-IDs
+        """
+        data = self._load()
+        if self.index.has_field(field):
+            return [db_id for db_id in self.index.lookup(field, value) if db_id in data]
+        return [db_id for db_id, entity in data.items() if entity.get(field, None) == value]
+
+    @staticmethod
+    def _new_db_id() -> str:
+        """Returns a new database-ID in the format of PysonDB (18 digit uuid).
+
+        Returns:
+            str: Database-ID
+        """
+        return str(int(uuid.uuid4()))[:18]
+
+    def _write_db(self, items: Iterable[tuple[str, dict]]) -> int:
+        """Replaces the database-file with the given (database-ID, entity) items.
+        The file is written item by item into a temporary file which replaces the
+        existing file at the end, so the items can be streamed.
+
+        Args:
+            items (Iterable[tuple[str, dict]]): Database-IDs and entities
+
+        Returns:
+            int: Amount of written entities
+        """
+        tmp_path = self.path.with_suffix(".json.tmp")
+        count = 0
+        keys = []
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as file:
+                # Same structure as PysonDB, "keys" are written last since they're known after the first entity
+                file.write('{"version": 2, "data": {')
+                for db_id, entity in items:
+                    if not keys:
+                        keys = sorted(entity.keys())
+                    file.write(f'{", " if count else ""}{json.dumps(db_id)}: {json.dumps(entity)}')
+                    count += 1
+                file.write(f'}}, "keys": {json.dumps(keys)}}}')
+            os.replace(tmp_path, self.path)
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        return count
+
+    def get_all(self) -> list[dict]:
+        return list(self._load().values())
+
+    def get(self, id: str) -> dict:
+        with self._lock:
+            db_ids = self._get_db_ids("id", id)
+            return self._data[db_ids[0]] if db_ids else None
+
+    def search(self, field: str, value) -> list[dict]:
+        with self._lock:
+            return [self._data[db_id] for db_id in self._get_db_ids(field, value)]
+
+    def add(self, data: dict) -> dict:
+        with self._lock:
+            db_id = self.db.add(data)
+            self._add_loaded(db_id, data)
+            return data
+
+    def add_many(self, data: list[dict]) -> None:
+        with self._lock:
+            for db_id, entity in (self.db.add_many(data, json_response=True) or {}).items():
+                self._add_loaded(db_id, entity)
+
+    def update(self, id: str, data: dict) -> dict:
+        with self._lock:
+            updated = None
+            for db_id in self._get_db_ids("id", id):
+                updated = self.db.update_by_id(db_id, data)
+                self._remove_loaded(db_id)
+                self._add_loaded(db_id, updated)
+            return updated
+
+    def delete(self, id: str) -> None:
+        with self._lock:
+            for db_id in self._get_db_ids("id", id):
+                self.db.delete_by_id(db_id)
+                self._remove_loaded(db_id)
+
+    def write(self, entities: Iterable[dict]) -> int:
+        with self._lock:
+            # Entities are streamed into the file, they are loaded again on the next access
+            self._data = None
+            self.index_path.unlink(missing_ok=True)
+            return self._write_db((self._new_db_id(), entity) for entity in entities)
+
+    def upsert_many(self, data: list[dict]) -> int:
+        if not data:
+            return 0
+
+        with self._lock:
+            self._load()
+            for entity in data:
+                db_ids = self._get_db_ids("id", entity.get("id", None))
+                db_id = db_ids[0] if db_ids else self._new_db_id()
+                self._remove_loaded(db_id)
+                self._add_loaded(db_id, entity)
+
+            self._write_db(self._data.items())
+            return len(data)
+
+    def delete_many(self, query: dict) -> int:
+        with self._lock:
+            data = self._load()
+            db_ids = [db_id for db_id, entity in data.items()
+                      if all(entity.get(field, None) in values for field, values in query.items())]
+            if not db_ids:
+                return 0
+
+            for db_id in db_ids:
+                self._remove_loaded(db_id)
+            self._write_db(self._data.items())
+            return len(db_ids)
+
+    def close(self) -> None:
+        with self._lock:
+            # Save indexes for the next run
+            if self.persist_indexes and self._index_dirty and self._data is not None:
+                self.index.save(self.index_path, WcCacheIndex.get_signature(self.path))
+                self._index_dirty = False
@@ -0,0 +1,149 @@
+import json
+import os
+from pathlib import Path
+from typing import Iterable
+
+class WcCacheIndex:
+    """Hash indexes over fields of cached entities.
+    Maps every value of an indexed field to the keys (database-IDs) of the entities holding it.
+    Values which can't be hashed (lists, dicts) are not indexed.
+    """
+
+    def __init__(self, fields: list[str]):
+        """Initializes empty indexes for the given fields.
+
+        Args:
+            fields (list[str]): Names of the fields to index
+        """
+        self.fields = list(dict.fromkeys(fields))
+        self._indexes = {field: {} for field in self.fields}
+
+    @staticmethod
+    def _is_indexable(value) -> bool:
+        """Returns if the value can be stored in the index.
+
+        Args:
+            value: Field value
+
+        Returns:
+            bool: True if indexable
+        """
+        return value is None or isinstance(value, (str, int, float, bool))
+
+    def has_field(self, field: str) -> bool:
+        """Returns if the field is indexed.
+
+        Args:
+            field (str): Name of the field
+
+        Returns:
+            bool: True if indexed
+        """
+        return field in self._indexes
+
+    def build(self, items: Iterable[tuple[str, dict]]) -> None:
+        """Rebuilds all indexes from the given items.
+
+        Args:
+            items (Iterable[tuple[str, dict]]): Keys and entities
+        """
+        self._indexes = {field: {} for field in self.fields}
+        for key, entity in items:
+            self.add(key, entity)
+
+    def add(self, key: str, entity: dict) -> None:
+        """Adds an entity to the indexes.
+
+        Args:
+            key (str): Key of the entity
+            entity (dict): Entity
+        """
+        for field, index in self._indexes.items():
+            value = entity.get(field, None)
+            if self._is_indexable(value):
+                index.setdefault(value, set()).add(key)
+
+    def remove(self, key: str, entity: dict) -> None:
+        """Removes an entity from the indexes.
+
+        Args:
+            key (str): Key of the entity
+            entity (dict): Entity (as it was added)
+        """
+        for field, index in self._indexes.items():
+            value = entity.get(field, None)
+            if self._is_indexable(value) and value in index:
+                index[value].discard(key)
+                if not index[value]:
+                    del index[value]
+
+    def lookup(self, field: str, value) -> set[str]:
+        """Returns the keys of all entities with the given field-value.
+
+        Args:
+            field (str): Name of an indexed field
+            value: The value to search for
+
+        Returns:
+            set[str]: Keys of the entities
+        """
+        if not self._is_indexable(value):
+            return set()
+        return self._indexes[field].get(value, set())
+
+    @staticmethod
+    def get_signature(path: Path) -> list[int]:
+        """Returns the signature (size and modification time) of the indexed file.
+
+        Args:
+            path (Path): Path of the indexed file
+
+        Returns:
+            list[int]: Signature or None if the file doesn't exist
+        """
+        if not path.exists():
+            return None
+        stat = path.stat()
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def save(self, path: Path, signature: list[int]) -> None:
+        """Saves the indexes next to the indexed file.
+
+        Args:
+            path (Path): Path of the index-file
+            signature (list[int]): Signature of the indexed file
+        """
+        data = {
+            "signature" : signature,
+            "fields"    : {field: [[value, sorted(keys)] for value, keys in index.items()]
+                           for field, index in self._indexes.items()}
+        }
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+        os.replace(tmp_path, path)
+
+    def load(self, path: Path, signature: list[int]) -> bool:
+        """Loads saved indexes if they were saved for the same fields and signature of the indexed file.
+
+        Args:
+            path (Path): Path of the index-file
+            signature (list[int]): Current signature of the indexed file
+
+        Returns:
+            bool: True if loaded, False if the indexes have to be rebuilt
+        """
+        if not path.exists() or signature is None:
+            return False
+        try:
+            with open(path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return False
+
+        if data.get("signature", None) != signature or sorted(data.get("fields", {})) != sorted(self.fields):
+            return False
+
+        self._indexes = {field: {value: set(keys) for value, keys in pairs}
+                         for field, pairs in data["fields"].items()}
+        return True
@@ -0,0 +1,253 @@
+import json
+import sqlite3
+import uuid
+from itertools import islice
+from threading import RLock
+from typing import Iterable, Iterator
+from .wc_cache_backend import WcCacheBackend
+
+class SqliteDatabase:
+    """Shared SQLite-database of the WeClapp cache (one table per DocType).
+    """
+
+    """int: Amount of entities inserted per executemany-call."""
+    batch_size = 1000
+
+    def __init__(self, path: str):
+        """Opens the SQLite-database (it is created if not existing).
+
+        Args:
+            path (str): Path of the database-file
+        """
+        self.path = path
+        self.lock = RLock()     # The connection is shared between threads
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+
+    def get_table(self, table: str, indexes: list[str] = None) -> "SqliteBackend":
+        """Returns the backend for the given table (created if not existing).
+
+        Args:
+            table (str): Name of the table (DocType)
+            indexes (list[str], optional): Fields to index besides "id". Defaults to None.
+
+        Returns:
+            SqliteBackend: Backend of the table
+        """
+        return SqliteBackend(self, table, indexes)
+
+    def drop_all(self) -> None:
+        """Drops all tables of the database.
+        """
+        with self.lock, self.conn:
+            tables = [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+            for table in tables:
+                self.conn.execute(f'DROP TABLE "{table}"')
+
+    def close(self) -> None:
+        """Closes the database connection.
+        """
+        with self.lock:
+            self.conn.close()
+
+class SqliteBackend(WcCacheBackend):
+    """Storage backend using a table of a SQLite-database.
+    Every entity is stored as JSON-document with its WeClapp-ID in an indexed column. Like in PysonDB the
+    IDs aren't unique, e.g. an archived E-Mail is stored once for every entity it belongs to.
+    Declared fields get an expression index, which is stored and kept up to date by SQLite.
+    """
+
+    def __init__(self, database: SqliteDatabase, table: str, indexes: list[str] = None):
+        """Initializes the backend and creates the table and indexes if not existing.
+
+        Args:
+            database (SqliteDatabase): Shared SQLite-database
+            table (str): Name of the table (DocType)
+            indexes (list[str], optional): Fields to index besides "id". Defaults to None.
+        """
+        self.database = database
+        self.table = table.replace('"', '')
+        self.indexes = [field for field in dict.fromkeys(indexes or []) if field != "id"]
+        self._create_table(self.table)
+        self._create_indexes()
+
+    @staticmethod
+    def _field_expression(field: str) -> str:
+        """Returns the SQL-expression extracting a field from the JSON-document.
+        The path is inlined (not a parameter), so SQLite can use the expression indexes.
+
+        Args:
+            field (str): Name of the field
+
+        Returns:
+            str: SQL-expression
+        """
+        path = field.replace('"', '').replace("'", "''")
+        return f"""json_extract(data, '$."{path}"')"""
+
+    def _create_indexes(self) -> None:
+        """Creates the index of the IDs and the expression indexes of the declared fields if not existing.
+        """
+        with self.database.lock, self.database.conn:
+            self.database.conn.execute(f'CREATE INDEX IF NOT EXISTS "{self.table}__id" ON "{self.table}" (id)')
+            for field in self.indexes:
+                name = f"{self.table}__{field}".replace('"', '')
+                self.database.conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS "{name}" ON "{self.table}" ({self._field_expression(field)})')
+
+    @staticmethod
+    def _to_row(entity: dict) -> tuple[str, str]:
+        """Returns the table row of an entity.
+        Entities without WeClapp-ID get a generated one.
+
+        Args:
+            entity (dict): Entity
+
+        Returns:
+            tuple[str, str]: ID and JSON-document
+        """
+        id = entity.get("id", None)
+        return (str(id) if id is not None else uuid.uuid4().hex, json.dumps(entity))
+
+    def _query(self, sql: str, params: tuple = ()) -> list[dict]:
+        """Runs a query selecting the data-column and returns the entities.
+
+        Args:
+            sql (str): SQL-query
+            params (tuple, optional): Query parameters. Defaults to ().
+
+        Returns:
+            list[dict]: Entities
+        """
+        with self.database.lock:
+            rows = self.database.conn.execute(sql, params).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def _create_table(self, table: str) -> None:
+        """Creates a table for entities if not existing.
+        Tables of older caches (with the ID as primary key) are converted.
+
+        Args:
+            table (str): Name of the table
+        """
+        with self.database.lock, self.database.conn:
+            columns = [row[1] for row in self.database.conn.execute(f'PRAGMA table_info("{table}")')]
+            if columns and "key" not in columns:
+                self.database.conn.execute(f'ALTER TABLE "{table}" RENAME TO "{table}__old"')
+            self.database.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS "{table}" (key INTEGER PRIMARY KEY, id TEXT NOT NULL, data TEXT NOT NULL)')
+            if columns and "key" not in columns:
+                self.database.conn.execute(
+                    f'INSERT INTO "{table}" (id, data) SELECT id, data FROM "{table}__old" ORDER BY rowid')
+                self.database.conn.execute(f'DROP TABLE "{table}__old"')
+
+    def _batches(self, entities: Iterable[dict]) -> Iterator[list[tuple[str, str]]]:
+        """Yields the table rows of the entities in batches of SqliteDatabase.batch_size.
+
+        Args:
+            entities (Iterable[dict]): Entities
+
+        Yields:
+            list[tuple[str, str]]: Table rows
+        """
+        entities = iter(entities)
+        while batch := [self._to_row(entity) for entity in islice(entities, self.database.batch_size)]:
+            yield batch
+
+    def _insert(self, rows: list[tuple[str, str]], table: str = None) -> None:
+        """Inserts the rows. Must be called inside a transaction.
+
+        Args:
+            rows (list[tuple[str, str]]): Table rows
+            table (str, optional): Name of the table. Defaults to the table of the backend.
+        """
+        self.database.conn.executemany(
+            f'INSERT INTO "{table or self.table}" (id, data) VALUES (?, ?)', rows)
+
+    def get_all(self) -> list[dict]:
+        return self._query(f'SELECT data FROM "{self.table}" ORDER BY rowid')
+
+    def get(self, id: str) -> dict:
+        result = self._query(f'SELECT data FROM "{self.table}" WHERE id = ? ORDER BY rowid LIMIT 1', (str(id),))
+        return result[0] if result else None
+
+    def search(self, field: str, value) -> list[dict]:
+        if field == "id":
+            return self._query(f'SELECT data FROM "{self.table}" WHERE id = ? ORDER BY rowid', (str(value),))
+        return self._query(f'SELECT data FROM "{self.table}" WHERE {self._field_expression(field)} = ? ORDER BY rowid',
+                           (value,))
+
+    def add(self, data: dict) -> dict:
+        with self.database.lock, self.database.conn:
+            self._insert([self._to_row(data)])
+        return data
+
+    def add_many(self, data: list[dict]) -> None:
+        # One transaction for all entities
+        with self.database.lock, self.database.conn:
+            for batch in self._batches(data):
+                self._insert(batch)
+
+    def update(self, id: str, data: dict) -> dict:
+        # Every entity with the ID is updated (like PysonDB), the last one is returned
+        entity = None
+        with self.database.lock, self.database.conn:
+            rows = self.database.conn.execute(f'SELECT key, data FROM "{self.table}" WHERE id = ? ORDER BY rowid',
+                                              (str(id),)).fetchall()
+            for key, row_data in rows:
+                entity = {**json.loads(row_data), **data}
+                self.database.conn.execute(f'UPDATE "{self.table}" SET data = ? WHERE key = ?',
+                                           (json.dumps(entity), key))
+        return entity
+
+    def delete(self, id: str) -> None:
+        with self.database.lock, self.database.conn:
+            self.database.conn.execute(f'DELETE FROM "{self.table}" WHERE id = ?', (str(id),))
+
+    def write(self, entities: Iterable[dict]) -> int:
+        # Entities are written into a staging table which replaces the table at the end.
+        # The lock is released between the batches, so streaming the entities doesn't block other tables.
+        staging = f"{self.table}__staging"
+        with self.database.lock, self.database.conn:
+            self.database.conn.execute(f'DROP TABLE IF EXISTS "{staging}"')
+        self._create_table(staging)
+
+        count = 0
+        for batch in self._batches(entities):
+            with self.database.lock, self.database.conn:
+                self._insert(batch, staging)
+            count += len(batch)
+
+        with self.database.lock, self.database.conn:
+            self.database.conn.execute(f'DROP TABLE "{self.table}"')
+            self.database.conn.execute(f'ALTER TABLE "{staging}" RENAME TO "{self.table}"')
+        self._create_indexes()
+        return count
+
+    def upsert_many(self, data: list[dict]) -> int:
+        # Existing entities with the IDs are replaced, used for DocTypes with unique WeClapp-IDs
+        count = 0
+        with self.database.lock, self.database.conn:
+            for batch in self._batches(data):
+                batch = list({row[0]: row for row in batch}.values())    # Last entity of an ID within the batch
+                self.database.conn.execute(f'DELETE FROM "{self.table}" WHERE id IN (SELECT value FROM json_each(?))',
+                                           (json.dumps([row[0] for row in batch]),))
+                self._insert(batch)
+                count += len(batch)
+        return count
+
+    def delete_many(self, query: dict) -> int:
+        if not query:
+            return 0
+
+        # Accepted values are passed as JSON-array, so the amount of values isn't limited by SQLite
+        conditions = []
+        params = []
+        for field, values in query.items():
+            conditions.append(f"{self._field_expression(field)} IN (SELECT value FROM json_each(?))")
+            params.append(json.dumps(list(values)))
+
+        with self.database.lock, self.database.conn:
+            return self.database.conn.execute(f'DELETE FROM "{self.table}" WHERE {" AND ".join(conditions)}',
+                                              params).rowcount
@@ -1,8 +1,15 @@
+import json
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed
+from contextlib import ExitStack
 from pathlib import Path
 import config
+from base import ApiMetrics, MetricsExporter, StageProfiler, profile_stage
 from .wc_api import WeClappAPI
 from .wc_cache_api import WcCacheApi
 from .wc_doctypes import WeClappDocType
+from .wc_dependency import WcDependency
 
 class WcCacheWrapper:
     """Used for caching all doctypes from WeClapp to local database.
@@ -38,11 +45,22 @@ class WcCacheWrapper:
         else:
             self.wc_cache_api = WcCacheApi(config.WC_CACHE_BASE)
 
+        # Periodic export of the request metrics
+        self.metrics_exporter = MetricsExporter(
+            ApiMetrics.get_shared(), config.API_METRICS_INTERVAL, config.API_METRICS_JSON,
+            config.API_METRICS_PROMETHEUS) if config.API_METRICS else None
+
+        # Opt-in profiling of stages
+        self.profiler = StageProfiler.configure(config.PROFILE_STAGES, config.PROFILE_MODE, config.PROFILE_INTERVAL,
+                                                config.PROFILE_OUTPUT)
+
     def __enter__(self):
         """Setup function for the cache wrapper.
         """
         self.wc_api.open()
         self.wc_cache_api.open()
+        if self.metrics_exporter:
+            self.metrics_exporter.start()
         return self
     
     def __exit__(self, exc_type, exc_value, traceback):
@@ -50,68 +68,453 @@ class WcCacheWrapper:
         """
         self.wc_api.close()
         self.wc_cache_api.close()
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        if self.profiler:
+            self.profiler.write()
 
-    def _download_documents(self, doctype: WeClappDocType, ids: list[str]) -> None:
-        """Downloads all documents for the given DocType and entity-IDs.
-        Uses config.WC_CACHE_DOCUMENTS_BASE as base path and creates a folder for each DocType.
-        Under each DocType-folder, a folder for each entity-ID is created.
+    @staticmethod
+    def _get_document_size(document: dict) -> int:
+        """Returns the size in bytes of a WeClapp document (of its latest version).
 
         Args:
-            doctype (WeClappDocType): DocType to get the documents from
-            ids (list[str]): List of entity-IDs to get the documents from
+            document (dict): WeClapp document
+
+        Returns:
+            int: Size in bytes or None if unknown
         """
-        for id in ids:
-            # Get documents
-            for document in self.wc_api.get_documents(doctype, id):
-                # Create subfolders if not existing
-                base_path = Path(config.WC_CACHE_DOCUMENTS_BASE).joinpath(doctype.value).joinpath(id)
-                base_path.mkdir(parents=True, exist_ok=True)
-                # Download document
-                self.wc_api.download_document(document["id"], str(base_path.joinpath(document["name"])))
+        if document.get("fileSize", None) is not None:
+            return document["fileSize"]
+        versions = document.get("documentVersions", None) or []
+        if versions:
+            return versions[-1].get("fileSize", None)
+        return None
 
-    def _cache_archived_emails(self, doctype: WeClappDocType, ids: list[str]) -> None:
-        """Caches all archived E-Mails for the given DocType and entity-IDs.
+    @staticmethod
+    def _get_document_modified(document: dict) -> int:
+        """Returns the last modification of a WeClapp document (of its latest version).
 
         Args:
-            doctype (WeClappDocType): DocType to get the archived E-Mails from
-            ids (list[str]): List of entity-IDs to get the archived E-Mails from
-        """
-        for id in ids:
-            # Get archived emails
-            for email in self.wc_api.get_archived_emails(doctype, id):
-                # Add meta data to email-object: doctype and id
-                email["entityName"] = doctype.value
-                email["entityId"] = id
-                # Cache email
-                self.wc_cache_api.create("archivedEmail", email)
-
-    def cache_all(self):
-        """Caches all WeClapp DocTypes to local database.
+            document (dict): WeClapp document
+
+        Returns:
+            int: UNIX time in milliseconds or None if unknown
         """
-        # Clear cache first
-        for file in Path(config.WC_CACHE_BASE).glob("*.json"):
-            file.unlink()
+        if document.get("lastModifiedDate", None) is not None:
+            return document["lastModifiedDate"]
+        versions = document.get("documentVersions", None) or []
+        if versions:
+            return versions[-1].get("lastModifiedDate", None) or versions[-1].get("createdDate", None)
+        return None
+
+    @profile_stage()
+    def _download_entity_documents(self, doctype: WeClappDocType, id: str) -> tuple[int, int]:
+        """Downloads all documents of a single entity.
+        Documents which already exist with the same size and aren't older than in WeClapp are skipped.
+
+        Args:
+            doctype (WeClappDocType): DocType of the entity
+            id (str): Entity-ID
+
+        Returns:
+            tuple[int, int]: Amount of downloaded and skipped documents
+        """
+        downloaded = skipped = 0
+        for document in self.wc_api.get_documents(doctype, id):
+            # Create subfolders if not existing
+            base_path = Path(config.WC_CACHE_DOCUMENTS_BASE).joinpath(doctype.value).joinpath(id)
+            base_path.mkdir(parents=True, exist_ok=True)
+            # Download document
+            if self.wc_api.download_document(document["id"], str(base_path.joinpath(document["name"])),
+                                             self._get_document_size(document),
+                                             self._get_document_modified(document)):
+                downloaded += 1
+            else:
+                skipped += 1
+        return downloaded, skipped
+
+    @profile_stage()
+    def _collect_documents(self, doctype: WeClappDocType, futures: dict[Future, str]) -> tuple[int, int, int]:
+        """Waits for the document downloads of a DocType and prints a summary.
+        A failing entity doesn't stop the others.
 
-        # Cache all DocTypes
-        for doctype in WeClappDocType:
+        Args:
+            doctype (WeClappDocType): DocType of the entities
+            futures (dict[Future, str]): Futures of _download_entity_documents mapped to the entity-IDs
+
+        Returns:
+            tuple[int, int, int]: Amount of downloaded and skipped documents and failed entities
+        """
+        downloaded = skipped = failed = 0
+        for future in as_completed(futures):
             try:
-                # Get all entities
-                entities = self.wc_api.get_all(doctype, serialize_nulls=True)
+                entity_downloaded, entity_skipped = future.result()
+                downloaded += entity_downloaded
+                skipped += entity_skipped
+            except Exception as e:
+                failed += 1
+                print(f"Could not download documents of {doctype} {futures[future]}: "
+                      f"{getattr(e, 'message', e)}")
+
+        if downloaded or skipped or failed:
+            print(f"Documents of {doctype}: {downloaded} downloaded, {skipped} skipped, {failed} entities failed")
+        return downloaded, skipped, failed
 
-                # Cache all entities
-                self.wc_cache_api.create_many(doctype, entities)
+    @profile_stage()
+    def _get_entity_archived_emails(self, doctype: WeClappDocType, id: str) -> list[dict]:
+        """Gets all archived E-Mails of a single entity and adds the entity to them.
 
-                # Download all documents of the entities
-                ids = [entity["id"] for entity in entities]
-                self._download_documents(doctype, ids)
+        Args:
+            doctype (WeClappDocType): DocType of the entity
+            id (str): Entity-ID
 
-                # Cache all archived emails of the entities if doctype has archived emails
-                if doctype in self.mail_doctypes:
-                    self._cache_archived_emails(doctype, ids)
+        Returns:
+            list[dict]: Archived E-Mails
+        """
+        emails = self.wc_api.get_archived_emails(doctype, id)
+        for email in emails:
+            # Add meta data to email-object: doctype and id
+            email["entityName"] = doctype.value
+            email["entityId"] = id
+        return emails
 
-                print(f"Cached {doctype}")
+    @profile_stage()
+    def _collect_archived_emails(self, doctype: WeClappDocType, futures: dict[Future, str], done: queue.Queue,
+                                 wait: bool = True) -> tuple[int, int]:
+        """Writes the archived E-Mails of completed futures to the cache, config.WC_EMAIL_BATCH_SIZE entities
+        at once, so only a batch of E-Mails is held in memory. The cached E-Mails of the entities are replaced.
+        Written futures are removed. Entities whose E-Mails can't be fetched are logged and keep their cached E-Mails.
+
+        Args:
+            doctype (WeClappDocType): DocType of the entities
+            futures (dict[Future, str]): Futures of _get_entity_archived_emails mapped to the entity-IDs
+            done (queue.Queue): Completed futures (put by their done-callbacks)
+            wait (bool, optional): If True, waits for all futures. Otherwise only completed futures are written
+            if they fill a batch. Defaults to True.
 
+        Returns:
+            tuple[int, int]: Amount of cached E-Mails and of entities whose E-Mails failed
+        """
+        batch_size = max(1, config.WC_EMAIL_BATCH_SIZE)
+        count = failed = 0
+        while futures and (wait or done.qsize() >= batch_size):
+            batch = [done.get() for _ in range(min(batch_size, len(futures)))]
+            emails = []
+            ids = []
+            for future in batch:
+                id = futures.pop(future)
+                try:
+                    emails += future.result()
+                    ids.append(id)
+                except Exception as e:
+                    failed += 1
+                    print(f"Could not get archived E-Mails of {doctype} {id}: {getattr(e, 'message', e)}")
+            if not ids:
+                continue
+
+            # Replace the cached emails of the entities
+            try:
+                self.wc_cache_api.delete_many("archivedEmail", {"entityName": {doctype.value}, "entityId": set(ids)})
+                if emails:
+                    self.wc_cache_api.create_many("archivedEmail", emails)
+                count += len(emails)
             except Exception as e:
-                # Doctype couldnt be cached
-                print(f"Could not cache {doctype}.")
-                print(e.response_text)
\ No newline at end of file
+                failed += len(ids)
+                print(f"Could not cache archived E-Mails of {len(ids)} {doctype} entities: {e}")
+        return count, failed
+
+    def _get_sync_state_path(self) -> Path:
+        """Returns the path of the sync state file.
+        The sync state stores the high-water mark (last "lastModifiedDate") of every cached DocType.
+
+        Returns:
+            Path: Path of the sync state file
+        """
+        return Path(config.WC_CACHE_BASE).joinpath(config.WC_CACHE_SYNC_STATE)
+
+    def _load_sync_state(self) -> dict:
+        """Loads the sync state of the last run.
+
+        Returns:
+            dict: DocType-values mapped to their high-water mark
+        """
+        path = self._get_sync_state_path()
+        if not path.exists():
+            return {}
+        with open(path, "r", encoding="utf-8") as file:
+            return json.load(file)
+
+    def _save_sync_state(self, state: dict) -> None:
+        """Saves the sync state.
+
+        Args:
+            state (dict): DocType-values mapped to their high-water mark
+        """
+        with open(self._get_sync_state_path(), "w", encoding="utf-8") as file:
+            json.dump(state, file, indent=4)
+
+    @profile_stage()
+    def _cache_doctype(self, doctype: WeClappDocType, high_water_mark: int = None,
+                       download_executor: ThreadPoolExecutor = None,
+                       email_executor: ThreadPoolExecutor = None,
+                       documents: bool = True, archived_emails: bool = None, count: int = None) -> dict:
+        """Caches a DocType with its documents and archived E-Mails.
+        Without a high-water mark the whole DocType is fetched and replaces the cache.
+        With a high-water mark only entities changed since then (including the mark itself) are fetched
+        and upserted into the cache.
+        Entities deleted in WeClapp are not detected by an incremental run.
+        The stages are pipelined: documents and archived E-Mails of every fetched page are submitted
+        to the executors while the next pages are fetched. The archived E-Mails are replaced per entity,
+        entities whose E-Mails can't be fetched keep their cached E-Mails and don't fail the DocType.
+
+        Args:
+            doctype (WeClappDocType): DocType to cache
+            high_water_mark (int, optional): Last "lastModifiedDate" of the previous run. Defaults to None.
+            download_executor (ThreadPoolExecutor, optional): Executor for document downloads.
+            Defaults to an executor with config.WC_DOWNLOAD_WORKERS threads.
+            email_executor (ThreadPoolExecutor, optional): Executor for archived E-Mails.
+            Defaults to an executor with config.WC_EMAIL_WORKERS threads.
+            documents (bool, optional): If True, the documents of the entities are downloaded. Defaults to True.
+            archived_emails (bool, optional): If True, the archived E-Mails of the entities are cached.
+            Defaults to None (cached for the DocTypes in mail_doctypes).
+            count (int, optional): Amount of entities to fetch if already known (see _get_job_sizes).
+            Defaults to None (counted before fetching).
+
+        Returns:
+            dict: Result with new high-water mark (None if the DocType has no "lastModifiedDate"),
+            amount of entities, documents and E-Mails (and of entities whose documents or E-Mails failed)
+            and the duration of the extraction in seconds
+        """
+        start = time.perf_counter()
+        if archived_emails is None:
+            archived_emails = doctype in self.mail_doctypes
+        ids = []
+        last_modified = [high_water_mark] if high_water_mark is not None else []
+        document_futures = {}
+        email_futures = {}
+        email_done = queue.Queue()  # Completed futures of email_futures
+        emails = emails_failed = 0
+
+        with ExitStack() as stack:
+            if download_executor is None:
+                download_executor = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=max(1, config.WC_DOWNLOAD_WORKERS)))
+            if email_executor is None:
+                email_executor = stack.enter_context(
+                    ThreadPoolExecutor(max_workers=max(1, config.WC_EMAIL_WORKERS)))
+
+            def pages(filters: dict = None):
+                nonlocal emails, emails_failed
+                # Only the IDs and the high-water mark are kept in memory
+                for page in self.wc_api.iter_pages(doctype, serialize_nulls=True, filters=filters, count=count):
+                    page_ids = [entity["id"] for entity in page]
+                    ids.extend(page_ids)
+                    last_modified.extend(entity["lastModifiedDate"] for entity in page
+                                         if entity.get("lastModifiedDate", None) is not None)
+
+                    # Start the next stages for the entities of the page
+                    if documents:
+                        for id in page_ids:
+                            document_futures[download_executor.submit(
+                                self._download_entity_documents, doctype, id)] = id
+                    if archived_emails:
+                        for id in page_ids:
+                            future = email_executor.submit(self._get_entity_archived_emails, doctype, id)
+                            email_futures[future] = id
+                            future.add_done_callback(email_done.put)
+                        # Write the E-Mails fetched so far
+                        batch_emails, batch_failed = self._collect_archived_emails(
+                            doctype, email_futures, email_done, wait=False)
+                        emails += batch_emails
+                        emails_failed += batch_failed
+                    yield page
+
+            try:
+                if high_water_mark is None:
+                    # Full run: replace the cache
+                    self.wc_cache_api.write_pages(doctype, pages())
+                else:
+                    # Incremental run: upsert changed entities. Entities of the high-water mark itself are fetched
+                    # again, others may have been changed in the same millisecond after the last run read them.
+                    changed = [entity for page in pages({"lastModifiedDate-ge": high_water_mark}) for entity in page]
+                    self.wc_cache_api.upsert_many(doctype, changed)
+                extract_seconds = time.perf_counter() - start
+
+                # Wait for the documents and archived emails of the (changed) entities
+                downloaded, skipped, failed = self._collect_documents(doctype, document_futures)
+                batch_emails, batch_failed = self._collect_archived_emails(doctype, email_futures, email_done)
+                emails += batch_emails
+                emails_failed += batch_failed
+            except BaseException:
+                for future in [*document_futures, *email_futures]:
+                    future.cancel()
+                raise
+
+        return {
+            "high_water_mark"   : max(last_modified) if last_modified else None,
+            "entities"          : len(ids),
+            "documents"         : downloaded,
+            "documents_failed"  : failed,
+            "emails"            : emails,
+            "emails_failed"     : emails_failed,
+            "extract_seconds"   : extract_seconds
+        }
+
+    def _get_job_sizes(self, doctypes: list[WeClappDocType], state: dict,
+                       max_workers: int) -> dict[WeClappDocType, int]:
+        """Returns the amount of entities to fetch per DocType (used for scheduling and passed to the fetch,
+        so every DocType is counted once). DocTypes whose count can't be determined get None.
+
+        Args:
+            doctypes (list[WeClappDocType]): DocTypes to cache
+            state (dict): Sync state (high-water marks of an incremental run)
+            max_workers (int): Amount of parallel requests
+
+        Returns:
+            dict[WeClappDocType, int]: DocTypes mapped to their amount of entities
+        """
+        def count(doctype: WeClappDocType) -> int|None:
+            high_water_mark = state.get(doctype.value, None)
+            try:
+                return self.wc_api.get_count(
+                    doctype, {"lastModifiedDate-ge": high_water_mark} if high_water_mark is not None else None)
+            except Exception:
+                return None
+
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            return dict(zip(doctypes, executor.map(count, doctypes)))
+
+    @staticmethod
+    def _print_report(results: dict[WeClappDocType, dict], wall_seconds: float) -> None:
+        """Prints the timing report of a caching run, slowest DocTypes first.
+
+        Args:
+            results (dict[WeClappDocType, dict]): DocTypes mapped to the results of _cache_doctype
+            (with "seconds" and, if failed, "error")
+            wall_seconds (float): Duration of the whole run in seconds
+        """
+        print(f"{'DocType':<36}{'Entities':>10}{'Documents':>11}{'E-Mails':>9}{'E-Mails failed':>16}"
+              f"{'Extract':>10}{'Total':>10}")
+        for doctype, result in sorted(results.items(), key=lambda item: item[1]["seconds"], reverse=True):
+            if "error" in result:
+                print(f"{doctype.value:<36}{'failed':>10}{'':>11}{'':>9}{'':>16}{'':>10}{result['seconds']:>9.1f}s")
+            else:
+                print(f"{doctype.value:<36}{result['entities']:>10}{result['documents']:>11}{result['emails']:>9}"
+                      f"{result['emails_failed']:>16}{result['extract_seconds']:>9.1f}s{result['seconds']:>9.1f}s")
+        total_seconds = sum(result["seconds"] for result in results.values())
+        print(f"Cached {len(results)} DocTypes in {wall_seconds:.1f}s (sum of DocTypes: {total_seconds:.1f}s)")
+
+    def _cache_dependencies(self, dependencies: list[WcDependency], state: dict, max_workers: int) -> None:
+        """Caches the DocTypes of the dependencies with their side data and updates the sync state.
+        Several DocTypes are cached at once, the largest ones are started first.
+
+        Args:
+            dependencies (list[WcDependency]): DocTypes to cache (one dependency per DocType)
+            state (dict): Sync state, DocTypes with a high-water mark are cached incrementally
+            max_workers (int): Amount of DocTypes cached in parallel
+        """
+        start = time.perf_counter()
+
+        # Largest jobs first, so small DocTypes fill the gaps at the end
+        sizes = self._get_job_sizes([dependency.doctype for dependency in dependencies], state, max_workers)
+        dependencies = sorted(dependencies, key=lambda dependency: sizes[dependency.doctype] or 0,
+                              reverse=True)
+
+        # Cache all DocTypes, the document and email stages are shared by all DocTypes
+        results = {}
+        with ThreadPoolExecutor(max_workers=max(1, config.WC_DOWNLOAD_WORKERS)) as download_executor, \
+             ThreadPoolExecutor(max_workers=max(1, config.WC_EMAIL_WORKERS)) as email_executor, \
+             ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+
+            def cache(dependency: WcDependency) -> dict:
+                doctype_start = time.perf_counter()
+                try:
+                    result = self._cache_doctype(dependency.doctype, state.get(dependency.doctype.value, None),
+                                                 download_executor, email_executor,
+                                                 dependency.documents, dependency.archived_emails,
+                                                 sizes[dependency.doctype])
+                except Exception as e:
+                    result = {"error": e}
+                result["seconds"] = time.perf_counter() - doctype_start
+                return result
+
+            futures = {executor.submit(cache, dependency): dependency.doctype for dependency in dependencies}
+            for future in as_completed(futures):
+                doctype = futures[future]
+                result = results[doctype] = future.result()
+                if "error" in result:
+                    # Doctype couldnt be cached
+                    print(f"Could not cache {doctype}.")
+                    print(getattr(result["error"], "response_text", result["error"]))
+                    continue
+
+                # Store high-water mark for the next incremental run (only saved by this thread)
+                if result["high_water_mark"] is not None:
+                    state[doctype.value] = result["high_water_mark"]
+                else:
+                    state.pop(doctype.value, None)
+                self._save_sync_state(state)
+
+                print(f"Cached {doctype}")
+
+        self._print_report(results, time.perf_counter() - start)
+
+        # Report retries and throttling of the WeClapp API
+        stats = self.wc_api.request_policy.get_stats()
+        print(f"WeClapp requests: {stats['requests']}, retries: {stats['retries']}, "
+              f"HTTP 429: {stats['rate_limited']}, throttled: {stats['throttled']} "
+              f"({stats['throttled_seconds']:.1f}s), failed: {stats['failed']}")
+        if self.wc_api.metrics:
+            self.wc_api.metrics.print_report()
+
+    @profile_stage()
+    def cache_all(self, incremental: bool = False, max_workers: int = config.WC_CACHE_WORKERS):
+        """Caches all WeClapp DocTypes to local database.
+        Several DocTypes are cached at once, the largest ones are started first.
+
+        Args:
+            incremental (bool, optional): If True, only entities changed since the last run are fetched
+            for DocTypes with a stored high-water mark. Defaults to False.
+            max_workers (int, optional): Amount of DocTypes cached in parallel. Defaults to config.WC_CACHE_WORKERS.
+        """
+        if incremental:
+            state = self._load_sync_state()
+        else:
+            # Clear cache first
+            self.wc_cache_api.clear()
+            self._get_sync_state_path().unlink(missing_ok=True)
+            state = {}
+
+        self._cache_dependencies(
+            [WcDependency(doctype, documents=True, archived_emails=doctype in self.mail_doctypes)
+             for doctype in WeClappDocType],
+            state, max_workers)
+
+    @profile_stage()
+    def cache_for(self, migrations: list, incremental: bool = False,
+                  max_workers: int = config.WC_CACHE_WORKERS):
+        """Caches only the WeClapp data needed by the given migrations
+        (the DocTypes declared by their get_wc_dependencies, with documents and archived E-Mails if needed).
+        Other cached DocTypes are kept.
+
+        Args:
+            migrations (list): Migration classes (with get_wc_dependencies) or WcDependency-objects
+            incremental (bool, optional): If True, only entities changed since the last run are fetched
+            for DocTypes with a stored high-water mark. Defaults to False.
+            max_workers (int, optional): Amount of DocTypes cached in parallel. Defaults to config.WC_CACHE_WORKERS.
+        """
+        dependencies = []
+        for migration in migrations:
+            if isinstance(migration, WcDependency):
+                dependencies.append(migration)
+            else:
+                dependencies += migration.get_wc_dependencies()
+        dependencies = WcDependency.merge(dependencies)
+
+        # A full run of a DocType replaces its cache and high-water mark
+        state = self._load_sync_state()
+        if not incremental:
+            for dependency in dependencies:
+                state.pop(dependency.doctype.value, None)
+
+        self._cache_dependencies(dependencies, state, max_workers)
@@ -1,5 +1,5 @@
 import config
-import requests
+from base import Transport
 
 class WCCustomerAPI:
     BASE_URL                = f"{config.WC_API_BASE}"
@@ -13,39 +13,40 @@ class WCCustomerAPI:
             "Content-Type": "application/json",
             "Accept-Language": "de",
         }
+        self.session = Transport.get_shared(config.API_POOL_MAXSIZE, config.API_POOL_HOSTS,
+                                            config.API_POOL_BLOCK).create_session(self.headers)
 
     def get_customers(self):
-        response = requests.get(self.BASE_URL_CUSTOMER, headers=self.headers)
+        response = self.session.get(self.BASE_URL_CUSTOMER)
         return response.json()
 
     def create_customer(self, data):
-        response = requests.post(self.BASE_URL_CUSTOMER, json=data, headers=self.headers)
+        response = self.session.post(self.BASE_URL_CUSTOMER, json=data)
         return response.json()
 
     def update_customer(self, customer_id, data):
         url = f"{self.BASE_URL_CUSTOMER}/id/{customer_id}"
-        response = requests.put(url, json=data, headers=self.headers)
+        response = self.session.put(url, json=data)
         return response.json()
 
     def delete_customer(self, customer_id):
         url = f"{self.BASE_URL_CUSTOMER}/id/{customer_id}"
-        response = requests.delete(url, headers=self.headers)
+        response = self.session.delete(url)
         return response.status_code
 
     def get_customer(self, customer_id):
         url = f"{self.BASE_URL_CUSTOMER}/id/{customer_id}"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         return response.json()
     
     def get_customer_count(self):
         url = f"{self.BASE_URL_CUSTOMER}/count"
-        response = requests.get(url, headers=self.headers)
+        response = self.session.get(url)
         return response.json()
     
     def get_customer_sepa_mandates(self, bank_account_id):
-        response = requests.get(self.BASE_URL_SEPA_MANDATES, \
-                                headers=self.headers, \
-                                params={
-                                    "partyBankAccountId-eq": bank_account_id
-                                })
+        response = self.session.get(self.BASE_URL_SEPA_MANDATES, \
+                                    params={
+                                        "partyBankAccountId-eq": bank_account_id
+                                    })
         return response.json()
\ No newline at end of file
@@ -0,0 +1,41 @@
+from typing import Iterable
+from .wc_doctypes import WeClappDocType
+
+class WcDependency:
+    """WeClapp data needed by a migration: a DocType and its side data (documents, archived E-Mails).
+    """
+
+    def __init__(self, doctype: WeClappDocType, documents: bool = False, archived_emails: bool = False):
+        """Initializes the dependency.
+
+        Args:
+            doctype (WeClappDocType): DocType whose entities are needed
+            documents (bool, optional): If True, the documents of the entities are needed. Defaults to False.
+            archived_emails (bool, optional): If True, the archived E-Mails of the entities are needed.
+            Defaults to False.
+        """
+        self.doctype = doctype
+        self.documents = documents
+        self.archived_emails = archived_emails
+
+    def __repr__(self) -> str:
+        return f"WcDependency({self.doctype.value}, documents={self.documents}, " \
+               f"archived_emails={self.archived_emails})"
+
+    @staticmethod
+    def merge(dependencies: Iterable["WcDependency"]) -> list["WcDependency"]:
+        """Merges dependencies to one dependency per DocType (keeping the order of first occurrence).
+
+        Args:
+            dependencies (Iterable[WcDependency]): Dependencies
+
+        Returns:
+            list[WcDependency]: Merged dependencies
+        """
+        merged = {}
+        for dependency in dependencies:
+            if dependency.doctype not in merged:
+                merged[dependency.doctype] = WcDependency(dependency.doctype)
+            merged[dependency.doctype].documents |= dependency.documents
+            merged[dependency.doctype].archived_emails |= dependency.archived_emails
+        return list(merged.values())